@@ -0,0 +1,312 @@
+# audit/log.py
+"""
+Audit trail of patient record access (PHI reads and writes).
+
+Routes call audit_log.record(), which only appends a small dict to an
+in-memory buffer, so auditing never adds a database round trip to a
+request. A background task writes the buffer to the `audit_log` collection
+(time-series or capped) with insert_many, whenever a batch fills up or every
+audit_flush_interval seconds.
+
+If MongoDB can't be reached, batches are appended to a local spill file and
+replayed once writes succeed again. If the buffer itself is full, events
+also go to the spill file, so events are never dropped. On shutdown the
+buffer is drained; a batch whose write is cancelled by the shutdown timeout
+is spilled too, so a replay may store some of its events twice.
+"""
+import asyncio
+import glob
+import json
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from fastapi import Request
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure, PyMongoError
+from auth.services import verify_token
+from config.settings import settings
+from hospital.context import get_current_tenant_id, get_resolved_tenant_id
+
+COLLECTION = "audit_log"
+
+async def ensure_audit_collection(db: AsyncIOMotorDatabase) -> None:
+    """
+    Create the audit collection as a time-series collection (MongoDB 5+) or,
+    when configured or unsupported, a capped collection
+    """
+    if COLLECTION in await db.list_collection_names():
+        return
+    try:
+        if settings.audit_collection_kind == "timeseries":
+            try:
+                await db.create_collection(
+                    COLLECTION,
+                    timeseries={"timeField": "ts", "metaField": "tenant", "granularity": "seconds"},
+                    expireAfterSeconds=settings.audit_retention_days * 86400,
+                )
+                return
+            except OperationFailure as e:
+                print(f"Time-series audit collection unsupported, using a capped collection: {e}")
+        await db.create_collection(COLLECTION, capped=True, size=settings.audit_capped_bytes)
+    except CollectionInvalid:
+        # Created concurrently by another worker
+        pass
+
+def audit_actor(request: Request) -> Optional[str]:
+    """Email of the bearer token's user, for routes without a user dependency"""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return verify_token(token).email
+    except Exception:
+        return None
+
+class AuditLog:
+    def __init__(self, buffer_size: int, batch_size: int, flush_interval: float, spill_path: str):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._buffer: deque[dict] = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._closing = False
+        self._replaying = False
+        # Metrics
+        self.recorded = 0
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.flushes = 0
+        self.last_error: Optional[str] = None
+
+    def record(
+        self,
+        action: str,
+        resource: str,
+        resource_id=None,
+        actor: Optional[str] = None,
+        role: Optional[str] = None,
+        **details,
+    ) -> None:
+        """
+        Queue an access event: `action` is read, create, update, delete,
+        export, import or predict; `resource_id` is one id or a list of ids.
+        Events are filed under the authenticated user's tenant; a different
+        tenant named only in the X-Tenant-ID header is kept as claimed_tenant.
+        """
+        tenant_id = get_resolved_tenant_id()
+        claimed = get_current_tenant_id()
+        if claimed and claimed != tenant_id:
+            details["claimed_tenant"] = claimed
+        event = {
+            "ts": datetime.now(timezone.utc),
+            "tenant": tenant_id or settings.default_tenant_id,
+            "action": action,
+            "resource": resource,
+            "actor": actor,
+        }
+        if role:
+            event["role"] = getattr(role, "value", role)
+        if resource_id is not None:
+            event["ids" if isinstance(resource_id, list) else "id"] = resource_id
+        if details:
+            event["details"] = details
+        self.recorded += 1
+
+        if len(self._buffer) >= self.buffer_size:
+            # Never drop audit events: overflow goes straight to disk
+            self._spill([event])
+            return
+        self._buffer.append(event)
+        if len(self._buffer) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    def _spill(self, events: Iterable[dict]) -> None:
+        # insert_many may have added an _id; replays get fresh ones
+        lines = "".join(
+            json.dumps({**{k: v for k, v in e.items() if k != "_id"}, "ts": e["ts"].isoformat()}, default=str) + "\n"
+            for e in events
+        )
+        if not lines:
+            return
+        directory = os.path.dirname(self.spill_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # O_APPEND keeps concurrent writers from different workers line-atomic
+        fd = os.open(self.spill_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            os.write(fd, lines.encode())
+        finally:
+            os.close(fd)
+        self.spilled += lines.count("\n")
+
+    def _take_batch(self) -> list[dict]:
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        return batch
+
+    async def _write(self, batch: list[dict]) -> bool:
+        try:
+            await self._db[COLLECTION].insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            failed = self._failed_events(batch, e)
+            await asyncio.to_thread(self._spill, failed)
+            self.written += len(batch) - len(failed)
+            return True
+        except PyMongoError as e:
+            self.last_error = str(e)
+            await asyncio.to_thread(self._spill, batch)
+            return False
+        except asyncio.CancelledError:
+            # The batch already left the buffer, and the insert may not have happened
+            self._spill(batch)
+            raise
+        self.written += len(batch)
+        return True
+
+    def _failed_events(self, batch: list[dict], error: BulkWriteError) -> list[dict]:
+        """Events of an unordered insert_many that were rejected; the others were stored"""
+        self.last_error = str(error)
+        failed = {write_error["index"] for write_error in error.details.get("writeErrors", [])}
+        return [event for i, event in enumerate(batch) if i in failed]
+
+    def _orphaned_replays(self) -> list[str]:
+        """Replay files of workers that died while replaying"""
+        orphans = []
+        for path in glob.glob(f"{glob.escape(self.spill_path)}.*.replay"):
+            pid = path[len(self.spill_path) + 1:-len(".replay")]
+            if not pid.isdigit():
+                continue
+            # Our own PID can only be a previous process's, ours is removed after each replay
+            if int(pid) != os.getpid():
+                try:
+                    os.kill(int(pid), 0)
+                    continue
+                except ProcessLookupError:
+                    pass
+                except PermissionError:
+                    continue
+            orphans.append(path)
+        return orphans
+
+    async def _replay_spill(self) -> None:
+        """Move events spilled while MongoDB was unavailable into the collection"""
+        # close() may flush while the background flusher is replaying
+        if self._replaying:
+            return
+        self._replaying = True
+        try:
+            for path in self._orphaned_replays() + [self.spill_path]:
+                await self._replay_file(path)
+        finally:
+            self._replaying = False
+
+    async def _replay_file(self, path: str) -> None:
+        replaying = f"{self.spill_path}.{os.getpid()}.replay"
+        if path != replaying:
+            try:
+                # Atomic, so only one worker replays a given file
+                os.replace(path, replaying)
+            except FileNotFoundError:
+                return
+        try:
+            with open(replaying) as f:
+                lines = iter(f)
+                while True:
+                    batch = [json.loads(line) for _, line in zip(range(self.batch_size), lines)]
+                    if not batch:
+                        break
+                    for event in batch:
+                        event["ts"] = datetime.fromisoformat(event["ts"])
+                    try:
+                        await self._db[COLLECTION].insert_many(batch, ordered=False)
+                    except BulkWriteError as e:
+                        failed = self._failed_events(batch, e)
+                        self._spill(failed)
+                        self.spilled -= len(failed)
+                        self.replayed += len(batch) - len(failed)
+                        continue
+                    except (PyMongoError, asyncio.CancelledError):
+                        # Put this batch and everything after it back for the next replay
+                        rest = batch + [json.loads(line) for line in lines]
+                        for event in rest[len(batch):]:
+                            event["ts"] = datetime.fromisoformat(event["ts"])
+                        self._spill(rest)
+                        self.spilled -= len(rest)
+                        raise
+                    self.replayed += len(batch)
+        finally:
+            os.remove(replaying)
+
+    async def flush(self) -> None:
+        """Write everything buffered so far"""
+        while self._buffer:
+            self.flushes += 1
+            if not await self._write(self._take_batch()):
+                # Mongo is down: spill the rest rather than retrying batch by batch
+                rest = list(self._buffer)
+                self._buffer.clear()
+                if rest:
+                    await asyncio.to_thread(self._spill, rest)
+                return
+        try:
+            await self._replay_spill()
+        except PyMongoError as e:
+            # Events still in the replay file are picked up by the next replay
+            self.last_error = str(e)
+
+    async def run(self, db: AsyncIOMotorDatabase) -> None:
+        """Background flusher, started from the app lifespan"""
+        self._db = db
+        self._wake = asyncio.Event()
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Audit flush failed: {e}")
+
+    async def close(self, timeout: float) -> None:
+        """Drain the buffer on shutdown; whatever can't be written in time is spilled"""
+        self._closing = True
+        if self._wake is not None:
+            self._wake.set()
+        if self._db is None:
+            self._spill(self._buffer)
+            self._buffer.clear()
+            return
+        try:
+            await asyncio.wait_for(self.flush(), timeout=timeout)
+        except Exception as e:
+            print(f"Audit drain incomplete, spilling: {e}")
+        if self._buffer:
+            self._spill(self._buffer)
+            self._buffer.clear()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "flushes": self.flushes,
+            "spill_pending": os.path.exists(self.spill_path),
+            "last_error": self.last_error,
+        }
+
+audit_log = AuditLog(
+    buffer_size=settings.audit_buffer_size,
+    batch_size=settings.audit_batch_size,
+    flush_interval=settings.audit_flush_interval,
+    spill_path=settings.audit_spill_path,
+)
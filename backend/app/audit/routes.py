@@ -0,0 +1,21 @@
+# audit/routes.py
+from fastapi import APIRouter, Depends
+from auth.services import require_admin
+from .log import audit_log
+
+router = APIRouter(prefix="/admin/audit", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/")
+async def get_audit_status():
+    """
+    Buffered, written and spilled audit event counts of this worker
+    """
+    return audit_log.stats()
+
+@router.post("/flush")
+async def flush_audit_log():
+    """
+    Write buffered audit events now instead of waiting for the next flush
+    """
+    await audit_log.flush()
+    return audit_log.stats()
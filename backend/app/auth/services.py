@@ -3,10 +3,12 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import jwt, JWTError  # Import JWTError from jose
 import bcrypt
-from fastapi import Depends, HTTPException, status
+import hmac
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from auth.models import TokenData, RoleEnum
 from config.settings import settings
+from tracing.spans import traced
 
 SECRET_KEY = settings.jwt_secret_key
 ALGORITHM = "HS256"
@@ -29,6 +31,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+@traced("auth.verify_token")
 def verify_token(token: str) -> TokenData:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -57,4 +60,17 @@ def require_role(required_role: RoleEnum):
                 detail="Insufficient permissions"
             )
         return user
-    return role_checker
\ No newline at end of file
+    return role_checker
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Check a token against the configured admin API key"""
+    if not settings.admin_api_key or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), settings.admin_api_key.encode("utf-8"))
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
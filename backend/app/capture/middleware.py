@@ -0,0 +1,164 @@
+# capture/middleware.py
+"""
+Opt-in capture of the production request mix for replay (capture/replay.py).
+
+Each request becomes one compact NDJSON record: when it arrived, its route
+template, the shape of its body (see capture/shapes.py), allow-listed query
+parameters, the caller's role, the response status and the server-side
+latency. Path parameters and tenants are replaced by keyed pseudonyms, so the
+replay can tell "the same patient again" from "another patient" without
+the capture holding any identifier. Records are gzip-compressed in batches
+by a background thread and appended to `capture_file`.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import random
+import time
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import parse_qsl
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth.services import verify_token
+from config.settings import settings
+from tracing.middleware import route_template
+from utils.background import BackgroundThreads
+from .shapes import STR, body_shape
+
+@lru_cache(maxsize=1)
+def _pseudonym_key() -> bytes:
+    # Derived from, but distinct from, the JWT secret
+    return hmac.new(settings.jwt_secret_key.encode(), b"xdoc-capture", hashlib.sha256).digest()
+
+def pseudonym(value: str) -> str:
+    return "#" + hmac.new(_pseudonym_key(), value.encode(), hashlib.sha256).hexdigest()[:12]
+
+class CaptureWriter:
+    """Appends records as gzip members, so concurrent workers can share one file"""
+
+    def __init__(self, path: str, max_queue: int = 10000, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=max_queue)
+        self._thread = BackgroundThreads(self._run, "traffic-capture")
+        self.written = 0
+        self.dropped = 0
+
+    def write(self, record: dict) -> None:
+        self._thread.ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Wait briefly for more, compressed members are much smaller in bulk
+            deadline = time.monotonic() + 1.0
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=0.1))
+                except queue.Empty:
+                    pass
+            data = gzip.compress("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in batch).encode())
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+                self.written += len(batch)
+            except OSError as e:
+                self.dropped += len(batch)
+                print(f"Traffic capture write failed: {e}")
+
+capture_writer = CaptureWriter(settings.capture_file)
+
+def _role(headers: Headers) -> Optional[str]:
+    scheme, _, token = headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return verify_token(token).role.value
+    except Exception:
+        return "invalid"
+
+class CaptureMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._should_capture(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        max_head = settings.capture_max_body_bytes
+        body = {"head": bytearray(), "size": 0, "newlines": 0, "last": b""}
+        status = {"code": None}
+
+        async def receive_with_capture() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                if chunk:
+                    if len(body["head"]) < max_head:
+                        body["head"] += chunk[:max_head - len(body["head"])]
+                    body["size"] += len(chunk)
+                    body["newlines"] += chunk.count(b"\n")
+                    body["last"] = chunk[-1:]
+            return message
+
+        async def send_with_capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        arrived = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_with_capture, send_with_capture)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._record(scope, arrived, duration_ms, status["code"], body)
+
+    @staticmethod
+    def _should_capture(path: str) -> bool:
+        if not settings.capture_enabled:
+            return False
+        if any(path.startswith(prefix) for prefix in settings.capture_exclude_paths):
+            return False
+        rate = settings.capture_sample_rate
+        return rate >= 1 or random.random() < rate
+
+    @staticmethod
+    def _record(scope: Scope, arrived: float, duration_ms: float, status: Optional[int], body: dict) -> None:
+        headers = Headers(scope=scope)
+        # Unmatched paths may contain identifiers and can't be replayed anyway
+        template = route_template(scope)
+        lines = body["newlines"] + (1 if body["size"] and body["last"] != b"\n" else 0)
+        keep = settings.capture_query_params
+        tenant = headers.get("X-Tenant-ID")
+        capture_writer.write({
+            "ts": round(arrived, 6),
+            "method": scope["method"],
+            "route": template,
+            "params": {name: pseudonym(str(value)) for name, value in scope.get("path_params", {}).items()},
+            "query": {
+                key: value if key in keep else STR
+                for key, value in parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+            },
+            "role": _role(headers),
+            "tenant": pseudonym(tenant) if tenant else None,
+            "idempotency_key": "Idempotency-Key" in headers,
+            "body": body_shape(
+                headers.get("content-type", ""), bytes(body["head"]), body["size"], lines,
+                truncated=body["size"] > len(body["head"]),
+            ),
+            "status": status,
+            "ms": round(duration_ms, 3),
+        })
@@ -0,0 +1,418 @@
+# capture/replay.py
+"""
+Replays captured traffic (capture/middleware.py) against a locally booted
+build and compares latency distributions between builds.
+
+`run` boots the app from --app-dir with uvicorn, the fake LLM backend and a
+throwaway database on --mongo-uri (dropped afterwards), creates the
+accounts, patients, diagnoses and doctors the captured requests refer to,
+then re-issues every request at its original offset divided by --speed.
+Payloads are synthesized from the captured shapes with a fixed seed, so two
+runs send identical traffic. Pass --target instead to replay against an
+app that is already running.
+
+Usage (from backend/app; MongoDB e.g. from docker-compose):
+    python -m capture.replay run captures/traffic.ndjson.gz --out base.json
+    python -m capture.replay run captures/traffic.ndjson.gz --app-dir ../../candidate/backend/app --out candidate.json
+    python -m capture.replay compare base.json candidate.json
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Optional
+from urllib.parse import urlencode, urlsplit
+import numpy as np
+from .shapes import STR, SyntheticPayloads
+
+PARAM = re.compile(r"\{(\w+)(?::\w+)?\}")
+LOGIN_ROUTE = "/api/auth/login"
+
+def read_capture(path: str, limit: Optional[int] = None) -> list[dict]:
+    """Replayable records (matched routes only) ordered by arrival"""
+    with gzip.open(path, "rt") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records = sorted((r for r in records if r.get("route")), key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+def _api_routes(routes, prefix: str = ""):
+    from fastapi.routing import APIRoute
+    for route in routes:
+        if isinstance(route, APIRoute):
+            yield prefix + route.path, route
+        # Newer FastAPI keeps included routers nested instead of copying their routes
+        router = getattr(route, "original_router", None)
+        if router is not None:
+            yield from _api_routes(router.routes, prefix + getattr(route.include_context, "prefix", ""))
+
+def _inline(schema, defs: dict):
+    # Models in different modules may share a name (e.g. two GenderEnums), so
+    # each route's references are resolved against its own definitions
+    if isinstance(schema, dict):
+        if "$ref" in schema:
+            return _inline(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+        return {key: _inline(value, defs) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [_inline(item, defs) for item in schema]
+    return schema
+
+def route_schemas() -> dict:
+    """
+    Request body schemas of this tree's routes, laid out like an OpenAPI
+    document. Built per route, so one model without a JSON schema doesn't
+    take the rest down the way it does /openapi.json.
+    """
+    from pydantic import TypeAdapter
+    from main import app
+    document = {"paths": {}}
+    for path, route in _api_routes(app.routes):
+        params = route.dependant.body_params
+        if len(params) != 1:
+            continue
+        try:
+            schema = TypeAdapter(params[0].field_info.annotation).json_schema()
+        except Exception:
+            continue
+        schema = _inline(schema, schema.pop("$defs", {}))
+        for method in route.methods:
+            operation = {"requestBody": {"content": {"application/json": {"schema": schema}}}}
+            document["paths"].setdefault(path, {})[method.lower()] = operation
+    return document
+
+class Client:
+    """Blocking HTTP client with one keep-alive connection per thread"""
+
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None, headers: Optional[dict] = None) -> tuple[int, bytes]:
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # Stale keep-alive connection: reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+    def json(self, method: str, path: str, payload=None, token: Optional[str] = None) -> tuple[int, dict]:
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        status, body = self.request(method, path, json.dumps(payload).encode() if payload is not None else None, headers)
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, {}
+
+class AppProcess:
+    """The build under test, served by uvicorn with local stand-ins for its dependencies"""
+
+    def __init__(self, app_dir: str, mongo_uri: str, workers: int = 1):
+        self.app_dir = os.path.abspath(app_dir)
+        self.mongo_uri = mongo_uri
+        self.workers = workers
+        self.database = f"xdoc_replay_{uuid.uuid4().hex[:8]}"
+        self.process: Optional[subprocess.Popen] = None
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "AppProcess":
+        env = {
+            **os.environ,
+            "MONGO_URI": self.mongo_uri,
+            "MONGO_DB_NAME": self.database,
+            "LLM_BACKEND": "fake",
+            "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "replay"),
+            "MODEL_WATCH_INTERVAL": "0",
+            "CAPTURE_ENABLED": "false",
+            "TRACING_SAMPLE_RATE": "0",
+            "PROFILING_SAMPLE_RATE": "0",
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=self.app_dir, env=env,
+        )
+        client = Client(self.url, timeout=2)
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"App exited during startup with code {self.process.returncode}")
+            try:
+                if client.request("GET", "/docs")[0] == 200:
+                    return self
+            except OSError:
+                pass
+            time.sleep(0.5)
+        self.__exit__()
+        raise RuntimeError("App did not become ready within 120s")
+
+    def __exit__(self, *exc) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+        try:
+            with MongoClient(self.mongo_uri, serverSelectionTimeoutMS=5000) as mongo:
+                mongo.drop_database(self.database)
+        except PyMongoError as e:
+            print(f"Could not drop replay database {self.database}: {e}")
+
+class Fixtures:
+    """Accounts and records standing in for the ones the captured requests used"""
+
+    def __init__(self, client: Client, payloads: SyntheticPayloads, max_per_param: int):
+        self.client = client
+        self.payloads = payloads
+        self.max_per_param = max_per_param
+        self.password = "Replay!Passw0rd1"
+        self.accounts: dict[str, str] = {}
+        self.tokens: dict[str, str] = {}
+        self.ids: dict[tuple[str, str], str] = {}
+        self.tenants: dict[str, str] = {}
+
+    def _example(self, method: str, route: str) -> dict:
+        schema = self.payloads.request_schema(method, route)
+        return self.payloads.generate(self.payloads.full_shape(schema), schema, features=self.payloads.features_for(route))
+
+    def _account(self, role: str) -> None:
+        email = f"replay-{role.lower()}@example.com"
+        self.client.json("POST", "/api/auth/register", {"email": email, "password": self.password, "role": role})
+        status, body = self.client.json("POST", LOGIN_ROUTE, {"email": email, "password": self.password, "role": role})
+        if status != 200:
+            raise RuntimeError(f"Could not log in the replay {role} account: {status} {body}")
+        self.accounts[role] = email
+        self.tokens[role] = body["access_token"]
+
+    def _create(self, param: str) -> str:
+        if param == "patient_id":
+            payload = {**self._example("POST", "/api/patients/"), "tenant_id": None}
+            status, body = self.client.json("POST", "/api/patients/", payload)
+            key = "id"
+        elif param == "diag_id":
+            route = "/api/diagnosis/predict/diabetes/{patient_id}"
+            patient_id = self._create("patient_id")
+            status, body = self.client.json("POST", route.replace("{patient_id}", patient_id),
+                                            self._example("POST", route), token=self.tokens["DOCTOR"])
+            key = "diagnosis_id"
+        elif param == "doctor_id":
+            payload = {**self._example("POST", "/api/doctors/"), "tenant_id": "replay"}
+            status, body = self.client.json("POST", "/api/doctors/", payload)
+            key = "doctor_id"
+        else:
+            return f"replay-{param}"
+        if status >= 300 or key not in body:
+            raise RuntimeError(f"Could not create a {param} fixture: {status} {body}")
+        return str(body[key])
+
+    def prepare(self, records: list[dict]) -> None:
+        for role in ("DOCTOR", "PATIENT"):
+            self._account(role)
+        needed: dict[str, list[str]] = {}
+        for record in records:
+            for param, pseudonym in record["params"].items():
+                if (param, pseudonym) not in self.ids and pseudonym not in needed.setdefault(param, []):
+                    needed[param].append(pseudonym)
+        for param, pseudonyms in needed.items():
+            created = [self._create(param) for _ in range(min(len(pseudonyms), self.max_per_param))]
+            # Beyond the cap, distinct captured ids share fixtures round-robin
+            for i, pseudonym in enumerate(pseudonyms):
+                self.ids[(param, pseudonym)] = created[i % len(created)]
+            print(f"Created {len(created)} {param} fixtures for {len(pseudonyms)} captured ids")
+
+    def tenant(self, pseudonym: str) -> str:
+        return self.tenants.setdefault(pseudonym, f"replay-tenant-{len(self.tenants) + 1}")
+
+def build_request(record: dict, payloads: SyntheticPayloads, fixtures: Fixtures) -> tuple[str, str, Optional[bytes], dict]:
+    """Method, path, body and headers re-creating a captured request"""
+    route = record["route"]
+    path = PARAM.sub(lambda m: fixtures.ids.get((m.group(1), record["params"].get(m.group(1))), "replay"), route)
+    query = {key: payloads.string(key) if value == STR else value for key, value in record["query"].items()}
+    if query:
+        path += "?" + urlencode(query)
+
+    headers = {}
+    role = record.get("role")
+    if role in fixtures.tokens:
+        headers["Authorization"] = f"Bearer {fixtures.tokens[role]}"
+    elif role:
+        headers["Authorization"] = "Bearer invalid"
+    if record.get("tenant"):
+        headers["X-Tenant-ID"] = fixtures.tenant(record["tenant"])
+    if record.get("idempotency_key"):
+        headers["Idempotency-Key"] = str(uuid.uuid4())
+
+    body = None
+    shape = record.get("body")
+    if shape:
+        headers["Content-Type"] = shape["type"]
+        schema = payloads.request_schema(record["method"], route)
+        features = payloads.features_for(route)
+        if route == LOGIN_ROUTE:
+            # Log in for real, so the replay pays for the password check like production did
+            body = json.dumps({"email": fixtures.accounts["DOCTOR"], "password": fixtures.password, "role": "DOCTOR"}).encode()
+        elif "shape" not in shape:
+            body = b" " * shape["bytes"]
+        elif shape["type"] in ("application/x-ndjson", "application/jsonl"):
+            body = "".join(
+                json.dumps(payloads.generate(shape["shape"], schema, features=features)) + "\n"
+                for _ in range(shape["lines"])
+            ).encode()
+        elif shape["type"] == "application/x-www-form-urlencoded":
+            body = urlencode(payloads.generate(shape["shape"], schema, features=features)).encode()
+        else:
+            body = json.dumps(payloads.generate(shape["shape"], schema, features=features)).encode()
+    return record["method"], path, body, headers
+
+def replay(records: list[dict], client: Client, payloads: SyntheticPayloads, fixtures: Fixtures,
+           speed: float, max_concurrency: int) -> list[dict]:
+    """Issue the requests open-loop at their captured offsets scaled by `speed`"""
+    # Everything is built up front so generating payloads doesn't skew the timing
+    requests = [build_request(record, payloads, fixtures) for record in records]
+    results: list[Optional[dict]] = [None] * len(records)
+    origin = records[0]["ts"] if records else 0
+
+    def issue(i: int, scheduled: float) -> None:
+        method, path, body, headers = requests[i]
+        started = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body, headers)
+        except OSError:
+            status = None
+        record = records[i]
+        results[i] = {
+            "route": f"{record['method']} {record['route']}",
+            "status": status,
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+            "lag_ms": round((started - scheduled) * 1000, 3),
+            "captured_status": record.get("status"),
+            "captured_ms": record.get("ms"),
+        }
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="replay") as pool:
+        start = time.perf_counter()
+        for i, record in enumerate(records):
+            scheduled = start + (record["ts"] - origin) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(issue, i, scheduled)
+    return results
+
+def summarize(results: list[dict]) -> dict:
+    by_route: dict[str, list[dict]] = {}
+    for result in results:
+        by_route.setdefault(result["route"], []).append(result)
+    summary = {}
+    for route, items in sorted(by_route.items()):
+        ms = np.array([r["ms"] for r in items])
+        summary[route] = {
+            "n": len(items),
+            "errors": sum(1 for r in items if r["status"] is None or r["status"] >= 500),
+            "p50": float(np.percentile(ms, 50)),
+            "p95": float(np.percentile(ms, 95)),
+            "p99": float(np.percentile(ms, 99)),
+        }
+    return summary
+
+def compare(base: dict, candidate: dict, threshold: float, min_samples: int) -> bool:
+    """Print per-route latency changes; True if any route regressed beyond the threshold"""
+    a, b = summarize(base["requests"]), summarize(candidate["requests"])
+    regressed = False
+    print(f"{'route':60s} {'n':>6s} {'p50 ms':>17s} {'p95 ms':>17s} {'p99 ms':>17s} {'5xx':>9s}")
+    for route in sorted(set(a) | set(b)):
+        if route not in a or route not in b:
+            print(f"{route:60s} only in {'base' if route in a else 'candidate'}")
+            continue
+        x, y = a[route], b[route]
+        cells, flag = [], ""
+        for q in ("p50", "p95", "p99"):
+            change = y[q] / x[q] - 1 if x[q] else 0.0
+            cells.append(f"{x[q]:7.1f}>{y[q]:7.1f}{change:+4.0%}")
+            # p99 is too noisy to gate on with few samples
+            if q != "p99" and change > threshold and min(x["n"], y["n"]) >= min_samples:
+                flag = "  REGRESSED"
+        regressed |= bool(flag)
+        print(f"{route:60s} {min(x['n'], y['n']):6d} {' '.join(cells)} {x['errors']:4d}>{y['errors']:<4d}{flag}")
+    return regressed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Replay a capture file and record latencies")
+    run_parser.add_argument("capture")
+    run_parser.add_argument("--out", required=True, help="Results file, input to `compare`")
+    run_parser.add_argument("--app-dir", default=".", help="Build to boot (a backend/app directory)")
+    run_parser.add_argument("--target", help="URL of an already running app instead of booting one")
+    run_parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--speed", type=float, default=1.0, help="Time scale: 2 replays twice as fast")
+    run_parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--max-concurrency", type=int, default=256)
+    run_parser.add_argument("--max-fixtures", type=int, default=200, help="Fixtures created per path parameter")
+    compare_parser = commands.add_parser("compare", help="Compare the latencies of two runs")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative p50/p95 increase that fails")
+    compare_parser.add_argument("--min-samples", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.base) as f, open(args.candidate) as g:
+            regressed = compare(json.load(f), json.load(g), args.threshold, args.min_samples)
+        sys.exit(1 if regressed else 0)
+
+    records = read_capture(args.capture, args.limit)
+    print(f"Replaying {len(records)} requests at {args.speed}x")
+    with nullcontext() if args.target else AppProcess(args.app_dir, args.mongo_uri, args.workers) as app:
+        client = Client(args.target or app.url)
+        baseline_path = os.path.join(args.app_dir, "pretrained", "drift_baseline.json")
+        baseline = json.load(open(baseline_path)) if os.path.exists(baseline_path) else None
+        payloads = SyntheticPayloads(route_schemas(), baseline, args.seed)
+        fixtures = Fixtures(client, payloads, args.max_fixtures)
+        fixtures.prepare(records)
+        results = replay(records, client, payloads, fixtures, args.speed, args.max_concurrency)
+
+    with open(args.out, "w") as f:
+        json.dump({
+            "meta": {"capture": args.capture, "app_dir": os.path.abspath(args.app_dir), "target": args.target,
+                     "speed": args.speed, "seed": args.seed, "requests": len(results)},
+            "requests": results,
+        }, f)
+    for route, stats in summarize(results).items():
+        print(f"{route:60s} n={stats['n']:<6d} p50 {stats['p50']:7.1f} ms  p95 {stats['p95']:7.1f} ms  "
+              f"p99 {stats['p99']:7.1f} ms  5xx {stats['errors']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# capture/shapes.py
+"""
+Payload shapes: the structure of a request body without any of its values.
+
+Captured traffic keeps only shapes, so no PHI (names, emails, clinical
+measurements) ever reaches the capture file. A shape keeps what matters for
+performance: field names, which optional fields were null, scalar types and
+list lengths. The replay tool turns a shape back into a synthetic payload
+that passes the same validation, using the route's request schema for
+enums and bounds and the training data distribution (drift baseline) for
+model features.
+"""
+import json
+import random
+from datetime import date, timedelta
+from typing import Any, Optional
+from urllib.parse import parse_qsl
+
+NULL = "null"
+BOOL = "bool"
+INT = "int"
+FLOAT = "float"
+STR = "str"
+
+def shape_of(value: Any) -> Any:
+    """
+    Shape of a decoded JSON value: scalars become their type name, dicts keep
+    their keys, lists become ["list", length, shape of the first item]
+    """
+    if value is None:
+        return NULL
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return INT
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, str):
+        return STR
+    if isinstance(value, dict):
+        return {str(key): shape_of(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return ["list", len(value), shape_of(value[0]) if value else NULL]
+    return STR
+
+def body_shape(content_type: str, head: bytes, size: int, lines: int, truncated: bool) -> Optional[dict]:
+    """
+    Shape of a request body from its first bytes (`head`), total size and
+    number of lines, so large uploads never have to be held in memory
+    """
+    if size == 0:
+        return None
+    media_type = content_type.split(";")[0].strip().lower()
+    shape: dict = {"type": media_type, "bytes": size}
+    try:
+        if media_type == "application/json" and not truncated:
+            shape["shape"] = shape_of(json.loads(head))
+        elif media_type in ("application/x-ndjson", "application/jsonl"):
+            first = head.split(b"\n", 1)[0]
+            shape["lines"] = lines
+            shape["shape"] = shape_of(json.loads(first)) if first.strip() else NULL
+        elif media_type == "application/x-www-form-urlencoded" and not truncated:
+            shape["shape"] = {key: STR for key, _ in parse_qsl(head.decode())}
+    except (ValueError, UnicodeDecodeError):
+        shape["invalid"] = True
+    return shape
+
+class SyntheticPayloads:
+    """Builds payloads matching a shape, deterministically for a given seed"""
+
+    def __init__(self, openapi: dict, baseline: Optional[dict] = None, seed: int = 0):
+        # Request schemas laid out like an OpenAPI document (paths and components)
+        self.openapi = openapi
+        self.baseline = baseline or {}
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def _resolve(self, schema: Optional[dict]) -> dict:
+        schema = schema or {}
+        while "$ref" in schema:
+            name = schema["$ref"].rsplit("/", 1)[-1]
+            schema = self.openapi.get("components", {}).get("schemas", {}).get(name, {})
+        # Optional[X] is anyOf [X, null]; generate X
+        for key in ("anyOf", "oneOf", "allOf"):
+            if key in schema:
+                options = [self._resolve(option) for option in schema[key]]
+                options = [option for option in options if option.get("type") != "null"] or options
+                return {**options[0], **{k: v for k, v in schema.items() if k != key}}
+        return schema
+
+    def features_for(self, route: str) -> Optional[dict]:
+        """Drift baseline of the disease a route scores, if any"""
+        for disease, features in self.baseline.items():
+            if disease in route:
+                return features
+        return None
+
+    def request_schema(self, method: str, route: str) -> dict:
+        operation = self.openapi.get("paths", {}).get(route, {}).get(method.lower(), {})
+        content = operation.get("requestBody", {}).get("content", {})
+        for media in content.values():
+            return self._resolve(media.get("schema"))
+        return {}
+
+    def full_shape(self, schema: Optional[dict]) -> Any:
+        """Shape of a payload with every field of `schema` present, for seeding fixtures"""
+        schema = self._resolve(schema)
+        kind = schema.get("type")
+        if kind == "object" or "properties" in schema:
+            return {key: self.full_shape(prop) for key, prop in schema.get("properties", {}).items()}
+        if kind == "array":
+            return ["list", 1, self.full_shape(schema.get("items"))]
+        return {"integer": INT, "number": FLOAT, "boolean": BOOL}.get(kind, STR)
+
+    def generate(self, shape: Any, schema: Optional[dict] = None, name: str = "", features: Optional[dict] = None) -> Any:
+        """
+        Synthetic value for `shape`. `features` is the drift baseline of the
+        disease the route scores, used for fields that are model inputs.
+        """
+        schema = self._resolve(schema)
+        if isinstance(shape, dict):
+            properties = schema.get("properties", {})
+            return {
+                key: self.generate(item, properties.get(key), key, features)
+                for key, item in shape.items()
+            }
+        if isinstance(shape, list):
+            _, length, item = shape
+            return [self.generate(item, schema.get("items"), name, features) for _ in range(length)]
+        if shape == NULL:
+            return None
+        if "enum" in schema:
+            return self.rng.choice(schema["enum"])
+        if features and name in features and shape in (INT, FLOAT):
+            value = self._from_baseline(features[name])
+            if value is not None:
+                return max(1, int(round(value))) if shape == INT else round(value, 2)
+        if shape == BOOL:
+            return self.rng.random() < 0.5
+        if shape in (INT, FLOAT):
+            low = schema.get("minimum", schema.get("exclusiveMinimum", 0))
+            high = schema.get("maximum", schema.get("exclusiveMaximum", low + 100))
+            if shape == INT:
+                return self.rng.randint(int(low) + 1, max(int(high), int(low) + 1))
+            return round(max(self.rng.uniform(low, high), low + 1e-3), 3)
+        return self.string(name, schema)
+
+    def _from_baseline(self, feature: dict) -> Optional[float]:
+        edges = feature.get("edges")
+        if not edges:
+            return None
+        # Drop the missing-value slot, then pick a bin by its training frequency
+        weights = feature["expected"][:len(edges) + 1]
+        if not sum(weights):
+            return None
+        bin_index = self.rng.choices(range(len(weights)), weights=weights)[0]
+        low = edges[bin_index - 1] if bin_index > 0 else edges[0] * 0.8
+        high = edges[bin_index] if bin_index < len(edges) else edges[-1] * 1.2
+        return self.rng.uniform(low, high)
+
+    def string(self, name: str, schema: Optional[dict] = None) -> str:
+        schema = schema or {}
+        self.counter += 1
+        n = self.counter
+        lowered = name.lower()
+        if schema.get("format") == "email" or "email" in lowered:
+            return f"replay-{n}@example.com"
+        if "password" in lowered:
+            return f"Replay!{n}Passw0rd"
+        if schema.get("format") == "date-time":
+            return f"{date(1950, 1, 1) + timedelta(days=self.rng.randrange(25000))}T00:00:00"
+        if schema.get("format") == "date":
+            return str(date(1950, 1, 1) + timedelta(days=self.rng.randrange(25000)))
+        if "name" in lowered:
+            return f"Replay Person {n}"
+        return f"replay-{n}"
@@ -0,0 +1,209 @@
+# concurrency/limiter.py
+"""
+Adaptive concurrency limits per route class.
+
+Each class (auth, crud, prediction, explain) has its own limit on requests in
+flight in this worker, adjusted from observed latency in the style of
+Netflix's Gradient2 limiter. Response times are averaged over windows of
+`concurrency_window_seconds`; a long-term average of those windows stands in
+for the unloaded latency. While a window's latency stays within
+`concurrency_rtt_tolerance` of it the limit grows by about sqrt(limit), and
+once requests start queueing and latency rises, the limit shrinks in
+proportion.
+An explicit overload signal from the app (a 503, e.g. a full inference
+queue) cuts the limit multiplicatively, AIMD style.
+
+Requests over the limit are rejected straight away instead of queueing in
+uvicorn and the threadpool. A share of each limit (`concurrency_doctor_reserve`)
+is only available to authenticated doctors, so patient and anonymous traffic
+is shed first.
+"""
+import math
+import re
+import time
+from typing import Callable, Optional
+from config.settings import settings
+
+AUTH = "auth"
+CRUD = "crud"
+PREDICTION = "prediction"
+EXPLAIN = "explain"
+ROUTE_CLASSES = (AUTH, CRUD, PREDICTION, EXPLAIN)
+
+# Predictions asking for an LLM explanation are as slow as the explain endpoint
+_LLM_LEVEL = re.compile(rb"(?:^|&)level=[12](?:&|$)")
+
+class GradientLimiter:
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        tolerance: float,
+        smoothing: float,
+        window: float,
+        long_window: int,
+        backoff: float,
+        doctor_reserve: float,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.window = window
+        self.long_alpha = 2 / (long_window + 1)
+        self.backoff = backoff
+        self.doctor_reserve = doctor_reserve
+        self.in_flight = 0
+        # Response times (seconds) of the current window
+        self._window_end = time.monotonic() + window
+        self._rtt_sum = 0.0
+        self._samples = 0
+        self._max_in_flight = 0
+        self.short_rtt: Optional[float] = None
+        self.long_rtt: Optional[float] = None
+        # Metrics
+        self.admitted = 0
+        self.shed = 0
+        self.shed_low_priority = 0
+        self.overloads = 0
+        self.peak_in_flight = 0
+
+    def try_acquire(self, is_priority: Callable[[], bool]) -> bool:
+        """
+        Take a slot, or return False if the request should be shed.
+        `is_priority` is only called once the unreserved share is used up.
+        """
+        if self.in_flight >= self.limit * (1 - self.doctor_reserve):
+            if self.in_flight >= self.limit or not is_priority():
+                self.shed += 1
+                if self.in_flight < self.limit:
+                    self.shed_low_priority += 1
+                return False
+        self.in_flight += 1
+        self.admitted += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return True
+
+    def release(self, rtt: Optional[float], in_flight: int, overloaded: bool = False) -> None:
+        """
+        Free the slot and record the response time. `in_flight` is the number
+        of requests in flight when this one was admitted.
+        """
+        self.in_flight -= 1
+        if overloaded:
+            self.overloads += 1
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            return
+        if rtt is None:
+            return
+        self._rtt_sum += rtt
+        self._samples += 1
+        self._max_in_flight = max(self._max_in_flight, in_flight)
+        now = time.monotonic()
+        if now >= self._window_end and self._samples >= 10:
+            self._update(self._rtt_sum / self._samples, self._max_in_flight)
+            self._window_end = now + self.window
+            self._rtt_sum = 0.0
+            self._samples = 0
+            self._max_in_flight = 0
+
+    def _update(self, rtt: float, in_flight: int) -> None:
+        self.short_rtt = rtt
+        if self.long_rtt is None:
+            self.long_rtt = rtt
+            return
+        self.long_rtt += (rtt - self.long_rtt) * self.long_alpha
+        # Latency has dropped well below the baseline (e.g. load went away):
+        # let the baseline catch up faster so the limit can grow again
+        if self.long_rtt > 2 * rtt:
+            self.long_rtt *= 0.95
+
+        # Far below the limit, latency says nothing about whether it could be higher
+        if in_flight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - self.smoothing) + target * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: about one response time"""
+        return max(1, math.ceil(self.long_rtt or 0))
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 1),
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "shed_low_priority": self.shed_low_priority,
+            "overloads": self.overloads,
+            "rtt_ms": round(self.short_rtt * 1000, 2) if self.short_rtt is not None else None,
+            "baseline_rtt_ms": round(self.long_rtt * 1000, 2) if self.long_rtt is not None else None,
+        }
+
+class ConcurrencyLimits:
+    """One limiter per route class; requests are mapped by path prefix"""
+
+    def __init__(self):
+        self.limiters = {
+            name: GradientLimiter(
+                name,
+                initial_limit=settings.concurrency_initial_limits.get(name, settings.concurrency_min_limit),
+                min_limit=settings.concurrency_min_limit,
+                max_limit=settings.concurrency_max_limit,
+                tolerance=settings.concurrency_rtt_tolerance,
+                smoothing=settings.concurrency_smoothing,
+                window=settings.concurrency_window_seconds,
+                long_window=settings.concurrency_baseline_window,
+                backoff=settings.concurrency_backoff,
+                doctor_reserve=settings.concurrency_doctor_reserve,
+            )
+            for name in ROUTE_CLASSES
+        }
+        # Longest prefix first, so /api/diagnosis/explain beats /api/diagnosis
+        self.prefixes = sorted(
+            ((prefix, name) for name, prefixes in settings.concurrency_route_classes.items() for prefix in prefixes),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+    def classify(self, path: str, query_string: bytes = b"") -> Optional[str]:
+        """Route class of a request, None for paths that are never limited"""
+        if any(path.startswith(prefix) for prefix in settings.concurrency_exempt_paths):
+            return None
+        for prefix, name in self.prefixes:
+            if path.startswith(prefix):
+                if name == PREDICTION and _LLM_LEVEL.search(query_string):
+                    return EXPLAIN
+                return name
+        return CRUD
+
+    def for_request(self, path: str, query_string: bytes = b"") -> Optional[GradientLimiter]:
+        name = self.classify(path, query_string)
+        return self.limiters[name] if name else None
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+    def metrics(self) -> str:
+        """Limits and counters in the Prometheus text format"""
+        lines = []
+        for metric, kind, key in (
+            ("xdoc_concurrency_limit", "gauge", "limit"),
+            ("xdoc_concurrency_in_flight", "gauge", "in_flight"),
+            ("xdoc_concurrency_admitted_total", "counter", "admitted"),
+            ("xdoc_concurrency_shed_total", "counter", "shed"),
+            ("xdoc_concurrency_shed_low_priority_total", "counter", "shed_low_priority"),
+        ):
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, limiter in self.limiters.items():
+                lines.append(f'{metric}{{route_class="{name}"}} {limiter.stats()[key]}')
+        return "\n".join(lines) + "\n"
+
+concurrency_limits = ConcurrencyLimits()
@@ -0,0 +1,71 @@
+# concurrency/middleware.py
+import time
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth.models import RoleEnum
+from auth.services import verify_token
+from config.settings import settings
+from utils.responses import dumps
+from .limiter import concurrency_limits
+
+def _is_doctor(headers: Headers) -> bool:
+    scheme, _, token = headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        return verify_token(token).role == RoleEnum.DOCTOR
+    except Exception:
+        return False
+
+class ConcurrencyLimitMiddleware:
+    """
+    Sheds requests over their route class's adaptive concurrency limit with
+    503 and Retry-After. Placed outside the tenant middleware, so a shed
+    request costs no database lookups.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.concurrency_enabled:
+            return await self.app(scope, receive, send)
+        limiter = concurrency_limits.for_request(scope["path"], scope.get("query_string", b""))
+        if limiter is None:
+            return await self.app(scope, receive, send)
+
+        if not limiter.try_acquire(lambda: _is_doctor(Headers(scope=scope))):
+            return await self._shed(send, limiter.name, limiter.retry_after())
+
+        in_flight = limiter.in_flight
+        start = time.perf_counter()
+        rtt: Optional[float] = None
+        status = None
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal rtt, status
+            # Time to the first byte, so streamed exports don't count their transfer time
+            if message["type"] == "http.response.start":
+                rtt = time.perf_counter() - start
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            limiter.release(rtt, in_flight, overloaded=status == 503)
+
+    @staticmethod
+    async def _shed(send: Send, route_class: str, retry_after: int) -> None:
+        body = dumps({"detail": f"Server overloaded ({route_class} requests), retry later"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
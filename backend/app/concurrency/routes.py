@@ -0,0 +1,21 @@
+# concurrency/routes.py
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from auth.services import require_admin
+from .limiter import concurrency_limits
+
+router = APIRouter(prefix="/admin/concurrency", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/")
+async def get_concurrency_limits():
+    """
+    Current limit, requests in flight and shed counts per route class in this worker
+    """
+    return concurrency_limits.stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_concurrency_metrics():
+    """
+    Concurrency limits and shed counts in the Prometheus text format, for scraping
+    """
+    return concurrency_limits.metrics()
@@ -1,5 +1,6 @@
 # config/settings.py
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     MONGO_URI: str = "mongodb://localhost:27017"
@@ -15,6 +16,243 @@ class Settings(BaseSettings):
     use_tenant_collections: bool = False
     # Default tenant ID for single-tenant mode or system-wide operations
     default_tenant_id: str = "default"
+    # Seconds between reloads of per-tenant routes written by hospital.migrate
+    tenant_routes_refresh_interval: float = 30.0
+    # Cached user -> tenant lookups used to route requests
+    tenant_cache_size: int = 10000
+    tenant_cache_ttl: float = 300.0
+
+    # Key for blind-index tokens of encrypted fields; derived from jwt_secret_key when unset.
+    # Changing it requires re-running the patient backfill job.
+    blind_index_key: Optional[str] = None
+
+    # Field encryption settings
+    # Secrets of the field encryption keys by key id. Key "0" is derived from jwt_secret_key
+    # unless listed here, so list it with the old secret before rotating the JWT secret.
+    encryption_keys: dict[str, str] = {}
+    # Key id new values are encrypted with; the others are only used for decryption
+    encryption_active_key: str = "0"
+    # Background re-encryption of patients still using other keys (python -m patient.rotation)
+    key_rotation_enabled: bool = True
+    # Patients per bulk_write, seconds to pause between batches, and seconds between walks
+    key_rotation_batch_size: int = 500
+    key_rotation_batch_pause: float = 0.5
+    key_rotation_interval: float = 3600.0
+    # Seconds a worker owns a collection's walk without making progress before another may take over
+    key_rotation_lease_seconds: float = 120.0
+    # Patients read with an older key queued for lazy re-encryption, and seconds between writes
+    key_rotation_lazy_max_pending: int = 10000
+    key_rotation_lazy_flush_interval: float = 5.0
+
+    # Admin settings
+    # Shared secret expected in the X-Admin-Token header for operational endpoints
+    admin_api_key: Optional[str] = None
+
+    # Profiling settings
+    # Fraction of requests profiled automatically (0 disables sampling)
+    profiling_sample_rate: float = 0.0
+    # Interval between stack samples of a profiled request
+    profiling_interval_ms: float = 2.0
+    # Directory where captured profiles are written
+    profiling_dir: str = "profiles"
+    # Maximum number of profiles kept on disk, oldest are removed first
+    profiling_max_profiles: int = 50
+
+    # Tracing settings
+    # Fraction of requests traced (0 traces only requests that ask for it)
+    tracing_sample_rate: float = 0.0
+    # "file", "otlp" (JSON over HTTP, e.g. to python -m tracing.collector) or "none"
+    tracing_exporter: str = "file"
+    # Rotating trace file used by the file exporter
+    tracing_file: str = "traces/traces.ndjson"
+    tracing_file_max_bytes: int = 10 * 1024 * 1024
+    tracing_file_backups: int = 5
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    tracing_service_name: str = "xdoc-api"
+    # Finished traces kept in memory per worker for /admin/traces
+    tracing_recent_traces: int = 200
+
+    # Traffic capture settings (replayed with python -m capture.replay)
+    # Record request shapes and timings; no payload values or identifiers are stored
+    capture_enabled: bool = False
+    capture_sample_rate: float = 1.0
+    # Gzip-compressed NDJSON, appended to by every worker
+    capture_file: str = "captures/traffic.ndjson.gz"
+    # Bytes of each body inspected for its shape; larger JSON bodies keep only their size
+    capture_max_body_bytes: int = 1024 * 1024
+    # Query parameters recorded with their values; others are recorded as present only
+    capture_query_params: list[str] = [
+        "level", "audience", "top_k", "limit", "exact", "dataset", "format", "gzip", "batch_size",
+    ]
+    capture_exclude_paths: list[str] = ["/api/admin", "/docs", "/openapi.json"]
+
+    # Model artifact settings
+    # Directory holding the model artifacts and their manifest.json
+    model_dir: str = "pretrained"
+    # Seconds between checks of the manifest for hot reload, 0 disables watching
+    model_watch_interval: float = 5.0
+
+    # Explanation settings
+    # Maximum number of cached LLM explanations (level 1)
+    explanation_cache_size: int = 2048
+    # Seconds a cached LLM explanation stays valid
+    explanation_cache_ttl: int = 86400
+
+    # LLM admission control and circuit breaker settings
+    # "gemini", or "fake" for the local fault-injecting stand-in
+    llm_backend: str = "gemini"
+    # Seconds to wait for an LLM answer before falling back to the template
+    llm_timeout_seconds: float = 15.0
+    # Maximum LLM calls in flight per process (including timed-out ones still running)
+    llm_max_concurrency: int = 8
+    # Token bucket limits, shared by all tenants and per tenant
+    llm_global_rate_per_minute: float = 600
+    llm_global_burst: int = 50
+    llm_tenant_rate_per_minute: float = 60
+    llm_tenant_burst: int = 10
+    # Most tenant buckets kept per process; idle ones are dropped once they would be full again
+    llm_tenant_buckets: int = 10000
+    # Consecutive failures (errors, timeouts or SLO breaches) that open the circuit
+    llm_breaker_failure_threshold: int = 5
+    # Calls slower than this count as failures for the breaker
+    llm_breaker_latency_slo_seconds: float = 8.0
+    # Seconds the circuit stays open before half-open probing
+    llm_breaker_open_seconds: float = 30.0
+    # Concurrent probe calls allowed while half-open
+    llm_breaker_half_open_probes: int = 1
+    # Retries of failed LLM calls (within llm_timeout_seconds); timeouts are not retried
+    llm_max_retries: int = 1
+    # Retry budget: each call earns this many retries, at most llm_retry_budget_capacity saved up
+    llm_retry_budget_ratio: float = 0.1
+    llm_retry_budget_capacity: float = 10
+    # Fake LLM behaviour (llm_backend="fake")
+    fake_llm_latency_ms: float = 200
+    fake_llm_failure_rate: float = 0.0
+
+    # LLM usage accounting settings
+    # Seconds between writes of the aggregated usage counts to MongoDB
+    llm_usage_flush_interval: float = 10.0
+    # Price per million prompt and output tokens, for cost estimates (gemini-2.0-flash)
+    llm_input_cost_per_million: float = 0.10
+    llm_output_cost_per_million: float = 0.40
+    # Daily spend in USD after which a tenant gets cached or templated explanations, 0 is unlimited
+    llm_tenant_daily_budget: float = 0.0
+    # Per-tenant overrides, e.g. {"hospital_a": 5.0}
+    llm_tenant_budgets: dict[str, float] = {}
+
+    # Entity cache settings (patient, doctor and hospital lookups)
+    entity_cache_size: int = 10000
+    # Seconds an entry may be served; bounds staleness when change streams are unavailable
+    entity_cache_ttl: float = 60.0
+    # Invalidate entries from a MongoDB change stream (requires a replica set)
+    entity_cache_change_stream: bool = True
+    # Seconds before reopening a failed change stream
+    entity_cache_retry_seconds: float = 5.0
+
+    # Idempotency-Key settings
+    # Path prefixes of POST endpoints that honour the Idempotency-Key header
+    idempotency_paths: list[str] = ["/api/diagnosis/predict"]
+    # Seconds a completed response is kept for replay (TTL index, applied when the index is created)
+    idempotency_ttl_seconds: int = 86400
+    # Seconds a worker may hold a key while executing before another worker may take it over
+    idempotency_lock_seconds: float = 120.0
+    # Seconds a duplicate waits for the in-flight request before getting 409
+    idempotency_wait_seconds: float = 60.0
+    # Seconds between checks of a key held by another worker
+    idempotency_poll_seconds: float = 0.2
+
+    # Audit log settings (patient record access)
+    # Events held in memory before overflowing to the spill file
+    audit_buffer_size: int = 100000
+    # Events per insert_many, and seconds between flushes of a partial batch
+    audit_batch_size: int = 500
+    audit_flush_interval: float = 1.0
+    # Append-only file used while MongoDB is unavailable, replayed afterwards
+    audit_spill_path: str = "audit_spill.ndjson"
+    # "timeseries" (MongoDB 5+, expired after the retention period) or "capped"
+    audit_collection_kind: str = "timeseries"
+    audit_retention_days: int = 2190
+    audit_capped_bytes: int = 1024 * 1024 * 1024
+    # Seconds allowed for draining the buffer on shutdown
+    audit_shutdown_timeout: float = 10.0
+
+    # Drift monitoring settings
+    # Seconds per counting window; scores cover the current and previous window
+    drift_window_seconds: float = 3600.0
+    # Inputs a tenant needs before its drift scores are reported
+    drift_min_samples: int = 100
+    # Most (disease, tenant) pairs tracked; the least recently started are dropped beyond it
+    drift_max_tenants: int = 1000
+    # PSI at which a feature is flagged as drifted (0.1 moderate, 0.25 major)
+    drift_psi_alert: float = 0.2
+
+    # Adaptive concurrency limit settings (per worker, per route class)
+    concurrency_enabled: bool = True
+    # Path prefixes of each route class; the longest match wins and other paths are "crud"
+    concurrency_route_classes: dict[str, list[str]] = {
+        "auth": ["/api/auth"],
+        "prediction": ["/api/diagnosis"],
+        "explain": ["/api/diagnosis/explain"],
+    }
+    # Paths never limited, so operators can still inspect an overloaded worker
+    concurrency_exempt_paths: list[str] = ["/api/admin", "/docs", "/openapi.json"]
+    concurrency_initial_limits: dict[str, int] = {"auth": 20, "crud": 50, "prediction": 20, "explain": 8}
+    concurrency_min_limit: int = 2
+    concurrency_max_limit: int = 500
+    # Latency may rise this far above the baseline before the limit shrinks
+    concurrency_rtt_tolerance: float = 1.5
+    # Seconds of responses averaged per limit update, weight of each update in the limit,
+    # and updates averaged into the baseline latency (600 one-second windows = 10 minutes)
+    concurrency_window_seconds: float = 1.0
+    concurrency_smoothing: float = 0.2
+    concurrency_baseline_window: int = 600
+    # Factor applied to the limit when the app itself reports overload (503)
+    concurrency_backoff: float = 0.9
+    # Share of each limit only authenticated doctors may use
+    concurrency_doctor_reserve: float = 0.2
+
+    # Inference scheduler settings
+    # Threads running model inference per process, 0 uses min(CPUs per server worker, 4)
+    inference_workers: int = 0
+    # Threads each inference job may use in XGBoost, OpenMP and BLAS, 0 splits the
+    # server worker's CPUs between its inference threads (see ml/threads.py)
+    native_threads: int = 0
+    # Jobs a tenant may have waiting per priority class before requests are rejected
+    scheduler_max_queue_per_tenant: int = 1000
+    # While interactive and bulk work are both waiting, every Nth job is bulk
+    scheduler_bulk_every: int = 10
+    # Relative share per tenant, e.g. {"hospital_a": 2.0}; unlisted tenants get 1.0
+    scheduler_tenant_weights: dict[str, float] = {}
+    # Rows per scheduled job and per request for bulk screening
+    screening_chunk_size: int = 256
+    screening_max_rows: int = 10000
+    # Largest what-if grid (product of the swept axes' lengths) scored per request
+    whatif_max_points: int = 2500
+    # Counterfactual search: states kept per depth, most features changed at once,
+    # and the time budget after which the best solutions found so far are returned
+    counterfactual_beam_width: int = 32
+    counterfactual_max_changes: int = 3
+    counterfactual_budget_ms: float = 250.0
+
+    # Production server settings (serve.py)
+    # Number of worker processes, 0 sizes the pool from available CPUs and memory
+    server_workers: int = 0
+    # Expected resident memory per worker, used when auto-sizing the pool
+    server_worker_memory_mb: int = 512
+    # Seconds between per-worker memory reports, 0 disables them
+    server_memory_report_interval: int = 60
+
+    # Bulk patient import settings
+    # Rows validated, hashed and written per batch
+    import_batch_size: int = 500
+    # Threads hashing passwords during an import, 0 uses one per CPU
+    import_hash_workers: int = 0
+
+    # Export settings
+    # Documents read from the cursor, decrypted and written per batch
+    export_batch_size: int = 1000
+    # Threads decrypting patient fields during an export, 0 uses one per CPU
+    export_decrypt_workers: int = 0
     
     class Config:
         env_file = ".env"  # Optional: load environment variables from a file
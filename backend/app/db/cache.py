@@ -0,0 +1,134 @@
+# db/cache.py
+"""
+Read-through caches for rarely changing records (patients, doctors, hospitals).
+
+Entries are keyed by entity id and remember the collection they were read
+from, so a cached record is only served when the lookup resolves to the same
+tenant collection. Secondary lookups (account id, product key) map to the
+entity id and are re-checked against the cached record. Entries are dropped
+by writes made through the service layer and, on replica sets, by a change
+stream watcher that also sees writes from other processes.
+"""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+from config.settings import settings
+from utils.cache import TTLCache
+
+# Fills slower than this are not cached, so invalidations only need remembering this long
+FILL_WINDOW_SECONDS = 30.0
+
+class EntityCache:
+    def __init__(self, entity: str, maxsize: int, ttl: float):
+        self.entity = entity
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._aliases = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.invalidations = 0
+        # A value read from Mongo before its entity was invalidated must not be
+        # cached after it: entity id -> time of its last invalidation, oldest first
+        self._invalidated: OrderedDict[str, float] = OrderedDict()
+        # Bumped by clear(), which invalidates everything
+        self._epoch = 0
+
+    def get(self, entity_id: Hashable, collection: str) -> Optional[Any]:
+        entry = self._entries.get(str(entity_id))
+        if entry is None or entry[0] != collection:
+            return None
+        # Callers may modify what they get back, so hand out copies
+        return entry[1].model_copy()
+
+    def generation(self) -> tuple[int, float]:
+        """Take before reading from Mongo and pass to set()"""
+        return self._epoch, time.monotonic()
+
+    def set(self, entity_id: Hashable, collection: str, value: Any, generation: tuple[int, float]) -> None:
+        epoch, started = generation
+        if epoch != self._epoch or time.monotonic() - started > FILL_WINDOW_SECONDS:
+            return
+        invalidated = self._invalidated.get(str(entity_id))
+        if invalidated is None or invalidated < started:
+            self._entries.set(str(entity_id), (collection, value))
+
+    def get_alias(self, alias: Hashable) -> Optional[str]:
+        return self._aliases.get(alias)
+
+    def set_alias(self, alias: Hashable, entity_id: Hashable) -> None:
+        self._aliases.set(alias, str(entity_id))
+
+    def invalidate(self, entity_id: Hashable) -> None:
+        now = time.monotonic()
+        self._invalidated[str(entity_id)] = now
+        self._invalidated.move_to_end(str(entity_id))
+        while self._invalidated:
+            oldest_id, oldest = next(iter(self._invalidated.items()))
+            if now - oldest <= FILL_WINDOW_SECONDS:
+                break
+            del self._invalidated[oldest_id]
+        self._entries.delete(str(entity_id))
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+        self._aliases.clear()
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "aliases": self._aliases.stats(), "invalidations": self.invalidations}
+
+patient_cache = EntityCache("patient", settings.entity_cache_size, settings.entity_cache_ttl)
+doctor_cache = EntityCache("doctor", settings.entity_cache_size, settings.entity_cache_ttl)
+hospital_cache = EntityCache("hospital", settings.entity_cache_size, settings.entity_cache_ttl)
+
+ENTITY_CACHES = {cache.entity: cache for cache in (patient_cache, doctor_cache, hospital_cache)}
+
+# Collection name (or tenant-prefixed suffix) -> cache to invalidate
+_COLLECTION_CACHES = {"patients": patient_cache, "doctors": doctor_cache, "hospitals": hospital_cache}
+
+def cache_stats() -> dict:
+    return {entity: cache.stats() for entity, cache in ENTITY_CACHES.items()}
+
+def _cache_for_collection(name: str) -> Optional[EntityCache]:
+    # Tenant-routed collections are named "<tenant>_patients"
+    return _COLLECTION_CACHES.get(name) or _COLLECTION_CACHES.get(name.rsplit("_", 1)[-1])
+
+async def watch_changes(db: AsyncIOMotorDatabase) -> None:
+    """
+    Invalidate cached entities on updates, replacements and deletes seen on a
+    cluster change stream, covering the main database and tenant databases
+    ("<db>_<tenant>"), resuming after transient errors. Change
+    streams need a replica set; on a standalone server this logs and returns,
+    leaving TTL expiry and service-layer invalidation in place.
+    """
+    pipeline = [{"$match": {
+        "operationType": {"$in": ["update", "replace", "delete"]},
+        "ns.db": {"$regex": f"^{re.escape(db.name)}"},
+    }}]
+    resume_token = None
+    while True:
+        try:
+            async with db.client.watch(pipeline, resume_after=resume_token) as stream:
+                print("Watching MongoDB change stream for cache invalidation")
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    cache = _cache_for_collection(change["ns"]["coll"])
+                    if cache is not None:
+                        cache.invalidate(change["documentKey"]["_id"])
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            # Not a replica set (code 40573), or the resume point is gone
+            if e.code == 40573 or "replica set" in str(e):
+                print(f"Change streams unavailable, cache relies on TTL and write invalidation: {e}")
+                return
+            print(f"Change stream error, restarting: {e}")
+            resume_token = None
+            # Changes may have been missed
+            for cache in ENTITY_CACHES.values():
+                cache.clear()
+        except Exception as e:
+            print(f"Change stream error, retrying: {e}")
+        await asyncio.sleep(settings.entity_cache_retry_seconds)
@@ -1,56 +1,181 @@
 # db/mongo.py
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
 from config.settings import settings
 from hospital.context import get_current_tenant_id
+from tracing.mongo import command_tracer
 from typing import Optional
 
+# Collections that hold per-tenant data and can be routed to a tenant's own
+# collections or database. Everything else (accounts, hospitals, ...) stays shared.
+TENANT_COLLECTIONS = ("patients", "doctors", "diagnoses")
+
+# Routing modes, per tenant
+SHARED = "shared"
+COLLECTIONS = "collections"
+DATABASE = "database"
+
 # Create a global client instance
 print("Connecting to MongoDB...: ", settings.MONGO_URI)
-client: AsyncIOMotorClient = AsyncIOMotorClient(settings.MONGO_URI)
+client: AsyncIOMotorClient = AsyncIOMotorClient(settings.MONGO_URI, event_listeners=[command_tracer])
 async def get_database() -> AsyncIOMotorDatabase:
     """
     Dependency function to retrieve the MongoDB database.
     If tenant context is set, it will use tenant-specific collections.
-    
-    This supports a multi-collection approach to multi-tenancy, where 
+
+    This supports a multi-collection approach to multi-tenancy, where
     each tenant's data is prefixed in collection names.
     """
     # Using a single database for all tenants
     db = client[settings.MONGO_DB_NAME]
     return db
 
+def tenant_database_name(tenant_id: str, base_name: Optional[str] = None) -> str:
+    return f"{base_name or settings.MONGO_DB_NAME}_{tenant_id}"
+
+def tenant_collection_prefix_name(base_collection: str, tenant_id: str) -> str:
+    return f"{tenant_id}_{base_collection}"
+
 async def get_tenant_database(tenant_id: Optional[str] = None) -> AsyncIOMotorDatabase:
     """
     Get a database for a specific tenant.
     If tenant_id is not provided, uses the current tenant context.
-    
+
     This supports a multi-database approach where each tenant gets its own database.
     """
     # If no tenant ID provided, try to get from context
     if not tenant_id:
         tenant_id = get_current_tenant_id()
-    
+
     # If we have a tenant ID and want multi-db, return tenant-specific database
-    if tenant_id and settings.use_tenant_databases:
-        return client[f"{settings.mongodb_db_name}_{tenant_id}"]
-    
+    if tenant_id and tenant_router.mode(tenant_id) == DATABASE:
+        return client[tenant_database_name(tenant_id)]
+
     # Otherwise return the default database
-    return client[settings.mongodb_db_name]
+    return client[settings.MONGO_DB_NAME]
 
 def get_tenant_collection_name(base_collection: str, tenant_id: Optional[str] = None) -> str:
     """
     Get a collection name for a specific tenant.
     If tenant_id is not provided, uses the current tenant context.
-    
+
     This supports a multi-collection approach where each tenant's collections have a prefix.
     """
     # If no tenant ID provided, try to get from context
     if not tenant_id:
         tenant_id = get_current_tenant_id()
-    
+
     # If we have a tenant ID and want multi-collection, return prefixed collection name
-    if tenant_id and settings.use_tenant_collections:
-        return f"{tenant_id}_{base_collection}"
-    
+    if tenant_id and base_collection in TENANT_COLLECTIONS and tenant_router.mode(tenant_id) == COLLECTIONS:
+        return tenant_collection_prefix_name(base_collection, tenant_id)
+
     # Otherwise return the base collection name
-    return base_collection
\ No newline at end of file
+    return base_collection
+
+class TenantRouter:
+    """
+    Resolves where a tenant's data lives and caches the collection handles.
+
+    The global use_tenant_databases / use_tenant_collections settings route
+    every known tenant; otherwise tenants are routed individually from the
+    `tenant_routes` collection, written by the migration tool (hospital.migrate)
+    once a tenant's data has been moved out of the shared collections.
+
+    Known tenants are those with a route or a hospital document, reloaded by
+    refresh(). Any other tenant id, e.g. one only named in a request header,
+    uses the shared collections, so it can't open databases or grow the cache.
+    """
+
+    def __init__(self):
+        self._routes: dict[str, str] = {}
+        self._tenants: set[str] = set()
+        self._handles: dict[tuple, AsyncIOMotorCollection] = {}
+
+    def mode(self, tenant_id: Optional[str]) -> str:
+        if not tenant_id or tenant_id not in self._tenants:
+            return SHARED
+        if settings.use_tenant_databases:
+            return DATABASE
+        if settings.use_tenant_collections:
+            return COLLECTIONS
+        return self._routes.get(tenant_id, SHARED)
+
+    def collection(
+        self,
+        db: AsyncIOMotorDatabase,
+        name: str,
+        tenant_id: Optional[str] = None,
+        mode: Optional[str] = None,
+    ) -> AsyncIOMotorCollection:
+        """
+        Collection handle for `name`, routed for the given tenant (defaults to
+        the current tenant context). `mode` overrides the tenant's current route.
+        """
+        tenant_id = tenant_id or get_current_tenant_id()
+        if name not in TENANT_COLLECTIONS or not tenant_id:
+            mode = SHARED
+        else:
+            mode = mode or self.mode(tenant_id)
+        key = (db.name, name, mode, tenant_id if mode != SHARED else None)
+        handle = self._handles.get(key)
+        if handle is None:
+            if mode == DATABASE:
+                handle = db.client[tenant_database_name(tenant_id, db.name)][name]
+            elif mode == COLLECTIONS:
+                handle = db[tenant_collection_prefix_name(name, tenant_id)]
+            else:
+                handle = db[name]
+            # Only cache handles of known tenants; explicit modes (migrations) may name others
+            if mode == SHARED or tenant_id in self._tenants:
+                self._handles[key] = handle
+        return handle
+
+    def collections(self, db: AsyncIOMotorDatabase, name: str) -> list[AsyncIOMotorCollection]:
+        """The shared collection followed by every individually routed tenant's copy"""
+        handles = [self.collection(db, name, mode=SHARED)]
+        for tenant_id in sorted(self._routes):
+            if self.mode(tenant_id) != SHARED:
+                handles.append(self.collection(db, name, tenant_id))
+        return handles
+
+    async def refresh(self, db: AsyncIOMotorDatabase) -> None:
+        routes = await db["tenant_routes"].find({}, {"mode": 1}).to_list(length=None)
+        hospitals = await db["hospitals"].find({}, {"_id": 1}).to_list(length=None)
+        routes = {route["_id"]: route["mode"] for route in routes}
+        tenants = set(routes) | {str(hospital["_id"]) for hospital in hospitals}
+        if routes != self._routes or tenants != self._tenants:
+            # Drop handles of tenants that were removed or moved
+            self._handles = {}
+        self._routes = routes
+        self._tenants = tenants
+
+    def add_tenant(self, tenant_id: str) -> None:
+        """Know a tenant created by this process before the next refresh"""
+        self._tenants.add(tenant_id)
+
+    async def set_route(self, db: AsyncIOMotorDatabase, tenant_id: str, mode: str) -> None:
+        if mode not in (SHARED, COLLECTIONS, DATABASE):
+            raise ValueError(f"Unknown routing mode: {mode}")
+        await db["tenant_routes"].update_one({"_id": tenant_id}, {"$set": {"mode": mode}}, upsert=True)
+        self._routes[tenant_id] = mode
+        self._tenants.add(tenant_id)
+
+tenant_router = TenantRouter()
+
+def tenant_collection(db: AsyncIOMotorDatabase, name: str, tenant_id: Optional[str] = None) -> AsyncIOMotorCollection:
+    """
+    Collection handle routed for a tenant (defaults to the current tenant context)
+    """
+    return tenant_router.collection(db, name, tenant_id)
+
+async def watch_tenant_routes(interval: float) -> None:
+    """
+    Periodically reload tenant routes so every worker process picks up
+    tenants migrated by another process
+    """
+    while True:
+        try:
+            await tenant_router.refresh(await get_database())
+        except Exception as e:
+            print(f"Could not refresh tenant routes: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,13 @@
+# db/routes.py
+from fastapi import APIRouter, Depends
+from auth.services import require_admin
+from .cache import cache_stats
+
+router = APIRouter(prefix="/admin/cache", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/")
+async def get_cache_status():
+    """
+    Hit rate, size and invalidation counts of the entity caches, per entity type
+    """
+    return cache_stats()
@@ -0,0 +1,183 @@
+# diag/idempotency.py
+"""
+Idempotency-Key support for prediction requests.
+
+The first request with a given key runs normally and its response is stored
+in the `idempotency_keys` collection (expired by a TTL index). Retries with
+the same key get the stored response back without re-running inference or
+the LLM. Duplicates arriving while the first is still running wait for it:
+on the same worker through an in-process future, on other workers by polling
+the stored record. Keys are scoped to the tenant and the caller's credentials,
+and reusing a key for a different request is rejected with 422.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from bson import Binary
+from pymongo.errors import DuplicateKeyError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.settings import settings
+from db.mongo import get_database
+from hospital.context import get_current_tenant_id
+from utils.responses import dumps
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+# Response headers worth replaying; length and framing are recomputed
+_REPLAYED_HEADERS = {b"content-type", b"x-tenant-id"}
+
+async def ensure_idempotency_indexes(db) -> None:
+    await db["idempotency_keys"].create_index("created_at", expireAfterSeconds=settings.idempotency_ttl_seconds)
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+class IdempotencyMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # Scoped key -> future resolved with the stored record (None if the run failed)
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(tuple(settings.idempotency_paths))
+        ):
+            return await self.app(scope, receive, send)
+        key = _header(scope, b"idempotency-key")
+        if not key:
+            return await self.app(scope, receive, send)
+        if len(key) > 255:
+            return await self._send_error(send, 400, "Idempotency-Key must be at most 255 characters")
+
+        body = await self._read_body(receive)
+        fingerprint = hashlib.sha256(
+            b"\n".join([scope["method"].encode(), scope["path"].encode(), scope["query_string"], body])
+        ).hexdigest()
+        scope_id = "|".join([get_current_tenant_id() or "", _header(scope, b"authorization") or "", key])
+        scoped_key = hashlib.sha256(scope_id.encode()).hexdigest()
+
+        collection = (await get_database())["idempotency_keys"]
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        while True:
+            # A duplicate of a request this worker is running: wait for it
+            future = self._in_flight.get(scoped_key)
+            if future is not None:
+                try:
+                    record = await asyncio.wait_for(asyncio.shield(future), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    return await self._send_error(send, 409, "A request with this Idempotency-Key is still in progress")
+                if record is not None:
+                    return await self._replay(record, fingerprint, send)
+                continue
+
+            record = await collection.find_one({"_id": scoped_key})
+            if record is not None and record["status"] == COMPLETED:
+                return await self._replay(record, fingerprint, send)
+            if record is None:
+                if await self._claim(collection, scoped_key, fingerprint):
+                    break
+                continue
+            if record["fingerprint"] != fingerprint:
+                return await self._send_error(send, 422, "Idempotency-Key was already used for a different request")
+            # In progress elsewhere; take it over if its worker died holding the lock
+            if await self._take_over(collection, scoped_key):
+                break
+            if time.monotonic() >= deadline:
+                return await self._send_error(send, 409, "A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(settings.idempotency_poll_seconds)
+
+        await self._execute(scope, body, send, collection, scoped_key, fingerprint)
+
+    async def _claim(self, collection, scoped_key: str, fingerprint: str) -> bool:
+        now = datetime.utcnow()
+        try:
+            await collection.insert_one({
+                "_id": scoped_key,
+                "status": IN_PROGRESS,
+                "fingerprint": fingerprint,
+                "created_at": now,
+                "locked_until": now + timedelta(seconds=settings.idempotency_lock_seconds),
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _take_over(self, collection, scoped_key: str) -> bool:
+        now = datetime.utcnow()
+        result = await collection.update_one(
+            {"_id": scoped_key, "status": IN_PROGRESS, "locked_until": {"$lt": now}},
+            {"$set": {"locked_until": now + timedelta(seconds=settings.idempotency_lock_seconds)}},
+        )
+        return result.modified_count > 0
+
+    async def _execute(self, scope: Scope, body: bytes, send: Send, collection, scoped_key: str, fingerprint: str) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[scoped_key] = future
+        response = {"status_code": 500, "headers": [], "body": b""}
+        record = None
+
+        async def receive() -> Message:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status_code"] = message["status"]
+                response["headers"] = [
+                    [k.decode("latin-1"), v.decode("latin-1")] for k, v in message["headers"] if k.lower() in _REPLAYED_HEADERS
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+            # Server errors are worth retrying, so only keep definitive answers
+            if response["status_code"] < 500:
+                record = {
+                    "status": COMPLETED,
+                    "fingerprint": fingerprint,
+                    "response": {**response, "body": Binary(response["body"])},
+                }
+                await collection.update_one({"_id": scoped_key}, {"$set": record})
+        finally:
+            if record is None:
+                await collection.delete_one({"_id": scoped_key, "status": IN_PROGRESS})
+            self._in_flight.pop(scoped_key, None)
+            future.set_result(record)
+
+    async def _replay(self, record: dict, fingerprint: str, send: Send) -> None:
+        if record["fingerprint"] != fingerprint:
+            return await self._send_error(send, 422, "Idempotency-Key was already used for a different request")
+        response = record["response"]
+        body = bytes(response["body"])
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in response["headers"]]
+        headers += [(b"content-length", str(len(body)).encode()), (b"idempotent-replayed", b"true")]
+        await send({"type": "http.response.start", "status": response["status_code"], "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _send_error(send: Send, status_code: int, detail: str) -> None:
+        body = dumps({"detail": detail})
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
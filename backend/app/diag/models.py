@@ -28,6 +28,11 @@ DIABETES_OUTPUT = {
     2: "diabetes",
 }
 
+CARDIO_OUTPUT = {
+    0: "negative",
+    1: "positive",
+}
+
 class OrdinalEncoder(str, Enum):
     HIGH = "High"
     LOW = "Low"
@@ -64,6 +69,42 @@ class CardioInput(BaseModel):
     crp_level: Optional[float] = Field(None, gt=0.0)  # C-reactive protein level
     homocysteine_level: Optional[float] = Field(None, gt=0.0)  # Homocysteine level
 
+class PanelInput(BaseModel):
+    # Union of DiabetesInput and CardioInput for scoring both models at once.
+    # Shared features are given once; lipid values are in mmol/L (as for the
+    # diabetes model) and converted or turned into flags for the cardiovascular
+    # model when its own fields are left out (see diag/panel.py).
+    age: int = Field(..., gt=0)
+    gender: GenderEnum
+    bmi: Optional[float] = Field(None, gt=0.0)
+    # Diabetes labs
+    Urea: Optional[float] = Field(None, gt=0.0)
+    Cr: Optional[float] = Field(None, gt=0.0)
+    HbA1c: Optional[float] = Field(None, gt=0.0)
+    Chol: Optional[float] = Field(None, gt=0.0)
+    TG: Optional[float] = Field(None, gt=0.0)
+    HDL: Optional[float] = Field(None, gt=0.0)
+    LDL: Optional[float] = Field(None, gt=0.0)
+    VLDL: Optional[float] = Field(None, gt=0.0)
+    # Cardiovascular features
+    blood_pressure: Optional[float] = Field(None, gt=0.0)
+    cholesterol_level: Optional[float] = Field(None, gt=0.0)  # mg/dL
+    exercise_habits: Optional[OrdinalEncoder] = None
+    smoking: Optional[BinaryEncoder] = None
+    family_heart_disease: Optional[BinaryEncoder] = None
+    diabetes: Optional[BinaryEncoder] = None
+    high_blood_pressure: Optional[BinaryEncoder] = None
+    low_hdl_cholesterol: Optional[BinaryEncoder] = None
+    high_ldl_cholesterol: Optional[BinaryEncoder] = None
+    alcohol_consumption: Optional[OrdinalEncoder] = None
+    stress_level: Optional[BinaryEncoder] = None
+    sleep_hours: Optional[float] = Field(None, gt=0.0)
+    sugar_consumption: Optional[OrdinalEncoder] = None
+    triglyceride_level: Optional[float] = Field(None, gt=0.0)  # mg/dL
+    fasting_blood_sugar: Optional[float] = Field(None, gt=0.0)
+    crp_level: Optional[float] = Field(None, gt=0.0)
+    homocysteine_level: Optional[float] = Field(None, gt=0.0)
+
 class DiagnosisBase(BaseModel):
     id: Optional[str] = Field(None, alias="_id")
     patient_id: str                   # Reference to a PatientProfile document
@@ -75,6 +116,7 @@ class DiagnosisBase(BaseModel):
     explanation: str                  # Natural language explanation
     input_features: Dict[str, Any]    # Store the input features as a dictionary
     details: Optional[Dict[str, Any]] = None  # Optional additional details about the diagnosis
+    model_version: Optional[str] = None  # Version of the model artifact that produced the prediction
 
     class Config:
         validate_assignment = True
@@ -92,4 +134,21 @@ class DiagnosisOut(DiagnosisBase):
         validate_by_name = True
         json_encoders = {
             datetime: lambda v: v.isoformat()
-        }
\ No newline at end of file
+        }
+class SweepAxis(BaseModel):
+    # Feature to vary, with either explicit values or an evenly spaced range
+    feature: str
+    values: Optional[List[Union[float, str]]] = None
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    steps: int = Field(20, ge=2, le=500)
+
+class DiabetesWhatIf(BaseModel):
+    base: DiabetesInput
+    sweep: List[SweepAxis] = Field(..., min_length=1, max_length=2)
+    with_shap: bool = False
+
+class CardioWhatIf(BaseModel):
+    base: CardioInput
+    sweep: List[SweepAxis] = Field(..., min_length=1, max_length=2)
+    with_shap: bool = False
@@ -0,0 +1,57 @@
+# diag/panel.py
+"""
+Feature derivation for the combined diabetes + cardiovascular risk panel.
+
+A panel input carries each shared feature once; this module maps it onto
+the inputs of both models. Lipids are measured once in mmol/L (the diabetes
+model's units) and, when the cardiovascular fields are left out, converted
+to mg/dL or turned into the cardiovascular model's Yes/No flags. Explicitly
+given cardiovascular fields always win over derived ones.
+"""
+from .models import PanelInput, DiabetesInput, CardioInput, BinaryEncoder, GenderEnum
+
+# mmol/L -> mg/dL
+CHOLESTEROL_MG_PER_MMOL = 38.67
+TRIGLYCERIDE_MG_PER_MMOL = 88.57
+
+# Cut-offs in mmol/L (NCEP ATP III); HbA1c in % (ADA)
+LOW_HDL = {GenderEnum.MALE: 1.0, GenderEnum.FEMALE: 1.3}
+HIGH_LDL = 3.4
+DIABETES_HBA1C = 6.5
+
+def _flag(value: bool) -> BinaryEncoder:
+    return BinaryEncoder.YES if value else BinaryEncoder.NO
+
+def derived_cardio_fields(panel: PanelInput) -> dict:
+    """Cardiovascular fields computed from the shared labs, for those not given"""
+    derived = {}
+    if panel.Chol is not None:
+        derived["cholesterol_level"] = round(panel.Chol * CHOLESTEROL_MG_PER_MMOL, 1)
+    if panel.TG is not None:
+        derived["triglyceride_level"] = round(panel.TG * TRIGLYCERIDE_MG_PER_MMOL, 1)
+    if panel.HDL is not None:
+        derived["low_hdl_cholesterol"] = _flag(panel.HDL < LOW_HDL[panel.gender])
+    if panel.LDL is not None:
+        derived["high_ldl_cholesterol"] = _flag(panel.LDL >= HIGH_LDL)
+    if panel.HbA1c is not None and panel.HbA1c >= DIABETES_HBA1C:
+        # Below the cut-off only rules out undiagnosed diabetes, so leave it unset
+        derived["diabetes"] = BinaryEncoder.YES
+    given = panel.model_dump(exclude_none=True)
+    return {name: value for name, value in derived.items() if name not in given}
+
+def split_panel(panel: PanelInput) -> tuple[DiabetesInput, CardioInput, list[str]]:
+    """
+    Inputs of the diabetes and cardiovascular models for a panel, and the
+    names of the cardiovascular fields that were derived
+    """
+    fields = panel.model_dump()
+    diabetes = DiabetesInput(
+        AGE=panel.age,
+        BMI=panel.bmi,
+        **{name: fields[name] for name in DiabetesInput.model_fields if name not in ("AGE", "BMI")},
+    )
+    derived = derived_cardio_fields(panel)
+    cardio = CardioInput(**{
+        name: derived.get(name, fields.get(name)) for name in CardioInput.model_fields
+    })
+    return diabetes, cardio, sorted(derived)
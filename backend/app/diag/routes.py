@@ -1,55 +1,128 @@
 # app/diagnosis/routes.py
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import numpy as np
+import pandas as pd
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from pydantic import BaseModel, ValidationError
 from auth.services import get_current_user
+from config.settings import settings
 from ml import get_predictor
-from .models import DiseaseEnum, DiabetesInput, CardioInput
+from ml.scheduler import inference_scheduler, SchedulerFull, INTERACTIVE, BULK
+from ml.whatif import sweep
+from ml.counterfactual import find_counterfactuals
+from ml.drift import drift_monitor
+from tracing.spans import span
+from audit.log import audit_log, audit_actor
+from .models import (
+    DiseaseEnum, DiabetesInput, CardioInput, DiagnosisCreate, DIABETES_OUTPUT, CARDIO_OUTPUT,
+    SweepAxis, DiabetesWhatIf, CardioWhatIf, PanelInput,
+)
+from .panel import split_panel
+from .services import create_diagnosis, get_diagnosis_by_id
+from ml.explanations import explain, explain_panel
 from db.mongo import get_database
 router = APIRouter(prefix="/diagnosis", tags=["Diagnosis"])
 
+async def _predict(predictor, disease: DiseaseEnum, features: dict, level: int) -> dict:
+    """
+    Run a single prediction on the inference scheduler as interactive work for
+    the current tenant. LLM explanations are produced afterwards, outside the
+    scheduler, so waiting on the LLM never holds an inference worker.
+    """
+    try:
+        # Covers the queue wait as well as the model spans inside it
+        with span("inference", disease=disease.value):
+            result = await inference_scheduler.run(predictor.predict, features, level=0, priority=INTERACTIVE)
+    except SchedulerFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    drift_monitor.observe(disease.value, features)
+    if level > 0:
+        result["explanation"] = await asyncio.to_thread(
+            explain,
+            disease.value,
+            features_with_shap=result["shapley"],
+            prediction=result["prediction"],
+            confidence=result["confidence"],
+            audience="doctor",
+            level=level,
+            model_version=result["model_version"],
+        )
+    return result
+
+def _screen_chunk(predictor, rows: list[dict], outputs: dict) -> list[dict]:
+    probs, _ = predictor.predict_batch(pd.DataFrame(rows), with_shap=False)
+    return [
+        {"prediction": outputs[int(p.argmax())], "confidence": float(p.max())}
+        for p in probs
+    ]
+
 #############################
 # For Doctor
 #############################
 
 @router.post("/predict/diabetes/{patient_id}")
-async def predict_diabetes(patient_id: str, payload: DiabetesInput, db=Depends(get_database)):
+async def predict_diabetes(patient_id: str, payload: DiabetesInput, request: Request, level: int = Query(0, ge=0, le=2), db=Depends(get_database)):
     try:
         predictor = get_predictor(DiseaseEnum.DIABETES)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if not predictor:
+        raise HTTPException(status_code=500, detail="Model not found")
     
-    preprocessed = predictor.preprocess(payload.model_dump())
-    raw_pred = predictor.predict(preprocessed)
-    result = predictor.postprocess(raw_pred)
-
+    result = await _predict(predictor, DiseaseEnum.DIABETES, payload.model_dump(), level)
+    diagnosis = await create_diagnosis(db, DiagnosisCreate(
+        patient_id=patient_id,
+        disease_type=DiseaseEnum.DIABETES,
+        prediction=DIABETES_OUTPUT[result["prediction"]],
+        confidence=result["confidence"],
+        explanation=result["explanation"],
+        input_features=payload.model_dump(),
+        details={"shapley": result["shapley"]},
+        model_version=result["model_version"],
+    ))
+    result["diagnosis_id"] = diagnosis.id
+    audit_log.record("create", "diagnosis", diagnosis.id, audit_actor(request), patient_id=patient_id)
     return result
 
 @router.post("/predict/cardiovascular/{patient_id}")
-async def predict_cardiovascular(patient_id: str, payload: CardioInput):
+async def predict_cardiovascular(patient_id: str, payload: CardioInput, request: Request, level: int = Query(0, ge=0, le=2), db=Depends(get_database)):
     try:
         predictor = get_predictor(DiseaseEnum.CARDIOVASCULAR)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if not predictor:
+        raise HTTPException(status_code=500, detail="Model not found")
     
-    preprocessed = predictor.preprocess(payload.model_dump())
-    raw_pred = predictor.predict(preprocessed)
-    result = predictor.postprocess(raw_pred)
+    result = await _predict(predictor, DiseaseEnum.CARDIOVASCULAR, payload.model_dump(), level)
+    diagnosis = await create_diagnosis(db, DiagnosisCreate(
+        patient_id=patient_id,
+        disease_type=DiseaseEnum.CARDIOVASCULAR,
+        prediction=CARDIO_OUTPUT[result["prediction"]],
+        confidence=result["confidence"],
+        explanation=result["explanation"],
+        input_features=payload.model_dump(mode="json"),
+        details={"shapley": result["shapley"]},
+        model_version=result["model_version"],
+    ))
+    result["diagnosis_id"] = diagnosis.id
+    audit_log.record("create", "diagnosis", diagnosis.id, audit_actor(request), patient_id=patient_id)
     return result
 
 ###############################
 # For Patient
 ###############################
 @router.post("/predict/diabetes/")
-async def predict_diabetes(payload: DiabetesInput):
+async def predict_diabetes(payload: DiabetesInput, level: int = Query(0, ge=0, le=2)):
     try:
         predictor = get_predictor(DiseaseEnum.DIABETES)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
-    result = predictor.predict(payload.model_dump())
+    result = await _predict(predictor, DiseaseEnum.DIABETES, payload.model_dump(), level)
     return result
 
 @router.post("/predict/cardiovascular/")
-async def predict_cardiovascular(payload: CardioInput):
+async def predict_cardiovascular(payload: CardioInput, level: int = Query(0, ge=0, le=2)):
     try:
         predictor = get_predictor(DiseaseEnum.CARDIOVASCULAR)
     except ValueError as e:
@@ -57,12 +130,246 @@ async def predict_cardiovascular(payload: CardioInput):
     if not predictor:
         raise HTTPException(status_code=500, detail="Model not found")
     
-    response = predictor.predict(payload.model_dump())
+    response = await _predict(predictor, DiseaseEnum.CARDIOVASCULAR, payload.model_dump(), level)
     return response
 
+###############################
+# Combined risk panel
+###############################
+async def _panel(payload: PanelInput, level: int) -> dict:
+    """
+    Score both models concurrently on the inference scheduler, then explain
+    both predictions together with at most one LLM call
+    """
+    diabetes_input, cardio_input, derived = split_panel(payload)
+    predictors = {}
+    for disease in (DiseaseEnum.DIABETES, DiseaseEnum.CARDIOVASCULAR):
+        predictors[disease] = get_predictor(disease)
+        if not predictors[disease]:
+            raise HTTPException(status_code=500, detail="Model not found")
+
+    diabetes, cardio = await asyncio.gather(
+        _predict(predictors[DiseaseEnum.DIABETES], DiseaseEnum.DIABETES, diabetes_input.model_dump(), 0),
+        _predict(predictors[DiseaseEnum.CARDIOVASCULAR], DiseaseEnum.CARDIOVASCULAR, cardio_input.model_dump(), 0),
+    )
+    results = {DiseaseEnum.DIABETES.value: diabetes, DiseaseEnum.CARDIOVASCULAR.value: cardio}
+    explanation = await asyncio.to_thread(explain_panel, results, audience="doctor", level=level)
+    return {
+        **results,
+        "explanation": explanation,
+        "derived_features": derived,
+        "inputs": {
+            DiseaseEnum.DIABETES.value: diabetes_input.model_dump(mode="json"),
+            DiseaseEnum.CARDIOVASCULAR.value: cardio_input.model_dump(mode="json"),
+        },
+    }
+
+@router.post("/predict/panel/{patient_id}")
+async def predict_panel(patient_id: str, payload: PanelInput, request: Request, level: int = Query(0, ge=0, le=2), db=Depends(get_database)):
+    """
+    Diabetes and cardiovascular predictions for a patient from one input,
+    stored as two diagnoses sharing the combined explanation
+    """
+    result = await _panel(payload, level)
+    outputs = {DiseaseEnum.DIABETES: DIABETES_OUTPUT, DiseaseEnum.CARDIOVASCULAR: CARDIO_OUTPUT}
+    for disease, disease_outputs in outputs.items():
+        disease_result = result[disease.value]
+        diagnosis = await create_diagnosis(db, DiagnosisCreate(
+            patient_id=patient_id,
+            disease_type=disease,
+            prediction=disease_outputs[disease_result["prediction"]],
+            confidence=disease_result["confidence"],
+            explanation=result["explanation"],
+            input_features=result["inputs"][disease.value],
+            details={"shapley": disease_result["shapley"], "panel": True},
+            model_version=disease_result["model_version"],
+        ))
+        disease_result["diagnosis_id"] = diagnosis.id
+        audit_log.record("create", "diagnosis", diagnosis.id, audit_actor(request), patient_id=patient_id)
+    return result
+
+@router.post("/predict/panel/")
+async def predict_panel_anonymous(payload: PanelInput, level: int = Query(0, ge=0, le=2)):
+    """
+    Diabetes and cardiovascular predictions from one input with a combined explanation
+    """
+    return await _panel(payload, level)
+
+###############################
+# What-if sweeps
+###############################
+def _sweep_axes(base: BaseModel, axes: list[SweepAxis]) -> list[tuple[str, list]]:
+    """
+    Expand each axis into its values, checked against the input model so a
+    sweep can't go where a single prediction couldn't
+    """
+    model = type(base)
+    fields = base.model_dump(mode="json")
+    resolved = []
+    for axis in axes:
+        field = model.model_fields.get(axis.feature)
+        if field is None:
+            raise HTTPException(status_code=422, detail=f"Unknown feature: {axis.feature}")
+        if axis.feature in (name for name, _ in resolved):
+            raise HTTPException(status_code=422, detail=f"Feature swept twice: {axis.feature}")
+        if axis.values is not None:
+            values = axis.values
+        elif axis.start is not None and axis.stop is not None:
+            values = np.linspace(axis.start, axis.stop, axis.steps)
+            values = np.unique(values.round()).tolist() if field.annotation is int else values.round(6).tolist()
+        else:
+            raise HTTPException(status_code=422, detail=f"Give values or start and stop for {axis.feature}")
+        try:
+            values = [model.model_validate({**fields, axis.feature: v}).model_dump(mode="json")[axis.feature] for v in values]
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid value for {axis.feature}: {e.errors()[0]['msg']}")
+        resolved.append((axis.feature, values))
+
+    points = int(np.prod([len(values) for _, values in resolved]))
+    if points > settings.whatif_max_points:
+        raise HTTPException(status_code=413, detail=f"At most {settings.whatif_max_points} grid points per sweep")
+    return resolved
+
+async def _what_if(disease: DiseaseEnum, base: BaseModel, axes: list[SweepAxis], with_shap: bool) -> dict:
+    predictor = get_predictor(disease)
+    if not predictor:
+        raise HTTPException(status_code=500, detail="Model not found")
+    resolved = _sweep_axes(base, axes)
+    try:
+        return await inference_scheduler.run(sweep, predictor, base.model_dump(mode="json"), resolved, with_shap, priority=INTERACTIVE)
+    except SchedulerFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+@router.post("/whatif/diabetes")
+async def what_if_diabetes(payload: DiabetesWhatIf):
+    """
+    Risk curve (one axis) or surface (two axes) for a diabetes input with
+    features varied over value grids, scored in one batch without the LLM
+    """
+    return await _what_if(DiseaseEnum.DIABETES, payload.base, payload.sweep, payload.with_shap)
+
+@router.post("/whatif/cardiovascular")
+async def what_if_cardiovascular(payload: CardioWhatIf):
+    """
+    Risk curve (one axis) or surface (two axes) for a cardiovascular input with
+    features varied over value grids, scored in one batch without the LLM
+    """
+    return await _what_if(DiseaseEnum.CARDIOVASCULAR, payload.base, payload.sweep, payload.with_shap)
+
+###############################
+# Counterfactuals
+###############################
+async def _counterfactuals(disease: DiseaseEnum, payload: BaseModel, top_k: int, outputs: dict) -> dict:
+    predictor = get_predictor(disease)
+    if not predictor:
+        raise HTTPException(status_code=500, detail="Model not found")
+    try:
+        result = await inference_scheduler.run(
+            find_counterfactuals,
+            predictor,
+            disease.value,
+            payload.model_dump(mode="json"),
+            top_k=top_k,
+            beam_width=settings.counterfactual_beam_width,
+            max_changes=settings.counterfactual_max_changes,
+            budget_ms=settings.counterfactual_budget_ms,
+            priority=INTERACTIVE,
+        )
+    except SchedulerFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    result["label"] = outputs[result["prediction"]]
+    for counterfactual in result["counterfactuals"]:
+        counterfactual["label"] = outputs[counterfactual["prediction"]]
+    return result
+
+@router.post("/counterfactual/diabetes")
+async def counterfactual_diabetes(payload: DiabetesInput, top_k: int = Query(3, ge=1, le=10)):
+    """
+    Cheapest changes to modifiable features (BMI, lipids, HbA1c) that would
+    move the input to a lower diabetes risk class
+    """
+    return await _counterfactuals(DiseaseEnum.DIABETES, payload, top_k, DIABETES_OUTPUT)
+
+@router.post("/counterfactual/cardiovascular")
+async def counterfactual_cardiovascular(payload: CardioInput, top_k: int = Query(3, ge=1, le=10)):
+    """
+    Cheapest changes to modifiable features (weight, blood pressure, lipids,
+    lifestyle) that would move the input to a negative cardiovascular prediction
+    """
+    return await _counterfactuals(DiseaseEnum.CARDIOVASCULAR, payload, top_k, CARDIO_OUTPUT)
+
+###############################
+# Bulk screening
+###############################
+async def _screen(disease: DiseaseEnum, rows: list[dict], outputs: dict) -> dict:
+    if len(rows) > settings.screening_max_rows:
+        raise HTTPException(status_code=413, detail=f"At most {settings.screening_max_rows} rows per request")
+    predictor = get_predictor(disease)
+    if not predictor:
+        raise HTTPException(status_code=500, detail="Model not found")
+
+    # Each chunk is a separate bulk job, so interactive requests from every
+    # tenant get scheduled in between
+    size = settings.screening_chunk_size
+    futures = []
+    try:
+        for i in range(0, len(rows), size):
+            chunk = rows[i:i + size]
+            futures.append(inference_scheduler.submit(_screen_chunk, predictor, chunk, outputs, priority=BULK, cost=len(chunk)))
+    except SchedulerFull as e:
+        for future in futures:
+            future.cancel()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    chunks = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+    drift_monitor.observe_many(disease.value, rows)
+    return {"model_version": predictor.version, "results": [result for chunk in chunks for result in chunk]}
+
+@router.post("/screening/diabetes")
+async def screen_diabetes(payload: list[DiabetesInput] = Body(...)):
+    """
+    Score a batch of diabetes inputs at bulk priority (no SHAP or explanations)
+    """
+    return await _screen(DiseaseEnum.DIABETES, [row.model_dump() for row in payload], DIABETES_OUTPUT)
+
+@router.post("/screening/cardiovascular")
+async def screen_cardiovascular(payload: list[CardioInput] = Body(...)):
+    """
+    Score a batch of cardiovascular inputs at bulk priority (no SHAP or explanations)
+    """
+    return await _screen(DiseaseEnum.CARDIOVASCULAR, [row.model_dump() for row in payload], CARDIO_OUTPUT)
+
 @router.get("/explain/{diag_id}")
-async def explain_disease(diag_id: str, level: int = 0):
-    pass
+async def explain_disease(
+    diag_id: str,
+    request: Request,
+    level: int = Query(0, ge=0, le=2),
+    audience: str = Query("doctor", pattern="^(doctor|patient)$"),
+    db=Depends(get_database)
+):
+    """
+    Explain a stored diagnosis: level 0 renders a local template, level 1 serves
+    a cached LLM explanation, level 2 asks the LLM for a fresh one
+    """
+    diagnosis = await get_diagnosis_by_id(db, diag_id)
+    if not diagnosis:
+        raise HTTPException(status_code=404, detail="Diagnosis not found")
+    if not diagnosis.details or "shapley" not in diagnosis.details:
+        raise HTTPException(status_code=400, detail="Diagnosis has no SHAP values to explain")
+    audit_log.record("read", "diagnosis", diag_id, audit_actor(request), patient_id=diagnosis.patient_id)
+
+    outputs = DIABETES_OUTPUT if diagnosis.disease_type == DiseaseEnum.DIABETES else CARDIO_OUTPUT
+    prediction = {label: value for value, label in outputs.items()}[diagnosis.prediction]
+    explanation = await asyncio.to_thread(
+        explain,
+        diagnosis.disease_type.value,
+        features_with_shap=diagnosis.details["shapley"],
+        prediction=prediction,
+        confidence=diagnosis.confidence,
+        audience=audience,
+        level=level,
+        model_version=diagnosis.model_version,
+    )
+    return {"diagnosis_id": diag_id, "level": level, "explanation": explanation}
 
 @router.get("/")
 async def get_diag_history(diag_id: str):
@@ -0,0 +1,36 @@
+# diag/services.py
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .models import DiagnosisCreate, DiagnosisOut
+from typing import List, Optional
+from bson import ObjectId
+from db.mongo import tenant_collection
+
+async def create_diagnosis(db: AsyncIOMotorDatabase, diagnosis: DiagnosisCreate) -> DiagnosisOut:
+    """
+    Store a diagnosis, including the model version that produced it
+    """
+    diagnosis_dict = diagnosis.model_dump(exclude={"id"})
+    result = await tenant_collection(db, "diagnoses").insert_one(diagnosis_dict)
+    diagnosis_dict["_id"] = str(result.inserted_id)
+    return DiagnosisOut(**diagnosis_dict)
+
+async def get_diagnosis_by_id(db: AsyncIOMotorDatabase, diagnosis_id: str) -> Optional[DiagnosisOut]:
+    """
+    Retrieve a diagnosis by ID
+    """
+    if not ObjectId.is_valid(diagnosis_id):
+        return None
+    diagnosis_data = await tenant_collection(db, "diagnoses").find_one({"_id": ObjectId(diagnosis_id)})
+    if diagnosis_data:
+        diagnosis_data["_id"] = str(diagnosis_data["_id"])
+        return DiagnosisOut(**diagnosis_data)
+    return None
+
+async def get_diagnoses_by_patient(db: AsyncIOMotorDatabase, patient_id: str) -> List[DiagnosisOut]:
+    """
+    Retrieve a patient's diagnoses, newest first
+    """
+    diagnoses = await tenant_collection(db, "diagnoses").find({"patient_id": patient_id}).sort("diagnosis_time", -1).to_list(length=100)
+    for diagnosis in diagnoses:
+        diagnosis["_id"] = str(diagnosis["_id"])
+    return [DiagnosisOut(**diagnosis) for diagnosis in diagnoses]
@@ -2,7 +2,8 @@
 import uuid
 from fastapi import APIRouter, Depends, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from db.mongo import get_database
+from db.mongo import get_database, tenant_collection
+from utils.responses import projection_for, trusted_response
 from auth.services import hash_password
 from auth.models import RoleEnum
 from .models import Doctor, DoctorCreate
@@ -11,10 +12,11 @@ router = APIRouter(prefix="/doctors", tags=["Doctors"])
 
 @router.get("/", response_model=list[Doctor])
 async def list_doctors(db: AsyncIOMotorDatabase = Depends(get_database)):
-    doctors = await db["doctors"].find().to_list(length=100)
+    doctors = await tenant_collection(db, "doctors").find({}, projection_for(Doctor)).to_list(length=100)
     if not doctors:
         raise HTTPException(status_code=404, detail="No doctors found")
-    return doctors
+    # Documents come from our own collection, so skip re-validating them
+    return trusted_response(doctors, Doctor)
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_doctor(doctor_create: DoctorCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
@@ -34,6 +36,8 @@ async def create_doctor(doctor_create: DoctorCreate, db: AsyncIOMotorDatabase =
         "email": doctor_create.email,
         "hashed_password": hash_password(doctor_create.password),
         "role": RoleEnum.DOCTOR,
+        # Lets tenant routing find the doctor's tenant without searching every tenant's collections
+        "tenant_id": doctor_create.tenant_id,
     }
     
     # Save the account in the database
@@ -48,7 +52,7 @@ async def create_doctor(doctor_create: DoctorCreate, db: AsyncIOMotorDatabase =
     # Remove password as we don't want to store it in the doctor collection
     doctor_data.pop("password", None)
     
-    result = await db["doctors"].insert_one(doctor_data)
+    result = await tenant_collection(db, "doctors", doctor_data.get("tenant_id")).insert_one(doctor_data)
     if not result.inserted_id:
         # Rollback the account creation if doctor profile creation fails
         await db["accounts"].delete_one({"_id": account_id})
@@ -58,7 +62,7 @@ async def create_doctor(doctor_create: DoctorCreate, db: AsyncIOMotorDatabase =
 
 @router.get("/{doctor_id}", response_model=Doctor)
 async def get_doctor(doctor_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
-    doctor = await db["doctors"].find_one({"_id": doctor_id})
+    doctor = await tenant_collection(db, "doctors").find_one({"_id": doctor_id})
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return doctor
\ No newline at end of file
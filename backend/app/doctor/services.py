@@ -3,30 +3,51 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from .models import Doctor, DoctorCreate
 from typing import List, Optional
 from bson import ObjectId
+from db.mongo import tenant_collection
+from db.cache import doctor_cache
 
 async def get_doctor_by_id(db: AsyncIOMotorDatabase, doctor_id: str) -> Optional[Doctor]:
     """
     Retrieve a doctor by ID
     """
-    doctor_data = await db["doctors"].find_one({"_id": doctor_id})
+    doctors = tenant_collection(db, "doctors")
+    cached = doctor_cache.get(doctor_id, doctors.full_name)
+    if cached is not None:
+        return cached
+
+    generation = doctor_cache.generation()
+    doctor_data = await doctors.find_one({"_id": doctor_id})
     if doctor_data:
-        return Doctor(**doctor_data)
+        doctor = Doctor(**doctor_data)
+        doctor_cache.set(doctor_data["_id"], doctors.full_name, doctor.model_copy(), generation)
+        return doctor
     return None
 
 async def get_doctor_by_account_id(db: AsyncIOMotorDatabase, account_id: str) -> Optional[Doctor]:
     """
     Retrieve a doctor by their account ID
     """
-    doctor_data = await db["doctors"].find_one({"account_id": account_id})
+    doctors = tenant_collection(db, "doctors")
+    doctor_id = doctor_cache.get_alias(account_id)
+    if doctor_id is not None:
+        cached = doctor_cache.get(doctor_id, doctors.full_name)
+        if cached is not None and cached.account_id == account_id:
+            return cached
+
+    generation = doctor_cache.generation()
+    doctor_data = await doctors.find_one({"account_id": account_id})
     if doctor_data:
-        return Doctor(**doctor_data)
+        doctor = Doctor(**doctor_data)
+        doctor_cache.set(doctor_data["_id"], doctors.full_name, doctor.model_copy(), generation)
+        doctor_cache.set_alias(account_id, doctor_data["_id"])
+        return doctor
     return None
 
 async def get_doctors_by_tenant(db: AsyncIOMotorDatabase, tenant_id: str) -> List[Doctor]:
     """
     Retrieve all doctors for a specific tenant/hospital
     """
-    doctors = await db["doctors"].find({"tenant_id": tenant_id}).to_list(length=100)
+    doctors = await tenant_collection(db, "doctors", tenant_id).find({"tenant_id": tenant_id}).to_list(length=100)
     return [Doctor(**doc) for doc in doctors]
 
 async def create_doctor(db: AsyncIOMotorDatabase, doctor_data: DoctorCreate, account_id: str) -> Doctor:
@@ -42,7 +63,7 @@ async def create_doctor(db: AsyncIOMotorDatabase, doctor_data: DoctorCreate, acc
         raise ValueError("A doctor must be associated with a tenant (hospital)")
     
     # Insert into the database
-    result = await db["doctors"].insert_one(doctor_dict)
+    result = await tenant_collection(db, "doctors", doctor_dict["tenant_id"]).insert_one(doctor_dict)
     doctor_dict["_id"] = result.inserted_id
     
     return Doctor(**doctor_dict)
@@ -57,10 +78,11 @@ async def update_doctor(db: AsyncIOMotorDatabase, doctor_id: str, updated_data:
     if "tenant_id" in updated_data:
         updated_data.pop("tenant_id")
         
-    result = await db["doctors"].update_one(
+    result = await tenant_collection(db, "doctors").update_one(
         {"_id": doctor_id},
         {"$set": updated_data}
     )
+    doctor_cache.invalidate(doctor_id)
     return result.modified_count > 0
 
 async def delete_doctor(db: AsyncIOMotorDatabase, doctor_id: str, tenant_id: str) -> bool:
@@ -68,8 +90,9 @@ async def delete_doctor(db: AsyncIOMotorDatabase, doctor_id: str, tenant_id: str
     Delete a doctor, ensuring they belong to the specified tenant
     """
     # Only delete if the doctor belongs to the specified tenant
-    result = await db["doctors"].delete_one({
+    result = await tenant_collection(db, "doctors", tenant_id).delete_one({
         "_id": doctor_id,
         "tenant_id": tenant_id
     })
+    doctor_cache.invalidate(doctor_id)
     return result.deleted_count > 0
\ No newline at end of file
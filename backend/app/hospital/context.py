@@ -4,6 +4,8 @@ from typing import Optional
 
 # Context variable to store the current tenant ID
 tenant_context: ContextVar[Optional[str]] = ContextVar('tenant_id', default=None)
+# Set only when the tenant was resolved from the authenticated user, not taken from a header
+resolved_tenant_context: ContextVar[Optional[str]] = ContextVar('resolved_tenant_id', default=None)
 
 def get_current_tenant_id() -> Optional[str]:
     """
@@ -11,14 +13,24 @@ def get_current_tenant_id() -> Optional[str]:
     """
     return tenant_context.get()
 
-def set_tenant_context(tenant_id: str) -> None:
+def get_resolved_tenant_id() -> Optional[str]:
     """
-    Set the tenant ID in the current context
+    Get the current tenant ID if it belongs to the authenticated user; None
+    when the request only named a tenant in the X-Tenant-ID header
+    """
+    return resolved_tenant_context.get()
+
+def set_tenant_context(tenant_id: str, resolved: bool = False) -> None:
+    """
+    Set the tenant ID in the current context; `resolved` if it was resolved
+    from the authenticated user
     """
     tenant_context.set(tenant_id)
+    resolved_tenant_context.set(tenant_id if resolved else None)
 
 def clear_tenant_context() -> None:
     """
     Clear the tenant ID from the current context
     """
-    tenant_context.set(None)
\ No newline at end of file
+    tenant_context.set(None)
+    resolved_tenant_context.set(None)
\ No newline at end of file
@@ -1,57 +1,91 @@
 # hospital/middleware.py
+from typing import Optional
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from .context import set_tenant_context, clear_tenant_context
-from auth.services import get_current_user
+from auth.services import verify_token
+from config.settings import settings
 from db.mongo import get_database
 from doctor.services import get_doctor_by_account_id
 from patient.services import get_patient_by_account_id
+from tracing.spans import span
+from utils.cache import TTLCache
+
+# Account email -> tenant ID ("" for users without a tenant), so routing a
+# request doesn't cost extra database round trips
+_user_tenants = TTLCache(maxsize=settings.tenant_cache_size, ttl=settings.tenant_cache_ttl)
+
+def _bearer_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+async def resolve_user_tenant(email: str) -> Optional[str]:
+    """
+    Find the tenant of an authenticated user: from the account itself (set for
+    migrated tenants), else from their doctor or patient profile in the shared collections
+    """
+    tenant_id = _user_tenants.get(email)
+    if tenant_id is not None:
+        return tenant_id or None
+
+    db = await get_database()
+    account = await db["accounts"].find_one({"email": email}, {"tenant_id": 1})
+    tenant_id = None
+    if account:
+        tenant_id = account.get("tenant_id")
+        # Check if user is a doctor and get tenant ID
+        if not tenant_id:
+            doctor = await get_doctor_by_account_id(db, str(account["_id"]))
+            if doctor and doctor.tenant_id:
+                tenant_id = doctor.tenant_id
+        # If not a doctor, check if user is a patient with a tenant
+        if not tenant_id:
+            patient = await get_patient_by_account_id(db, str(account["_id"]))
+            if patient and patient.tenant_id:
+                tenant_id = patient.tenant_id
+    _user_tenants.set(email, tenant_id or "")
+    return tenant_id
 
 class TenantMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         # Clear tenant context before processing
         clear_tenant_context()
-        
+
         try:
-            # Extract tenant ID from header or token if available
-            tenant_id = request.headers.get("X-Tenant-ID")
-            
-            # If tenant ID is not in headers, try to get it from the authenticated user
-            if not tenant_id:
-                try:
-                    # Use auth utilities to get the current user (if authenticated)
-                    user = await get_current_user(request)
-                    if user:
-                        # Get database
-                        db = await get_database()
-                        
-                        # Check if user is a doctor and get tenant ID
-                        doctor = await get_doctor_by_account_id(db, str(user.id))
-                        if doctor and doctor.tenant_id:
-                            tenant_id = doctor.tenant_id
-                        
-                        # If not a doctor, check if user is a patient with a tenant
-                        if not tenant_id:
-                            patient = await get_patient_by_account_id(db, str(user.id))
-                            if patient and patient.tenant_id:
-                                tenant_id = patient.tenant_id
-                except Exception:
-                    # If any errors occur during tenant detection, proceed without tenant context
-                    pass
-            
+            tenant_id = None
+            resolved = False
+
+            with span("tenant.resolve") as resolve_span:
+                # The authenticated user's tenant wins, so a header can't switch tenants
+                token = _bearer_token(request)
+                if token:
+                    try:
+                        user = verify_token(token)
+                        tenant_id = await resolve_user_tenant(user.email)
+                        resolved = tenant_id is not None
+                    except Exception:
+                        # If any errors occur during tenant detection, proceed without tenant context
+                        pass
+
+                # Otherwise fall back to the tenant named in the request
+                if not tenant_id:
+                    tenant_id = request.headers.get("X-Tenant-ID")
+                if resolve_span is not None:
+                    resolve_span.set(tenant_id=tenant_id or "")
+
             # Set tenant context if we have a tenant ID
             if tenant_id:
-                set_tenant_context(tenant_id)
-                
+                set_tenant_context(tenant_id, resolved)
+
             # Process the request
             response = await call_next(request)
-            
+
             # Add tenant ID to response headers for debugging if needed
             if tenant_id:
                 response.headers["X-Tenant-ID"] = tenant_id
-                
+
             return response
-            
+
         finally:
             # Always clear tenant context after request is processed
-            clear_tenant_context()
\ No newline at end of file
+            clear_tenant_context()
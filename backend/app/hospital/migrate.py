@@ -0,0 +1,153 @@
+# hospital/migrate.py
+"""
+Move a tenant's patients, doctors and diagnoses out of the shared collections
+into its own prefixed collections or its own database, so a large tenant gets
+isolated indexes and cache footprint.
+
+Copies are batched upserts, so an interrupted run can simply be restarted.
+Once everything is copied the tenant's route is switched; after other workers
+have picked up the new route (tenant_routes_refresh_interval), a catch-up pass
+copies documents created at the old location in the meantime, and only then
+are the old copies deleted (with --drop-source). Updates made at the old
+location during that window are not carried over, so run it off-peak.
+
+Usage (from the app directory):
+    python -m hospital.migrate hospital_a --mode collections
+    python -m hospital.migrate hospital_a --mode database --drop-source
+    python -m hospital.migrate hospital_a --mode shared   # move back
+"""
+import argparse
+import asyncio
+from typing import AsyncIterator, Optional
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReplaceOne, UpdateOne
+from config.settings import settings
+from db.mongo import client, tenant_router, TENANT_COLLECTIONS, SHARED, COLLECTIONS, DATABASE
+
+async def copy_indexes(source: AsyncIOMotorCollection, target: AsyncIOMotorCollection) -> None:
+    """Recreate the source collection's secondary indexes on the target"""
+    for name, info in (await source.index_information()).items():
+        if name == "_id_":
+            continue
+        options = {k: v for k, v in info.items() if k not in ("key", "v", "ns")}
+        await target.create_index(info["key"], name=name, **options)
+
+async def _tenant_documents(db: AsyncIOMotorDatabase, name: str, tenant_id: str, mode: str, batch_size: int) -> AsyncIterator[list[dict]]:
+    """Batches of a tenant's documents from the collection its data lives in under `mode`"""
+    source = tenant_router.collection(db, name, tenant_id, mode=mode)
+    if name == "diagnoses":
+        # Diagnoses reference patients rather than tenants
+        async for patients in _tenant_documents(db, "patients", tenant_id, mode, batch_size):
+            patient_ids = [str(patient["_id"]) for patient in patients]
+            batch = []
+            async for diagnosis in source.find({"patient_id": {"$in": patient_ids}}, batch_size=batch_size):
+                batch.append(diagnosis)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        return
+
+    batch = []
+    async for document in source.find({"tenant_id": tenant_id}, batch_size=batch_size).sort("_id", 1):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def copy_tenant(
+    db: AsyncIOMotorDatabase,
+    tenant_id: str,
+    source_mode: str,
+    target_mode: str,
+    batch_size: int,
+    only_missing: bool = False,
+) -> dict[str, int]:
+    """
+    Upsert the tenant's documents into the target location. With only_missing,
+    documents already in the target are left alone, so writes made there after
+    the route switch are never overwritten with older copies.
+    """
+    copied = {}
+    for name in TENANT_COLLECTIONS:
+        source = tenant_router.collection(db, name, tenant_id, mode=source_mode)
+        target = tenant_router.collection(db, name, tenant_id, mode=target_mode)
+        await copy_indexes(source, target)
+        copied[name] = 0
+        async for batch in _tenant_documents(db, name, tenant_id, source_mode, batch_size):
+            if only_missing:
+                operations = [
+                    UpdateOne({"_id": d["_id"]}, {"$setOnInsert": {k: v for k, v in d.items() if k != "_id"}}, upsert=True)
+                    for d in batch
+                ]
+            else:
+                operations = [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in batch]
+            await target.bulk_write(operations, ordered=False)
+            copied[name] += len(batch)
+            print(f"{tenant_id}: copied {copied[name]} {name}")
+    return copied
+
+async def drop_source(db: AsyncIOMotorDatabase, tenant_id: str, source_mode: str, batch_size: int) -> None:
+    # Diagnoses first: they are found through the tenant's patients
+    for name in ("diagnoses", "patients", "doctors"):
+        source = tenant_router.collection(db, name, tenant_id, mode=source_mode)
+        deleted = 0
+        async for batch in _tenant_documents(db, name, tenant_id, source_mode, batch_size):
+            result = await source.delete_many({"_id": {"$in": [d["_id"] for d in batch]}})
+            deleted += result.deleted_count
+        print(f"{tenant_id}: removed {deleted} {name} from the {source_mode} location")
+
+async def stamp_accounts(db: AsyncIOMotorDatabase, tenant_id: str, mode: str, batch_size: int) -> None:
+    """
+    Record the tenant on its users' accounts, so request routing can find the
+    tenant without searching the shared profile collections
+    """
+    for name in ("doctors", "patients"):
+        async for batch in _tenant_documents(db, name, tenant_id, mode, batch_size):
+            account_ids = [d["account_id"] for d in batch if d.get("account_id")]
+            if account_ids:
+                await db["accounts"].update_many({"_id": {"$in": account_ids}}, {"$set": {"tenant_id": tenant_id}})
+
+async def migrate(tenant_id: str, target_mode: str, batch_size: int = 1000, drop: bool = False, wait: Optional[float] = None) -> None:
+    db = client[settings.MONGO_DB_NAME]
+    await tenant_router.refresh(db)
+    source_mode = tenant_router.mode(tenant_id)
+    if source_mode == target_mode:
+        print(f"{tenant_id} is already routed to {target_mode}")
+        return
+    if target_mode != SHARED and (settings.use_tenant_databases or settings.use_tenant_collections):
+        raise SystemExit("Per-tenant routes are ignored while use_tenant_databases/use_tenant_collections is set")
+
+    print(f"Migrating {tenant_id}: {source_mode} -> {target_mode}")
+    copied = await copy_tenant(db, tenant_id, source_mode, target_mode, batch_size)
+    await stamp_accounts(db, tenant_id, target_mode, batch_size)
+    await tenant_router.set_route(db, tenant_id, target_mode)
+    print(f"{tenant_id}: routed to {target_mode} ({copied})")
+
+    # Let every worker reload its routes, then pick up writes that still
+    # landed on the old location before they did
+    wait = settings.tenant_routes_refresh_interval * 2 if wait is None else wait
+    print(f"Waiting {wait:.0f}s for workers to pick up the new route")
+    await asyncio.sleep(wait)
+    caught_up = await copy_tenant(db, tenant_id, source_mode, target_mode, batch_size, only_missing=True)
+    print(f"{tenant_id}: catch-up pass checked {caught_up}")
+
+    if drop:
+        await drop_source(db, tenant_id, source_mode, batch_size)
+    print(f"Done migrating {tenant_id}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move a tenant's data into its own collections or database")
+    parser.add_argument("tenant_id")
+    parser.add_argument("--mode", choices=[COLLECTIONS, DATABASE, SHARED], default=COLLECTIONS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-source", action="store_true", help="Delete the tenant's documents from the old location")
+    parser.add_argument("--wait", type=float, help="Seconds to wait before the catch-up pass (defaults to twice the route refresh interval)")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.tenant_id, args.mode, args.batch_size, args.drop_source, args.wait))
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,27 @@
 # hospital/services.py
-from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from .models import Hospital
 from typing import List, Optional
 from bson import ObjectId
-from app.config.settings import settings
+from db.mongo import get_tenant_database, tenant_router
+from db.cache import hospital_cache
 
 async def get_hospital_by_id(db: AsyncIOMotorDatabase, hospital_id: str) -> Optional[Hospital]:
     """
     Retrieve a hospital/tenant by ID
     """
     if isinstance(hospital_id, str) and len(hospital_id) == 24:
+        cached = hospital_cache.get(hospital_id, db["hospitals"].full_name)
+        if cached is not None:
+            return cached
         try:
             hospital_id_obj = ObjectId(hospital_id)
+            generation = hospital_cache.generation()
             hospital_data = await db["hospitals"].find_one({"_id": hospital_id_obj})
             if hospital_data:
-                return Hospital(**hospital_data)
+                hospital = Hospital(**hospital_data)
+                hospital_cache.set(hospital_id, db["hospitals"].full_name, hospital.model_copy(), generation)
+                return hospital
         except:
             pass
     return None
@@ -23,9 +30,20 @@ async def get_hospital_by_product_key(db: AsyncIOMotorDatabase, product_key: str
     """
     Retrieve a hospital/tenant by product key
     """
+    hospital_id = hospital_cache.get_alias(product_key)
+    if hospital_id is not None:
+        cached = hospital_cache.get(hospital_id, db["hospitals"].full_name)
+        # The product key may have changed since the alias was recorded
+        if cached is not None and cached.product_key == product_key:
+            return cached
+
+    generation = hospital_cache.generation()
     hospital_data = await db["hospitals"].find_one({"product_key": product_key})
     if hospital_data:
-        return Hospital(**hospital_data)
+        hospital = Hospital(**hospital_data)
+        hospital_cache.set(hospital_data["_id"], db["hospitals"].full_name, hospital.model_copy(), generation)
+        hospital_cache.set_alias(product_key, hospital_data["_id"])
+        return hospital
     return None
 
 async def create_hospital(db: AsyncIOMotorDatabase, name: str, product_key: str) -> Hospital:
@@ -39,6 +57,8 @@ async def create_hospital(db: AsyncIOMotorDatabase, name: str, product_key: str)
     
     result = await db["hospitals"].insert_one(hospital_data)
     hospital_data["_id"] = result.inserted_id
+    # Other workers learn about the tenant on their next route refresh
+    tenant_router.add_tenant(str(result.inserted_id))
     return Hospital(**hospital_data)
 
 async def get_all_hospitals(db: AsyncIOMotorDatabase) -> List[Hospital]:
@@ -59,6 +79,7 @@ async def update_hospital(db: AsyncIOMotorDatabase, hospital_id: str, updated_da
                 {"_id": hospital_id_obj},
                 {"$set": updated_data}
             )
+            hospital_cache.invalidate(hospital_id)
             return result.modified_count > 0
         except:
             pass
@@ -67,14 +88,9 @@ async def update_hospital(db: AsyncIOMotorDatabase, hospital_id: str, updated_da
 async def get_tenant_db(tenant_id: str) -> AsyncIOMotorDatabase:
     """
     Get a database instance for a specific tenant
-    
-    This enables true database-level multi-tenancy where each tenant has its own
-    database. For shared database/collection approach, simply use the tenant_id
-    field in queries.
+
+    Tenants routed to their own database (use_tenant_databases, or moved by
+    hospital.migrate) get it; everyone else shares the main database. Use
+    db.mongo.tenant_collection for collection-level routing.
     """
-    # client = AsyncIOMotorClient(settings.mongodb_uri)
-    # return client[f"{settings.mongodb_db_name}_{tenant_id}"]
-    
-    # Using the main database
-    client = AsyncIOMotorClient(settings.MONGO_URI)
-    return client[settings.MONGODB_DB_NAME]
\ No newline at end of file
+    return await get_tenant_database(tenant_id)
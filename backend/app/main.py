@@ -1,13 +1,69 @@
 # app.py
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 # from model import load_model, predict
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from db import *
 from routers import api_router
+from profiling.middleware import ProfilingMiddleware
+from hospital.middleware import TenantMiddleware
+from tracing.middleware import TracingMiddleware
+from concurrency.middleware import ConcurrencyLimitMiddleware
+from capture.middleware import CaptureMiddleware
+from config.settings import settings
+from ml.registry import watch_manifest
+from utils.responses import FastJSONResponse
+from db.mongo import get_database, tenant_router, watch_tenant_routes
+from db.cache import watch_changes
+from patient.services import ensure_patient_indexes
+from diag.idempotency import IdempotencyMiddleware, ensure_idempotency_indexes
+from audit.log import audit_log, ensure_audit_collection
+from ml.usage import llm_usage
+from patient.reencryption import lazy_reencryption
+from patient.rotation import run_key_rotation
+
+async def _ensure_indexes():
+    try:
+        db = await get_database()
+        await ensure_patient_indexes(db)
+        await ensure_idempotency_indexes(db)
+        await ensure_audit_collection(db)
+    except Exception as e:
+        print(f"Could not create indexes: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Index creation waits on Mongo, so don't let it block startup
+    background_tasks = [asyncio.create_task(_ensure_indexes())]
+    # Unknown tenants use the shared collections, so load the routes before serving
+    try:
+        await tenant_router.refresh(await get_database())
+    except Exception as e:
+        print(f"Could not load tenant routes: {e}")
+    background_tasks.append(asyncio.create_task(watch_tenant_routes(settings.tenant_routes_refresh_interval)))
+    background_tasks.append(asyncio.create_task(audit_log.run(await get_database())))
+    background_tasks.append(asyncio.create_task(llm_usage.run(await get_database())))
+    background_tasks.append(asyncio.create_task(lazy_reencryption.run()))
+    if settings.key_rotation_enabled:
+        background_tasks.append(asyncio.create_task(run_key_rotation(await get_database())))
+    if settings.entity_cache_change_stream:
+        background_tasks.append(asyncio.create_task(watch_changes(await get_database())))
+    if settings.model_watch_interval > 0:
+        background_tasks.append(asyncio.create_task(watch_manifest(settings.model_watch_interval)))
+    yield
+    # Drain audit events before the flusher is cancelled
+    await audit_log.close(settings.audit_shutdown_timeout)
+    try:
+        await llm_usage.flush()
+    except Exception as e:
+        print(f"Could not flush LLM usage: {e}")
+    for task in background_tasks:
+        task.cancel()
 
 # Initialize FastAPI app
-app = FastAPI(title="XDoc REST API")
+app = FastAPI(title="XDoc REST API", lifespan=lifespan, default_response_class=FastJSONResponse)
 app.include_router(api_router)
 
 origins = []
@@ -16,6 +72,8 @@ origins.append("http://localhost:5173")
 # if DEBUG:
 #     origins.extend(["http://localhost:3000", "http://localhost:8000", "http://localhost:8080", "http://localhost:80", "http://localhost:5173"])
 
+# Innermost, so it sees the request's tenant and replayed responses still get CORS headers
+app.add_middleware(IdempotencyMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,  # Allows all origins
@@ -23,6 +81,14 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(TenantMiddleware)
+# Sheds overload before any tenant lookup or work happens
+app.add_middleware(ConcurrencyLimitMiddleware)
+# Opt-in; outside the limiter so shed requests are part of the captured mix
+app.add_middleware(CaptureMiddleware)
+# Outermost, so tenant resolution is part of the trace
+app.add_middleware(TracingMiddleware)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
@@ -1,15 +1,8 @@
 from .model import DiabetesPredictor, CardioPredictor
+from .registry import registry
 
 def get_predictor(disease: str):
     try:
-        if disease.lower() == "diabetes":
-            return DiabetesPredictor(
-                model_path="pretrained/diabetes_model.json",
-                scaler_path="pretrained/diabetes.scaler.pkl",
-            )
-        elif disease.lower() == "cardiovascular":
-            return CardioPredictor(model_path="pretrained/heart_model.pkl")
-        else:
-            raise ValueError("Unsupported disease type")
+        return registry.get(disease)
     except Exception as e:
-        print(f"Error loading model: {e}")
\ No newline at end of file
+        print(f"Error loading model: {e}")
@@ -0,0 +1,229 @@
+# app/ml/bulk.py
+"""
+Offline bulk scoring for population screening files.
+
+Usage (from the app directory):
+    python -m ml.bulk diabetes ../training/diabetes.csv scores.csv
+    python -m ml.bulk cardiovascular screening.ndjson scores_dir --output-format parquet --resume
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+import numpy as np
+import pandas as pd
+from utils.system import available_cpus
+
+_predictor = None
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def _init_worker(disease: str, workers: int) -> None:
+    """
+    Load the predictor once per worker process, with the native thread limit
+    of one of `workers` single-threaded scoring processes
+    """
+    global _predictor
+    from ml import get_predictor
+    from ml.threads import configure_threads, limit_native_threads
+    configure_threads(workers, inference_threads=1)
+    limit_native_threads()
+    _predictor = get_predictor(disease)
+    if _predictor is None:
+        raise RuntimeError(f"Could not load the {disease} model")
+
+def _score_chunk(chunk: pd.DataFrame, top_k: int, with_shap: bool, id_column: Optional[str]) -> pd.DataFrame:
+    predictor = _predictor
+    feature_names = predictor.FEATURES if hasattr(predictor, "FEATURES") else predictor.features
+
+    # Map screening columns (e.g. "Blood Pressure") onto model features (e.g. "blood_pressure")
+    columns = {_normalize(c): c for c in chunk.columns}
+    missing = [f for f in feature_names if _normalize(f) not in columns]
+    if missing:
+        raise ValueError(f"Input is missing columns: {missing}")
+    features = pd.DataFrame({f: chunk[columns[_normalize(f)]].values for f in feature_names})
+
+    probs, shap_values = predictor.predict_batch(features, with_shap=with_shap)
+    predictions = probs.argmax(axis=1)
+
+    result = pd.DataFrame(index=chunk.index)
+    result["row_id"] = chunk[id_column].values if id_column else chunk.index.values
+    result["prediction"] = predictions
+    result["confidence"] = probs.max(axis=1)
+    for i in range(probs.shape[1]):
+        result[f"prob_{i}"] = probs[:, i]
+
+    if with_shap and top_k > 0:
+        contributions = predictor.select_shap(shap_values, predictions)
+        names = np.asarray(predictor.shap_feature_names)
+        order = np.argsort(-np.abs(contributions), axis=1)[:, :top_k]
+        for k in range(order.shape[1]):
+            result[f"top{k + 1}_feature"] = names[order[:, k]]
+            result[f"top{k + 1}_shap"] = np.take_along_axis(contributions, order[:, k:k + 1], axis=1)[:, 0]
+    return result
+
+def _read_chunks(path: str, input_format: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    if input_format == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    else:
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+
+def _detect_format(path: str) -> str:
+    return "ndjson" if path.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+class _Checkpoint:
+    """Progress marker written after each chunk so an interrupted run can resume"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.chunks_done = 0
+        self.rows_done = 0
+        self.output_offset = 0
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        self.chunks_done = state["chunks_done"]
+        self.rows_done = state["rows_done"]
+        self.output_offset = state.get("output_offset", 0)
+        return True
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "chunks_done": self.chunks_done,
+                "rows_done": self.rows_done,
+                "output_offset": self.output_offset,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+class _Writer:
+    """Incremental CSV file or directory of Parquet parts"""
+
+    def __init__(self, path: str, output_format: str, checkpoint: _Checkpoint, resume: bool):
+        self.path = path
+        self.output_format = output_format
+        self.checkpoint = checkpoint
+        if output_format == "parquet":
+            os.makedirs(path, exist_ok=True)
+        elif resume and os.path.exists(path):
+            # Drop anything written after the last checkpoint
+            with open(path, "r+b") as f:
+                f.truncate(checkpoint.output_offset)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def write(self, index: int, frame: pd.DataFrame) -> None:
+        if self.output_format == "parquet":
+            frame.to_parquet(os.path.join(self.path, f"part-{index:06d}.parquet"), index=False)
+            return
+        with open(self.path, "a", newline="") as f:
+            frame.to_csv(f, header=f.tell() == 0, index=False)
+            self.checkpoint.output_offset = f.tell()
+
+def run(
+    disease: str,
+    input_path: str,
+    output_path: str,
+    input_format: Optional[str] = None,
+    output_format: str = "csv",
+    chunk_size: int = 5000,
+    workers: Optional[int] = None,
+    top_k: int = 3,
+    with_shap: bool = True,
+    id_column: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = False,
+) -> int:
+    """
+    Score an input file chunk by chunk, returning the number of rows written.
+    `workers` defaults to the CPUs available to this process; 0 scores in-process.
+    """
+    if workers is None:
+        workers = available_cpus()
+    input_format = input_format or _detect_format(input_path)
+    checkpoint = _Checkpoint(checkpoint_path or output_path.rstrip("/") + ".checkpoint")
+    if resume and checkpoint.load():
+        print(f"Resuming after {checkpoint.rows_done} rows", file=sys.stderr)
+    writer = _Writer(output_path, output_format, checkpoint, resume)
+
+    chunks = _read_chunks(input_path, input_format, chunk_size)
+    start = time.perf_counter()
+    rows_scored = 0
+
+    def record(index: int, frame: pd.DataFrame) -> None:
+        nonlocal rows_scored
+        writer.write(index, frame)
+        rows_scored += len(frame)
+        checkpoint.chunks_done = index + 1
+        checkpoint.rows_done += len(frame)
+        checkpoint.save()
+        elapsed = time.perf_counter() - start
+        print(f"chunk {index}: {checkpoint.rows_done} rows total, {rows_scored / elapsed:,.0f} rows/s", file=sys.stderr)
+
+    if workers <= 0:
+        _init_worker(disease, 1)
+        for index, chunk in enumerate(chunks):
+            if index >= checkpoint.chunks_done:
+                record(index, _score_chunk(chunk, top_k, with_shap, id_column))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(disease, workers)) as pool:
+            # Bound the number of chunks in flight so memory stays constant
+            pending = deque()
+            for index, chunk in enumerate(chunks):
+                if index < checkpoint.chunks_done:
+                    continue
+                pending.append((index, pool.submit(_score_chunk, chunk, top_k, with_shap, id_column)))
+                if len(pending) >= workers * 2:
+                    done_index, future = pending.popleft()
+                    record(done_index, future.result())
+            while pending:
+                done_index, future = pending.popleft()
+                record(done_index, future.result())
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows_scored} rows in {elapsed:.1f}s ({rows_scored / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+    return rows_scored
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk-score a screening file with a pretrained model")
+    parser.add_argument("disease", choices=["diabetes", "cardiovascular"])
+    parser.add_argument("input", help="CSV or NDJSON input file")
+    parser.add_argument("output", help="CSV file, or directory of parts for parquet output")
+    parser.add_argument("--input-format", choices=["csv", "ndjson"])
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=available_cpus(), help="0 scores in-process")
+    parser.add_argument("--top-k", type=int, default=3, help="Number of SHAP contributions to keep per row")
+    parser.add_argument("--no-shap", action="store_true", help="Skip SHAP contributions")
+    parser.add_argument("--id-column", help="Input column copied to row_id (defaults to the row number)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (defaults to <output>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    args = parser.parse_args(argv)
+
+    run(
+        disease=args.disease,
+        input_path=args.input,
+        output_path=args.output,
+        input_format=args.input_format,
+        output_format=args.output_format,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        top_k=args.top_k,
+        with_shap=not args.no_shap,
+        id_column=args.id_column,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# app/ml/counterfactual.py
+"""
+Counterfactual search: the cheapest realistic changes to modifiable features
+(weight, lipids, glucose, blood pressure, lifestyle) that move a patient to a
+lower risk class.
+
+Each feature has a list of moves in its healthy direction, limited to
+clinical bounds, and each move has a cost in "units of effort". The search
+is a beam search over sets of changed features. At every depth, each state in
+the beam is expanded with every move on a feature it hasn't changed yet, and
+all candidates are scored in a single predict_batch call. States that reach
+a lower class become solutions. The rest are ranked by the probability of the
+lower classes, and the best `beam_width` states are kept. The search stops at
+`max_changes` or when the time budget runs out, and returns the cheapest
+solutions found.
+"""
+import time
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+@dataclass(frozen=True)
+class NumericMove:
+    # direction is -1 to lower the value, +1 to raise it; moves stop at bound
+    direction: int
+    step: float
+    steps: int
+    bound: float
+    cost_per_step: float
+
+@dataclass(frozen=True)
+class OrdinalMove:
+    # Levels ordered from least to most healthy
+    levels: tuple
+    cost_per_level: float
+
+# Diabetes inputs use mmol/L for lipids and % for HbA1c
+DIABETES_MOVES = {
+    "BMI": NumericMove(-1, 1.0, 10, 18.5, 1.0),
+    "HbA1c": NumericMove(-1, 0.25, 12, 4.5, 0.5),
+    "Chol": NumericMove(-1, 0.25, 8, 3.5, 0.3),
+    "TG": NumericMove(-1, 0.2, 10, 0.6, 0.3),
+    "LDL": NumericMove(-1, 0.2, 10, 1.4, 0.3),
+    "HDL": NumericMove(+1, 0.1, 8, 2.0, 0.4),
+    "VLDL": NumericMove(-1, 0.1, 8, 0.2, 0.2),
+}
+
+CARDIO_MOVES = {
+    "bmi": NumericMove(-1, 1.0, 10, 18.5, 1.0),
+    "blood_pressure": NumericMove(-1, 5.0, 8, 110.0, 0.5),
+    "cholesterol_level": NumericMove(-1, 10.0, 8, 150.0, 0.4),
+    "triglyceride_level": NumericMove(-1, 20.0, 10, 100.0, 0.3),
+    "fasting_blood_sugar": NumericMove(-1, 5.0, 8, 80.0, 0.4),
+    "sleep_hours": NumericMove(+1, 0.5, 6, 8.0, 0.3),
+    "exercise_habits": OrdinalMove(("Low", "Medium", "High"), 1.0),
+    "alcohol_consumption": OrdinalMove(("High", "Medium", "Low"), 1.0),
+    "sugar_consumption": OrdinalMove(("High", "Medium", "Low"), 0.8),
+    "smoking": OrdinalMove(("Yes", "No"), 2.0),
+}
+
+MOVES = {"diabetes": DIABETES_MOVES, "cardiovascular": CARDIO_MOVES}
+
+# Added per changed feature, so fewer simultaneous changes are preferred
+FEATURE_PENALTY = 0.25
+
+def candidate_moves(base: dict, moves: dict) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Every single-feature move available from `base`, as parallel arrays of
+    feature name, index into the returned feature list, target value and cost
+    """
+    features, feature_index, values, costs = [], [], [], []
+    for feature, move in moves.items():
+        current = base.get(feature)
+        if current is None:
+            # Unknown values can't be changed meaningfully
+            continue
+        if isinstance(move, NumericMove):
+            targets = current + move.direction * move.step * np.arange(1, move.steps + 1)
+            targets = targets[(targets - move.bound) * move.direction <= 0]
+            target_costs = [move.cost_per_step * (k + 1) for k in range(len(targets))]
+            targets = [round(float(t), 4) for t in targets]
+        else:
+            if current not in move.levels:
+                continue
+            position = move.levels.index(current)
+            targets = list(move.levels[position + 1:])
+            target_costs = [move.cost_per_level * (k + 1) for k in range(len(targets))]
+        if not targets:
+            continue
+        features.append(feature)
+        feature_index.extend([len(features) - 1] * len(targets))
+        values.extend(targets)
+        costs.extend(target_costs)
+    return features, np.asarray(feature_index, dtype=int), np.asarray(values, dtype=object), np.asarray(costs, dtype=float)
+
+class CounterfactualSearch:
+    def __init__(self, predictor, disease: str, beam_width: int = 32, max_changes: int = 3, budget_ms: float = 250.0):
+        self.predictor = predictor
+        self.moves = MOVES[disease]
+        self.beam_width = beam_width
+        self.max_changes = max_changes
+        self.budget_ms = budget_ms
+
+    def _score(self, base: dict, columns: dict[str, np.ndarray], rows: int) -> np.ndarray:
+        frame = pd.DataFrame({name: columns[name] if name in columns else [value] * rows for name, value in base.items()})
+        probs, _ = self.predictor.predict_batch(frame, with_shap=False)
+        return probs
+
+    def search(self, base: dict, top_k: int = 3) -> dict:
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        base_probs = self._score(base, {}, 1)[0]
+        current_class = int(base_probs.argmax())
+        result = {
+            "model_version": self.predictor.version,
+            "prediction": current_class,
+            "confidence": float(base_probs.max()),
+            "counterfactuals": [],
+        }
+        features, move_feature, move_value, move_cost = candidate_moves(base, self.moves)
+        if current_class == 0 or not features:
+            result.update(evaluated=0, depth=0, elapsed_ms=round((time.perf_counter() - start) * 1000, 2))
+            return result
+
+        moves = len(move_feature)
+        # Beam state: changed-feature mask, chosen value per feature, accumulated cost
+        beam_changed = np.zeros((1, len(features)), dtype=bool)
+        beam_values = np.empty((1, len(features)), dtype=object)
+        beam_cost = np.zeros(1)
+        solutions: dict[frozenset, tuple[float, dict, np.ndarray]] = {}
+        evaluated = 0
+        depth = 0
+
+        while depth < self.max_changes and len(beam_cost) and (depth == 0 or time.perf_counter() < deadline):
+            depth += 1
+            # Every beam state x every move, minus moves on features already changed
+            parent = np.repeat(np.arange(len(beam_cost)), moves)
+            move = np.tile(np.arange(moves), len(beam_cost))
+            keep = ~beam_changed[parent, move_feature[move]]
+            parent, move = parent[keep], move[keep]
+            if not len(parent):
+                break
+
+            changed = beam_changed[parent].copy()
+            values = beam_values[parent].copy()
+            changed[np.arange(len(parent)), move_feature[move]] = True
+            values[np.arange(len(parent)), move_feature[move]] = move_value[move]
+            cost = beam_cost[parent] + move_cost[move] + FEATURE_PENALTY
+
+            columns = {}
+            for i, feature in enumerate(features):
+                column = np.asarray([base[feature]] * len(parent), dtype=object)
+                column[changed[:, i]] = values[changed[:, i], i]
+                columns[feature] = column if isinstance(self.moves[feature], OrdinalMove) else column.astype(float)
+            probs = self._score(base, columns, len(parent))
+            evaluated += len(parent)
+
+            predicted = probs.argmax(axis=1)
+            reached = predicted < current_class
+            for i in np.flatnonzero(reached):
+                key = frozenset(np.flatnonzero(changed[i]))
+                if key not in solutions or cost[i] < solutions[key][0]:
+                    changes = {features[j]: values[i, j] for j in key}
+                    solutions[key] = (float(cost[i]), changes, probs[i])
+
+            # Rank the rest by how likely a lower class already is, cheapest first on ties
+            progress = probs[:, :current_class].sum(axis=1)
+            order = np.lexsort((cost, -progress))
+            order = order[~reached[order]][:self.beam_width]
+            beam_changed, beam_values, beam_cost = changed[order], values[order], cost[order]
+
+        # A solution that changes a superset of another's features is never the minimal change
+        minimal = [s for key, s in solutions.items() if not any(other < key for other in solutions)]
+        ranked = sorted(minimal, key=lambda s: s[0])[:top_k]
+        result["counterfactuals"] = [
+            {
+                "changes": [{"feature": f, "from": base[f], "to": v} for f, v in changes.items()],
+                "cost": round(cost, 3),
+                "prediction": int(probs.argmax()),
+                "confidence": float(probs.max()),
+            }
+            for cost, changes, probs in ranked
+        ]
+        result.update(evaluated=evaluated, depth=depth, elapsed_ms=round((time.perf_counter() - start) * 1000, 2))
+        return result
+
+def find_counterfactuals(
+    predictor,
+    disease: str,
+    base: dict,
+    top_k: int = 3,
+    beam_width: int = 32,
+    max_changes: int = 3,
+    budget_ms: float = 250.0,
+) -> dict:
+    return CounterfactualSearch(predictor, disease, beam_width, max_changes, budget_ms).search(base, top_k)
@@ -0,0 +1,258 @@
+# app/ml/drift.py
+"""
+Online input-drift monitoring against the training data.
+
+The baseline (built once from training/*.csv with `python -m ml.drift`)
+stores, for each numeric feature, quantile bin edges and the share of
+training rows in each bin, and for each categorical feature the share of
+each category. At serving time every prediction adds one count per feature
+to fixed-size bin counters for its tenant: a histogram sketch on the
+training quantiles, so memory is constant and no raw input is kept. Drift is
+the population stability index (PSI) per feature. Numeric features also get
+a KS-style distance, the largest gap between the two CDFs at the bin edges.
+
+Counts live in two rotating windows of drift_window_seconds. Scores use the
+current and previous windows, so they follow recent traffic. Inputs are
+counted under the tenant resolved from the authenticated user (others under
+the default tenant); tenants without inputs for two windows are dropped and
+at most drift_max_tenants are tracked.
+
+Usage (from the app directory):
+    python -m ml.drift ../training
+"""
+import argparse
+import bisect
+import json
+import math
+import os
+import time
+from typing import Iterable, Optional
+import numpy as np
+import pandas as pd
+from config.settings import settings
+from hospital.context import get_resolved_tenant_id
+
+# Training file and model features per disease
+TRAINING_FILES = {
+    "diabetes": "diabetes.csv",
+    "cardiovascular": "imputed_heart_disease.csv",
+}
+FEATURES = {
+    "diabetes": ['AGE', 'Urea', 'Cr', 'HbA1c', 'Chol', 'TG', 'HDL', 'LDL', 'VLDL', 'BMI'],
+    "cardiovascular": [
+        'age', 'gender', 'blood_pressure', 'cholesterol_level',
+        'exercise_habits', 'smoking', 'family_heart_disease', 'diabetes', 'bmi',
+        'high_blood_pressure', 'low_hdl_cholesterol', 'high_ldl_cholesterol',
+        'alcohol_consumption', 'stress_level', 'sleep_hours',
+        'sugar_consumption', 'triglyceride_level', 'fasting_blood_sugar',
+        'crp_level', 'homocysteine_level'
+    ],
+}
+
+# Smoothing for empty bins, so PSI stays finite
+EPSILON = 1e-4
+
+def baseline_path() -> str:
+    return os.path.join(settings.model_dir, "drift_baseline.json")
+
+def build_baseline(training_dir: str, bins: int = 10) -> dict:
+    """
+    Per disease and feature: {"edges": [...], "expected": [...]} for numeric
+    features, {"categories": [...], "expected": [...]} for categorical ones.
+    The last expected slot is for missing (or unseen) values.
+    """
+    baseline = {}
+    for disease, filename in TRAINING_FILES.items():
+        frame = pd.read_csv(os.path.join(training_dir, filename))
+        features = {}
+        for feature in FEATURES[disease]:
+            column = frame[feature]
+            present = column.dropna()
+            if pd.api.types.is_numeric_dtype(column):
+                edges = np.unique(np.quantile(present, np.arange(1, bins) / bins))
+                counts = np.bincount(np.searchsorted(edges, present, side="right"), minlength=len(edges) + 1)
+                entry = {"edges": edges.tolist()}
+            else:
+                categories = sorted(present.astype(str).unique())
+                counts = present.astype(str).value_counts().reindex(categories).to_numpy()
+                entry = {"categories": categories}
+            counts = np.append(counts, column.isna().sum())
+            entry["expected"] = (counts / len(column)).tolist()
+            features[feature] = entry
+        baseline[disease] = features
+    return baseline
+
+def load_baseline() -> dict:
+    path = baseline_path()
+    if not os.path.exists(path):
+        print(f"No drift baseline at {path}, drift monitoring disabled")
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def psi(actual: np.ndarray, expected: np.ndarray) -> float:
+    actual = np.maximum(actual, EPSILON)
+    expected = np.maximum(expected, EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+def ks_distance(actual: np.ndarray, expected: np.ndarray) -> float:
+    # Compare the CDFs of present values only, at the bin edges
+    actual, expected = actual[:-1], expected[:-1]
+    if actual.sum() == 0 or expected.sum() == 0:
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(actual / actual.sum()) - np.cumsum(expected / expected.sum()))))
+
+def _label(value: str) -> str:
+    """Escape a Prometheus label value"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class _Window:
+    __slots__ = ("started", "samples", "counts")
+
+    def __init__(self, features: dict):
+        self.started = time.monotonic()
+        self.samples = 0
+        self.counts = {name: np.zeros(len(entry["expected"]), dtype=np.int64) for name, entry in features.items()}
+
+class DriftMonitor:
+    def __init__(self, baseline: dict, window_seconds: float, min_samples: int, max_tenants: int):
+        self.baseline = baseline
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.max_tenants = max_tenants
+        # Category -> slot lookups, built once
+        self._slots = {
+            disease: {
+                name: {category: i for i, category in enumerate(entry["categories"])}
+                for name, entry in features.items() if "categories" in entry
+            }
+            for disease, features in baseline.items()
+        }
+        # (disease, tenant) -> [previous window, current window]
+        self._windows: dict[tuple[str, str], list[Optional[_Window]]] = {}
+
+    def _current(self, disease: str, tenant_id: Optional[str]) -> _Window:
+        key = (disease, tenant_id or get_resolved_tenant_id() or settings.default_tenant_id)
+        windows = self._windows.get(key)
+        if windows is None:
+            self._evict()
+            windows = self._windows[key] = [None, _Window(self.baseline[disease])]
+        elif time.monotonic() - windows[1].started >= self.window_seconds:
+            windows[0], windows[1] = windows[1], _Window(self.baseline[disease])
+        return windows[1]
+
+    def _evict(self) -> None:
+        """Make room for a new tenant: drop idle ones, then the least recently started"""
+        now = time.monotonic()
+        for key, windows in list(self._windows.items()):
+            # Both windows would have rotated out by now
+            if now - windows[1].started >= 2 * self.window_seconds:
+                del self._windows[key]
+        while len(self._windows) >= self.max_tenants:
+            del self._windows[min(self._windows, key=lambda k: self._windows[k][1].started)]
+
+    def _slot(self, disease: str, name: str, entry: dict, value) -> int:
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return len(entry["expected"]) - 1
+        if "edges" in entry:
+            return bisect.bisect_right(entry["edges"], value)
+        # Unseen categories share the missing slot
+        return self._slots[disease][name].get(getattr(value, "value", value), len(entry["expected"]) - 1)
+
+    def observe(self, disease: str, features: dict, tenant_id: Optional[str] = None) -> None:
+        """Count one model input, O(features)"""
+        if disease not in self.baseline:
+            return
+        window = self._current(disease, tenant_id)
+        window.samples += 1
+        for name, entry in self.baseline[disease].items():
+            window.counts[name][self._slot(disease, name, entry, features.get(name))] += 1
+
+    def observe_many(self, disease: str, rows: list[dict], tenant_id: Optional[str] = None) -> None:
+        """Count a batch of model inputs with one vectorized pass per feature"""
+        if disease not in self.baseline or not rows:
+            return
+        window = self._current(disease, tenant_id)
+        window.samples += len(rows)
+        frame = pd.DataFrame(rows)
+        for name, entry in self.baseline[disease].items():
+            missing = len(entry["expected"]) - 1
+            if name not in frame:
+                window.counts[name][missing] += len(rows)
+                continue
+            column = frame[name]
+            if "edges" in entry:
+                values = pd.to_numeric(column, errors="coerce").to_numpy(dtype=float)
+                slots = np.where(np.isnan(values), missing, np.searchsorted(entry["edges"], values, side="right"))
+            else:
+                lookup = self._slots[disease][name]
+                slots = column.map(lambda v: lookup.get(getattr(v, "value", v), missing)).to_numpy(dtype=np.int64)
+            window.counts[name] += np.bincount(slots, minlength=len(entry["expected"]))
+
+    def scores(self, disease: Optional[str] = None, tenant_id: Optional[str] = None) -> list[dict]:
+        """
+        Drift per disease and tenant over the current and previous windows.
+        Feature scores are left out until min_samples inputs have been seen.
+        """
+        results = []
+        for (key_disease, key_tenant), windows in list(self._windows.items()):
+            if (disease and key_disease != disease) or (tenant_id and key_tenant != tenant_id):
+                continue
+            windows = [w for w in windows if w is not None]
+            samples = sum(w.samples for w in windows)
+            result = {"disease": key_disease, "tenant_id": key_tenant, "samples": samples, "features": {}}
+            if samples >= self.min_samples:
+                for name, entry in self.baseline[key_disease].items():
+                    counts = sum(w.counts[name] for w in windows)
+                    actual = counts / counts.sum()
+                    expected = np.asarray(entry["expected"])
+                    score = {"psi": round(psi(actual, expected), 4), "missing": round(float(actual[-1]), 4)}
+                    if "edges" in entry:
+                        score["ks"] = round(ks_distance(actual, expected), 4)
+                    score["drifted"] = score["psi"] >= settings.drift_psi_alert
+                    result["features"][name] = score
+                result["max_psi"] = max((s["psi"] for s in result["features"].values()), default=0.0)
+                result["drifted"] = [name for name, s in result["features"].items() if s["drifted"]]
+            results.append(result)
+        return results
+
+    def metrics(self) -> str:
+        """Current scores in the Prometheus text exposition format"""
+        lines = [
+            "# HELP xdoc_drift_samples Model inputs counted in the drift windows",
+            "# TYPE xdoc_drift_samples gauge",
+            "# HELP xdoc_drift_psi Population stability index of a feature against the training data",
+            "# TYPE xdoc_drift_psi gauge",
+            "# HELP xdoc_drift_ks Largest CDF gap of a numeric feature against the training data",
+            "# TYPE xdoc_drift_ks gauge",
+        ]
+        for result in self.scores():
+            labels = f'disease="{_label(result["disease"])}",tenant="{_label(result["tenant_id"])}"'
+            lines.append(f"xdoc_drift_samples{{{labels}}} {result['samples']}")
+            for name, score in result["features"].items():
+                lines.append(f'xdoc_drift_psi{{{labels},feature="{_label(name)}"}} {score["psi"]}')
+                if "ks" in score:
+                    lines.append(f'xdoc_drift_ks{{{labels},feature="{_label(name)}"}} {score["ks"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        self._windows.clear()
+
+drift_monitor = DriftMonitor(
+    load_baseline(), settings.drift_window_seconds, settings.drift_min_samples, settings.drift_max_tenants
+)
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the drift baseline from the training data")
+    parser.add_argument("training_dir", help="Directory holding the training CSV files")
+    parser.add_argument("--bins", type=int, default=10, help="Quantile bins per numeric feature")
+    parser.add_argument("--output", help="Baseline file (defaults to drift_baseline.json in the model directory)")
+    args = parser.parse_args(argv)
+
+    output = args.output or baseline_path()
+    with open(output, "w") as f:
+        json.dump(build_baseline(args.training_dir, args.bins), f, indent=2)
+    print(f"Wrote drift baseline to {output}")
+
+if __name__ == "__main__":
+    main()
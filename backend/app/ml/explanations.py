@@ -0,0 +1,136 @@
+# app/ml/explanations.py
+"""
+Tiered explanations for predictions:
+  level 0 - local Vietnamese template rendered from the SHAP list (no network)
+  level 1 - LLM explanation served from cache, generated once on a miss
+  level 2 - fresh LLM generation (refreshes the cache)
+
+LLM calls go through the admission guard; whenever it declines or the call
+fails, the level 0 template is returned instead. Calls, cache hits and
+failures are accounted per tenant in ml/usage.py; once a tenant is over its
+daily LLM budget, level 2 is served like level 1 and cache misses get the
+template. Risk panels (explain_panel) get the same tiers with one LLM call
+covering all of their diseases.
+"""
+import time
+from typing import Callable, Optional
+from config.settings import settings
+from hospital.context import get_resolved_tenant_id
+from tracing.spans import span
+from utils.cache import TTLCache
+from . import fake_llm, gemini
+from .gemini import build_diabetes_prompt, build_cardio_prompt, build_panel_prompt
+from .guard import llm_guard
+from .templates import render_explanation, render_panel_explanation
+from .usage import llm_usage
+
+LEVEL_TEMPLATE = 0
+LEVEL_CACHED = 1
+LEVEL_FRESH = 2
+
+# Disease name LLM usage of combined risk panels is accounted under
+PANEL = "panel"
+
+PROMPT_BUILDERS = {
+    "diabetes": build_diabetes_prompt,
+    "cardiovascular": build_cardio_prompt,
+}
+
+def generate(prompt: str, audience: str, tenant_id: Optional[str], disease: str) -> str:
+    backend = fake_llm if settings.llm_backend == "fake" else gemini
+    with span("llm.generate", backend=settings.llm_backend, audience=audience):
+        start = time.perf_counter()
+        completion = backend.generate(prompt, audience)
+    # Runs on the guard's thread, so calls that outlive their timeout are still billed
+    llm_usage.record_call(tenant_id, disease, audience, completion, time.perf_counter() - start)
+    return completion.text
+
+explanation_cache = TTLCache(maxsize=settings.explanation_cache_size, ttl=settings.explanation_cache_ttl)
+
+def _cache_key(disease: str, features_with_shap: list[dict], prediction: int, confidence: float,
+               audience: str, model_version: Optional[str]) -> tuple:
+    # Same inputs to the prompt builder give the same prompt; only the top 5 features are used
+    top = sorted(features_with_shap, key=lambda x: abs(x["shap_value"]), reverse=True)[:5]
+    return (
+        disease, model_version, audience, prediction, round(confidence, 3),
+        tuple((item["feature"], str(item["value"]), round(item["shap_value"], 3)) for item in top),
+    )
+
+def _tiered(
+    disease: str,
+    audience: str,
+    level: int,
+    key: tuple,
+    build_prompt: Callable[[], str],
+    render_template: Callable[[], str],
+) -> str:
+    """
+    Template, cached or fresh LLM explanation; `disease` is what the LLM usage
+    is accounted under
+    """
+    if level <= LEVEL_TEMPLATE:
+        with span("explain.template"):
+            return render_template()
+
+    # Only the authenticated user's tenant is billed; a tenant named in the header is not trusted
+    tenant_id = get_resolved_tenant_id() or settings.default_tenant_id
+    over_budget = llm_usage.over_budget(tenant_id)
+    if level == LEVEL_CACHED or over_budget:
+        cached = explanation_cache.get(key)
+        if cached is not None:
+            llm_usage.record_cache_hit(tenant_id, disease, audience)
+            return cached
+    if over_budget:
+        llm_usage.record_downgrade(tenant_id, disease, audience)
+        return render_template()
+
+    with span("explain.prompt", disease=disease):
+        prompt = build_prompt()
+    explanation = llm_guard.call(generate, prompt, audience, tenant_id, disease, tenant_id=tenant_id)
+    if explanation is None:
+        llm_usage.record_failure(tenant_id, disease, audience)
+        # Fallback is not cached so the next request can try the LLM again
+        return render_template()
+    explanation_cache.set(key, explanation)
+    return explanation
+
+def explain(
+    disease: str,
+    features_with_shap: list[dict],
+    prediction: int,
+    confidence: float,
+    audience: str = "doctor",
+    level: int = LEVEL_TEMPLATE,
+    model_version: Optional[str] = None,
+) -> str:
+    """
+    Build the explanation for a prediction at the requested level
+    """
+    return _tiered(
+        disease, audience, level,
+        _cache_key(disease, features_with_shap, prediction, confidence, audience, model_version),
+        lambda: PROMPT_BUILDERS[disease](
+            features_with_shap=features_with_shap,
+            prediction=prediction,
+            confidence=confidence,
+            audience=audience
+        ),
+        lambda: render_explanation(disease, features_with_shap, prediction, confidence, audience),
+    )
+
+def explain_panel(results: dict[str, dict], audience: str = "doctor", level: int = LEVEL_TEMPLATE) -> str:
+    """
+    One explanation for several diseases scored on the same patient; `results`
+    maps each disease to its prediction result (prediction, confidence,
+    shapley and model_version). Uses a single LLM call for the whole panel.
+    """
+    key = ("panel",) + tuple(
+        _cache_key(disease, result["shapley"], result["prediction"], result["confidence"],
+                   audience, result.get("model_version"))
+        for disease, result in results.items()
+    )
+    return _tiered(
+        PANEL, audience, level, key,
+        lambda: build_panel_prompt(results, audience),
+        lambda: render_panel_explanation(results, audience),
+    )
@@ -0,0 +1,54 @@
+# app/ml/fake_llm.py
+"""
+Local stand-in for the Gemini backend with injectable latency and failures.
+Enable with LLM_BACKEND=fake to exercise rate limiting, timeouts and the
+circuit breaker without network access; tests drive FakeLLM directly.
+"""
+import random
+import threading
+import time
+from typing import Optional
+from config.settings import settings
+from .usage import Completion
+
+class FakeLLMError(RuntimeError):
+    pass
+
+class FakeLLM:
+    """
+    Answers after `latency_ms` (+/- `jitter` of it) and fails a
+    `failure_rate` fraction of calls, after failing the first `fail_first`.
+    Unset latency and failure rate follow the fake_llm_* settings.
+    """
+
+    def __init__(
+        self,
+        latency_ms: Optional[float] = None,
+        failure_rate: Optional[float] = None,
+        fail_first: int = 0,
+        jitter: float = 0.5,
+    ):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, audience: str) -> Completion:
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        latency_ms = settings.fake_llm_latency_ms if self.latency_ms is None else self.latency_ms
+        failure_rate = settings.fake_llm_failure_rate if self.failure_rate is None else self.failure_rate
+        time.sleep(latency_ms / 1000 * random.uniform(1 - self.jitter, 1 + self.jitter))
+        if call <= self.fail_first or random.random() < failure_rate:
+            raise FakeLLMError("Injected LLM failure")
+        text = f"[fake-llm:{audience}] {prompt[:200]}"
+        # Roughly four characters per token, like Gemini on English text
+        return Completion(text, prompt_tokens=len(prompt) // 4, output_tokens=len(text) // 4)
+
+fake_llm = FakeLLM()
+
+def generate(prompt: str, audience: str) -> Completion:
+    return fake_llm.generate(prompt, audience)
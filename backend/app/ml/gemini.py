@@ -3,6 +3,7 @@ from google import genai
 from google.genai import types
 from config.settings import settings
 import numpy as np
+from .usage import Completion
 
 if settings.GEMINI_API_KEY is None:
     raise ValueError("Please set the GEMINI_API_KEY environment variable")
@@ -44,6 +45,11 @@ FOR_PATIENT=(
     "Add disclaimer: 'This is a machine-generated response based on data and should not replace professional medical advice.'"
 )
 
+PANEL_LABELS = {
+    "diabetes": {0: "Non-Diabetic", 1: "Pre-Diabetic", 2: "Diabetic"},
+    "cardiovascular": {0: "Low risk of cardiovascular disease", 1: "High risk of cardiovascular disease"},
+}
+
 def build_diabetes_prompt(features_with_shap: list[dict], prediction: int, confidence: float, audience: str):
     sorted_features = sorted(features_with_shap, key=lambda x: abs(x['shap_value']), reverse=True)
     # Limit to top 5 features
@@ -120,7 +126,45 @@ def build_cardio_prompt(features_with_shap: list[dict], prediction: int, confide
 
     return prompt.strip()
 
-def generate(prompt, audience):
+def build_panel_prompt(results: dict[str, dict], audience: str):
+    """One prompt covering every disease of a risk panel, so the LLM is called once"""
+    sections = []
+    for disease, result in results.items():
+        sorted_features = sorted(result["shapley"], key=lambda x: abs(x['shap_value']), reverse=True)[:5]
+        feature_explanations = "\n".join([
+            f"- **{item['feature']}** (value: {item['value']}): SHAP = {item['shap_value']:.3f}"
+            for item in sorted_features
+        ])
+        label = PANEL_LABELS[disease][result["prediction"]]
+        sections.append(f"{label} ({result['confidence']:.1%} confidence).\nSHAP Feature Contributions:\n{feature_explanations}")
+    predictions = "\n\n".join(sections)
+
+    if audience == "doctor":
+        prompt = f"""
+Combined risk panel for one patient.
+
+{predictions}
+
+Provide one precise clinical interpretation covering all predictions. Discuss
+features shared between the models (e.g. age, BMI, lipids) once, and point
+out how the risks interact.
+"""
+    elif audience == "patient":
+        prompt = f"""
+Based on your health data, the model estimated several risks at once:
+
+{predictions}
+
+Please explain in one answer what these results mean together, explaining
+factors that affect more than one risk only once, defining medical terms in
+simple language, and offer practical suggestions for improvement.
+"""
+    else:
+        raise ValueError("Audience must be 'doctor' or 'patient'.")
+
+    return prompt.strip()
+
+def generate(prompt, audience) -> Completion:
     contents = [
         types.Content(
             role="user",
@@ -142,4 +186,9 @@ def generate(prompt, audience):
         contents=contents,
         config=generate_content_config,
     )
-    return answer.text
\ No newline at end of file
+    usage = answer.usage_metadata
+    return Completion(
+        text=answer.text,
+        prompt_tokens=(usage.prompt_token_count or 0) if usage else 0,
+        output_tokens=(usage.candidates_token_count or 0) if usage else 0,
+    )
\ No newline at end of file
@@ -0,0 +1,232 @@
+# app/ml/guard.py
+"""
+Admission control and circuit breaking around LLM explanation calls.
+
+Callers get None back whenever the LLM should not or could not be used
+(rate limited, circuit open, too many calls in flight, timeout or error)
+and are expected to fall back to a local explanation. Failed calls are
+retried within the same timeout while the retry budget allows it.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+from config.settings import settings
+from hospital.context import get_resolved_tenant_id
+from utils.cache import TTLCache
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def refund(self, tokens: float = 1.0) -> None:
+        """Return tokens taken for a call that was rejected elsewhere"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of calls: every call deposits `ratio` tokens
+    (at most `capacity` are kept) and every retry spends one, so a failing
+    backend sees at most (1 + ratio) times the normal traffic.
+    """
+
+    def __init__(self, ratio: float, capacity: float):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures (calls slower than the
+    latency SLO count as failures). After `open_seconds` it lets up to
+    `half_open_probes` calls through; a successful probe closes the circuit,
+    a failed one opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, latency_slo: float, open_seconds: float, half_open_probes: int):
+        self.failure_threshold = failure_threshold
+        self.latency_slo = latency_slo
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self.probes_in_flight = 0
+            if self.state == self.HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    return False
+                self.probes_in_flight += 1
+            return True
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot for a call that never reached the backend"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.probes_in_flight = max(self.probes_in_flight - 1, 0)
+
+    def record(self, success: bool, latency: float = 0.0) -> None:
+        success = success and latency <= self.latency_slo
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.probes_in_flight = max(self.probes_in_flight - 1, 0)
+            if success:
+                self.consecutive_failures = 0
+                self.state = self.CLOSED
+                return
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class LLMGuard:
+    def __init__(self):
+        self.global_bucket = TokenBucket(settings.llm_global_rate_per_minute / 60, settings.llm_global_burst)
+        tenant_rate = settings.llm_tenant_rate_per_minute / 60
+        self.tenant_buckets = TTLCache(
+            maxsize=settings.llm_tenant_buckets,
+            # Time for an empty bucket to fill up, after which a new one is the same
+            ttl=settings.llm_tenant_burst / tenant_rate if tenant_rate > 0 else float("inf"),
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.llm_breaker_failure_threshold,
+            latency_slo=settings.llm_breaker_latency_slo_seconds,
+            open_seconds=settings.llm_breaker_open_seconds,
+            half_open_probes=settings.llm_breaker_half_open_probes,
+        )
+        self.retry_budget = RetryBudget(settings.llm_retry_budget_ratio, settings.llm_retry_budget_capacity)
+        self.executor = ThreadPoolExecutor(max_workers=settings.llm_max_concurrency, thread_name_prefix="llm")
+        self.in_flight = threading.BoundedSemaphore(settings.llm_max_concurrency)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "rate_limited": 0, "circuit_open": 0, "saturated": 0,
+                         "timeouts": 0, "errors": 0, "slow": 0, "retries": 0, "retry_budget_exhausted": 0}
+
+    def _tenant_bucket(self, tenant_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self.tenant_buckets.get(tenant_id)
+            if bucket is None:
+                bucket = TokenBucket(settings.llm_tenant_rate_per_minute / 60, settings.llm_tenant_burst)
+            # Re-set on every use, so only idle buckets expire
+            self.tenant_buckets.set(tenant_id, bucket)
+        return bucket
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+    def call(self, fn: Callable[..., str], *args, tenant_id: Optional[str] = None) -> Optional[str]:
+        """
+        Run an LLM call under rate limits, a concurrency cap, a timeout and the
+        circuit breaker, retrying errors within the timeout while the retry
+        budget allows. Returns None when the caller should use its fallback.
+        """
+        tenant_id = tenant_id or get_resolved_tenant_id() or settings.default_tenant_id
+        tenant_bucket = self._tenant_bucket(tenant_id)
+        if not tenant_bucket.try_acquire():
+            self._count("rate_limited")
+            return None
+        if not self.global_bucket.try_acquire():
+            # The tenant didn't get its call, so it keeps its token
+            tenant_bucket.refund()
+            self._count("rate_limited")
+            return None
+        self.retry_budget.deposit()
+        deadline = time.monotonic() + settings.llm_timeout_seconds
+        for attempt in range(settings.llm_max_retries + 1):
+            if attempt:
+                if time.monotonic() >= deadline:
+                    return None
+                if not self.retry_budget.try_withdraw():
+                    self._count("retry_budget_exhausted")
+                    return None
+                self._count("retries")
+            result, retry = self._attempt(fn, args, deadline)
+            if not retry:
+                return result
+        return None
+
+    def _attempt(self, fn: Callable[..., str], args: tuple, deadline: float) -> tuple[Optional[str], bool]:
+        """One call to the LLM: its result, and whether it failed in a way worth retrying"""
+        if not self.breaker.allow():
+            self._count("circuit_open")
+            return None, False
+        # Timed-out calls keep their thread until the LLM answers, so cap them too
+        if not self.in_flight.acquire(blocking=False):
+            self.breaker.release_probe()
+            self._count("saturated")
+            return None, False
+
+        self._count("calls")
+        start = time.monotonic()
+        # Run in a copy of the caller's context, so spans and the tenant follow the call
+        future = self.executor.submit(contextvars.copy_context().run, fn, *args)
+        future.add_done_callback(lambda _: self.in_flight.release())
+        try:
+            result = future.result(timeout=max(deadline - start, 0))
+        except FutureTimeoutError:
+            self._count("timeouts")
+            self.breaker.record(False)
+            return None, False
+        except Exception as e:
+            print(f"LLM call failed: {e}")
+            self._count("errors")
+            self.breaker.record(False)
+            return None, True
+
+        latency = time.monotonic() - start
+        if latency > settings.llm_breaker_latency_slo_seconds:
+            self._count("slow")
+        self.breaker.record(True, latency)
+        return result, False
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "retry_budget": round(self.retry_budget.tokens, 2),
+            "tenant_buckets": len(self.tenant_buckets),
+            "counters": dict(self.counters),
+        }
+
+llm_guard = LLMGuard()
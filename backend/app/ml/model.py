@@ -7,10 +7,26 @@ from sklearn.preprocessing import StandardScaler
 import joblib
 import os
 import shap
-from .gemini import generate, build_diabetes_prompt, build_cardio_prompt
+from .explanations import explain
+from tracing.spans import span
 from sklearn.pipeline import Pipeline
+from typing import Optional
 
 class DiseasePredictor(ABC):
+    # Artifact version from the model manifest, reported on every prediction
+    version: Optional[str] = None
+    # Representative input used to warm up a freshly loaded model
+    WARMUP_SAMPLE: dict = {}
+
+    def warm_up(self) -> None:
+        """Run one prediction so lazy initialisation happens before serving traffic"""
+        self.predict_batch(pd.DataFrame([self.WARMUP_SAMPLE]))
+
+    def set_threads(self, nthread: int) -> None:
+        """Cap the OpenMP threads XGBoost uses for predictions and SHAP contributions"""
+        self.model.set_params(n_jobs=nthread)
+        self.model.get_booster().set_param({"nthread": nthread})
+
     @abstractmethod
     def preprocess(self, data: dict) -> any:
         pass
@@ -24,10 +40,14 @@ class DiseasePredictor(ABC):
         pass
 
 class DiabetesPredictor(DiseasePredictor):
-    def __init__(self, model_path: str, scaler_path: str = None):
+    WARMUP_SAMPLE = {'AGE': 50, 'Urea': 4.7, 'Cr': 46, 'HbA1c': 4.9, 'Chol': 4.2,
+                     'TG': 0.9, 'HDL': 2.4, 'LDL': 1.4, 'VLDL': 0.5, 'BMI': 24.0}
+
+    def __init__(self, model_path: str, scaler_path: str = None, version: Optional[str] = None):
         if not os.path.exists(model_path):
             raise ValueError(f"Model path {model_path} does not exist.")
             
+        self.version = version
         self.model = xgb.XGBClassifier()
         self.features = ['AGE', 'Urea', 'Cr', 'HbA1c', 'Chol', 'TG', 'HDL', 'LDL', 'VLDL', 'BMI']
         self.scaler = StandardScaler()
@@ -41,17 +61,38 @@ class DiabetesPredictor(DiseasePredictor):
         df = df[self.features]
         return df.values.flatten(), df
 
-    def predict(self, data: dict, audience: str = "doctor") -> dict:
-        _, df = self.preprocess(data)
+    def predict_batch(self, df: pd.DataFrame, with_shap: bool = True) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        """Score many rows at once, returning class probabilities and raw SHAP values"""
+        df = df[self.features]
         
         # Apply scaling
-        features_scaled = self.scaler.transform(df)
+        with span("model.preprocess", rows=len(df)):
+            features_scaled = self.scaler.transform(df)
         
         # Get model predictions
-        preds = self.model.predict_proba(features_scaled).reshape(1, -1)[0]
+        with span("model.predict_proba", rows=len(df)):
+            preds = self.model.predict_proba(features_scaled)
         
         # Get SHAP values
-        shap_values = self.explainer.shap_values(df)
+        shap_values = None
+        if with_shap:
+            with span("model.shap", rows=len(df)):
+                shap_values = self.explainer.shap_values(df)
+        return preds, shap_values
+
+    def select_shap(self, shap_values: np.ndarray, predictions: np.ndarray) -> np.ndarray:
+        """Pick each row's SHAP values for its predicted class, shape (rows, features)"""
+        return shap_values[np.arange(len(predictions)), :, predictions]
+
+    @property
+    def shap_feature_names(self) -> list[str]:
+        return self.features
+
+    def predict(self, data: dict, audience: str = "doctor", level: int = 0) -> dict:
+        _, df = self.preprocess(data)
+        
+        preds, shap_values = self.predict_batch(df)
+        preds = preds[0]
         
         # Get original feature values
         original_features = df.iloc[0].to_dict()
@@ -62,18 +103,19 @@ class DiabetesPredictor(DiseasePredictor):
         # Add SHAP explanation
         explanations = self._format_shap(shap_values, original_features, _class=response["prediction"])
         response["shapley"] = explanations
+        response["model_version"] = self.version
         
-        # Generate prompt and explanation
-        prompt = build_diabetes_prompt(
+        # Add explanation at the requested level (0 = local template, no LLM call)
+        response["explanation"] = explain(
+            "diabetes",
             features_with_shap=explanations,
             prediction=response["prediction"],
             confidence=response["confidence"],
-            audience=audience
+            audience=audience,
+            level=level,
+            model_version=self.version,
         )
         
-        # Add generated prompt and explanation to response
-        response["explanation"] = generate(prompt, audience)
-        
         return response
 
     def postprocess(self, preds: np.ndarray) -> dict:
@@ -112,10 +154,20 @@ class DiabetesPredictor(DiseasePredictor):
         self.explainer = shap.TreeExplainer(self.model)
 
 class CardioPredictor(DiseasePredictor):
-    def __init__(self, model_path: str):
+    WARMUP_SAMPLE = {
+        'age': 56, 'gender': 'Male', 'blood_pressure': 153.0, 'cholesterol_level': 155.0,
+        'exercise_habits': 'High', 'smoking': 'Yes', 'family_heart_disease': 'Yes', 'diabetes': 'No',
+        'bmi': 25.0, 'high_blood_pressure': 'Yes', 'low_hdl_cholesterol': 'Yes', 'high_ldl_cholesterol': 'No',
+        'alcohol_consumption': 'High', 'stress_level': 'Medium', 'sleep_hours': 7.6,
+        'sugar_consumption': 'Medium', 'triglyceride_level': 342.0, 'fasting_blood_sugar': 120.0,
+        'crp_level': 13.0, 'homocysteine_level': 12.4
+    }
+
+    def __init__(self, model_path: str, version: Optional[str] = None):
         if not os.path.exists(model_path):
             raise ValueError(f"Model path {model_path} does not exist.")
         
+        self.version = version
         self.pipeline: Pipeline = joblib.load(model_path)
         self.model: xgb.XGBClassifier = self.pipeline.named_steps["model"]
         self.preprocessor = self.pipeline.named_steps["preprocessor"]
@@ -135,15 +187,37 @@ class CardioPredictor(DiseasePredictor):
         df = df[self.FEATURES]
         return df.values.flatten(), df
 
-    def predict(self, data: dict, audience: str = "doctor") -> dict:
-        _, df = self.preprocess(data)
+    def predict_batch(self, df: pd.DataFrame, with_shap: bool = True) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        """Score many rows at once, returning class probabilities and raw SHAP values"""
+        df = df[self.FEATURES]
         
         # Transform input for model prediction
-        X_transformed = self.preprocessor.transform(df)
-        preds = self.model.predict_proba(X_transformed).reshape(1, -1)[0]
+        with span("model.preprocess", rows=len(df)):
+            X_transformed = self.preprocessor.transform(df)
+        with span("model.predict_proba", rows=len(df)):
+            preds = self.model.predict_proba(X_transformed)
         
         # SHAP values for transformed input
-        shap_values = self.explainer.shap_values(X_transformed)
+        shap_values = None
+        if with_shap:
+            with span("model.shap", rows=len(df)):
+                shap_values = self.explainer.shap_values(X_transformed)
+        return preds, shap_values
+
+    def select_shap(self, shap_values: np.ndarray, predictions: np.ndarray) -> np.ndarray:
+        """SHAP values of the binary model are already one row per sample, shape (rows, features)"""
+        return shap_values
+
+    @property
+    def shap_feature_names(self) -> list[str]:
+        # SHAP is computed on the transformed (one-hot/ordinal encoded) columns
+        return list(self.preprocessor.get_feature_names_out())
+
+    def predict(self, data: dict, audience: str = "doctor", level: int = 0) -> dict:
+        _, df = self.preprocess(data)
+        
+        preds, shap_values = self.predict_batch(df)
+        preds = preds[0]
         
         # Get original feature values
         original_features = df.iloc[0].to_dict()
@@ -154,17 +228,18 @@ class CardioPredictor(DiseasePredictor):
         # Add SHAP explanation
         explanations = self._format_shap(shap_values, original_features, _class=response["prediction"])
         response["shapley"] = explanations
+        response["model_version"] = self.version
         
-        # Generate prompt and explanation
-        prompt = build_cardio_prompt(
+        # Add explanation at the requested level (0 = local template, no LLM call)
+        response["explanation"] = explain(
+            "cardiovascular",
             features_with_shap=explanations,
             prediction=response["prediction"],
             confidence=response["confidence"],
-            audience=audience
+            audience=audience,
+            level=level,
+            model_version=self.version,
         )
-        
-        # Add generated prompt and explanation to response
-        response["explanation"] = generate(prompt, audience)
 
         return response
 
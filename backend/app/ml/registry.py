@@ -0,0 +1,202 @@
+# app/ml/registry.py
+import asyncio
+import json
+import os
+import threading
+from typing import Optional
+from config.settings import settings
+from .model import DiabetesPredictor, CardioPredictor, DiseasePredictor
+from .threads import limit_native_threads, thread_plan
+
+SUPPORTED_DISEASES = ("diabetes", "cardiovascular")
+
+# Used when no manifest is present, matching the historical artifact names
+DEFAULT_MANIFEST = {
+    "diabetes": {"version": "unversioned", "model": "diabetes_model.json", "scaler": "diabetes.scaler.pkl"},
+    "cardiovascular": {"version": "unversioned", "model": "heart_model.pkl"},
+}
+
+def manifest_path() -> str:
+    return os.path.join(settings.model_dir, "manifest.json")
+
+def forced_reload_path() -> str:
+    """Written by forced reloads, so every worker reloads even at unchanged versions"""
+    return os.path.join(settings.model_dir, "reload.json")
+
+def read_forced_reload() -> Optional[dict]:
+    """The last forced reload: {"nonce": "...", "diseases": [...] or None for all}"""
+    try:
+        with open(forced_reload_path()) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def read_manifest() -> dict:
+    """
+    Read the artifact manifest, mapping each disease to its version and files:
+    {"diabetes": {"version": "2", "model": "diabetes_model.v2.json", "scaler": "..."}}
+    """
+    path = manifest_path()
+    if not os.path.exists(path):
+        return DEFAULT_MANIFEST
+    with open(path) as f:
+        return json.load(f)
+
+def load_predictor(disease: str, entry: dict) -> DiseasePredictor:
+    def artifact(key: str) -> Optional[str]:
+        return os.path.join(settings.model_dir, entry[key]) if entry.get(key) else None
+
+    version = str(entry.get("version", "unversioned"))
+    if disease == "diabetes":
+        predictor = DiabetesPredictor(
+            model_path=artifact("model"),
+            scaler_path=artifact("scaler"),
+            version=version,
+        )
+    elif disease == "cardiovascular":
+        predictor = CardioPredictor(model_path=artifact("model"), version=version)
+    else:
+        raise ValueError("Unsupported disease type")
+    # Stay within this worker's share of the CPUs (see ml/threads.py)
+    predictor.set_threads(thread_plan().native_threads)
+    limit_native_threads()
+    return predictor
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded predictors, so models are loaded once per
+    process instead of once per request.
+
+    Reloads build and warm the new predictor off to the side, then replace the
+    registry entry in a single assignment. Requests that already hold the old
+    predictor finish on it; new requests get the new version.
+    """
+
+    def __init__(self):
+        self._predictors: dict[str, DiseasePredictor] = {}
+        self._lock = threading.Lock()
+        self._manifest_mtime: Optional[float] = None
+        self._forced_nonce: Optional[str] = None
+
+    def get(self, disease: str) -> DiseasePredictor:
+        disease = disease.lower()
+        predictor = self._predictors.get(disease)
+        if predictor is None:
+            with self._lock:
+                predictor = self._predictors.get(disease)
+                if predictor is None:
+                    if disease not in SUPPORTED_DISEASES:
+                        raise ValueError("Unsupported disease type")
+                    predictor = load_predictor(disease, read_manifest()[disease])
+                    self._predictors[disease] = predictor
+        return predictor
+
+    def preload(self, diseases: Optional[list[str]] = None) -> dict[str, str]:
+        """
+        Load every model up front (e.g. in a parent process before forking workers).
+        Returns the load status per disease; failures are reported, not raised.
+        """
+        self._manifest_mtime = self._current_mtime()
+        self._forced_nonce = self._current_nonce()
+        status = {}
+        for disease in diseases or SUPPORTED_DISEASES:
+            try:
+                self.get(disease).warm_up()
+                status[disease] = "loaded"
+            except Exception as e:
+                status[disease] = f"error: {e}"
+        return status
+
+    def loaded(self) -> dict[str, DiseasePredictor]:
+        return dict(self._predictors)
+
+    def versions(self) -> dict[str, Optional[str]]:
+        return {disease: predictor.version for disease, predictor in self._predictors.items()}
+
+    def reload(self, diseases: Optional[list[str]] = None, force: bool = False) -> dict[str, str]:
+        """
+        Load, warm and swap in the manifest's current artifacts. Blocking; run it
+        in a worker thread. Diseases whose version is unchanged are skipped unless forced.
+        """
+        self._manifest_mtime = self._current_mtime()
+        manifest = read_manifest()
+        status = {}
+        for disease in diseases or SUPPORTED_DISEASES:
+            entry = manifest.get(disease)
+            if entry is None:
+                status[disease] = "error: not in manifest"
+                continue
+            current = self._predictors.get(disease)
+            if current is not None and current.version == str(entry.get("version")) and not force:
+                status[disease] = f"unchanged ({current.version})"
+                continue
+            try:
+                predictor = load_predictor(disease, entry)
+                predictor.warm_up()
+            except Exception as e:
+                # Keep serving the old version if the new one is broken
+                status[disease] = f"error: {e}"
+                continue
+            with self._lock:
+                self._predictors[disease] = predictor
+            status[disease] = f"loaded ({predictor.version})"
+        return status
+
+    def force_reload(self, diseases: Optional[list[str]] = None) -> dict[str, str]:
+        """
+        Reload even at unchanged versions, here and, through the forced reload
+        file, in every other worker process. Blocking; run it in a worker thread.
+        """
+        status = self.reload(diseases, force=True)
+        nonce = os.urandom(8).hex()
+        self._forced_nonce = nonce
+        path = forced_reload_path()
+        try:
+            with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+                json.dump({"nonce": nonce, "diseases": diseases}, f)
+            os.replace(f"{path}.{os.getpid()}.tmp", path)
+        except OSError as e:
+            print(f"Could not publish the forced reload to other workers: {e}")
+        return status
+
+    def forced_reload_requested(self) -> Optional[dict]:
+        """A forced reload published by another worker since we last looked"""
+        forced = read_forced_reload()
+        if forced is None or forced.get("nonce") == self._forced_nonce:
+            return None
+        self._forced_nonce = forced.get("nonce")
+        return forced
+
+    def manifest_changed(self) -> bool:
+        return self._current_mtime() != self._manifest_mtime
+
+    @staticmethod
+    def _current_nonce() -> Optional[str]:
+        return (read_forced_reload() or {}).get("nonce")
+
+    @staticmethod
+    def _current_mtime() -> Optional[float]:
+        try:
+            return os.stat(manifest_path()).st_mtime
+        except FileNotFoundError:
+            return None
+
+registry = ModelRegistry()
+
+async def watch_manifest(interval: float) -> None:
+    """
+    Poll the manifest and hot-reload models when it changes. Each worker process
+    runs its own watcher, so a manifest update or forced reload reaches every worker.
+    """
+    if registry._manifest_mtime is None:
+        registry._manifest_mtime = registry._current_mtime()
+        registry._forced_nonce = registry._current_nonce()
+    while True:
+        await asyncio.sleep(interval)
+        forced = registry.forced_reload_requested()
+        if forced is not None:
+            status = await asyncio.to_thread(registry.reload, forced.get("diseases"), True)
+            print(f"Forced model reload requested, reload: {status}")
+        elif registry.manifest_changed():
+            status = await asyncio.to_thread(registry.reload)
+            print(f"Model manifest changed, reload: {status}")
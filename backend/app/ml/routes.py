@@ -0,0 +1,111 @@
+# app/ml/routes.py
+import asyncio
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from auth.services import require_admin
+from db.mongo import get_database
+from .registry import registry, read_manifest, manifest_path, SUPPORTED_DISEASES
+from .guard import llm_guard
+from .explanations import explanation_cache
+from .scheduler import inference_scheduler
+from .drift import drift_monitor
+from .usage import llm_usage
+from .threads import native_pools, thread_plan
+
+router = APIRouter(prefix="/admin/models", tags=["Admin"], dependencies=[Depends(require_admin)])
+llm_router = APIRouter(prefix="/admin/llm", tags=["Admin"], dependencies=[Depends(require_admin)])
+scheduler_router = APIRouter(prefix="/admin/scheduler", tags=["Admin"], dependencies=[Depends(require_admin)])
+threads_router = APIRouter(prefix="/admin/threads", tags=["Admin"], dependencies=[Depends(require_admin)])
+drift_router = APIRouter(prefix="/admin/drift", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/")
+async def get_model_versions():
+    """
+    Versions currently served by this worker and the versions in the manifest
+    """
+    return {"loaded": registry.versions(), "manifest": read_manifest()}
+
+@router.post("/reload")
+async def reload_models(disease: Optional[str] = None, force: bool = False):
+    """
+    Load, warm and atomically swap in the manifest's artifacts without dropping in-flight requests.
+    `force` reloads unchanged versions too, in every worker process.
+    """
+    if disease and disease not in SUPPORTED_DISEASES:
+        raise HTTPException(status_code=400, detail="Unsupported disease type")
+    diseases = [disease] if disease else None
+    if force:
+        return await asyncio.to_thread(registry.force_reload, diseases)
+    status = await asyncio.to_thread(registry.reload, diseases)
+
+    # Touch the manifest so the watchers in the other worker processes pick up the change too
+    if os.path.exists(manifest_path()):
+        os.utime(manifest_path())
+    return status
+
+@llm_router.get("/")
+async def get_llm_status():
+    """
+    Circuit breaker state, admission counters and explanation cache statistics
+    """
+    return {**llm_guard.stats(), "cache": explanation_cache.stats(), "usage": llm_usage.stats()}
+
+@llm_router.get("/usage")
+async def get_llm_usage(
+    day: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    tenant_id: Optional[str] = None,
+    db=Depends(get_database),
+):
+    """
+    LLM calls, tokens, latency, estimated cost and budget per tenant for a UTC day (default today)
+    """
+    return await llm_usage.report(db, day, tenant_id)
+
+@scheduler_router.get("/")
+async def get_scheduler_status():
+    """
+    Per-tenant queue depth, wait times and throughput of the inference scheduler, by priority class
+    """
+    return inference_scheduler.stats()
+
+@threads_router.get("/")
+async def get_thread_plan():
+    """
+    CPU budget of this worker: planned worker and thread counts, the native
+    thread pools actually loaded, and each model's XGBoost nthread
+    """
+    return {
+        "plan": thread_plan().as_dict(),
+        "scheduler_threads": inference_scheduler.workers,
+        "native_pools": native_pools(),
+        "models": {
+            disease: predictor.model.get_params().get("n_jobs")
+            for disease, predictor in registry.loaded().items()
+        },
+    }
+
+@drift_router.get("/")
+async def get_drift(disease: Optional[str] = None, tenant_id: Optional[str] = None):
+    """
+    Per-tenant drift of recent model inputs against the training data (PSI and KS per feature)
+    """
+    if disease and disease not in SUPPORTED_DISEASES:
+        raise HTTPException(status_code=400, detail="Unsupported disease type")
+    return drift_monitor.scores(disease, tenant_id)
+
+@drift_router.get("/metrics", response_class=PlainTextResponse)
+async def get_drift_metrics():
+    """
+    Drift scores in the Prometheus text format, for scraping
+    """
+    return drift_monitor.metrics()
+
+@drift_router.post("/reset")
+async def reset_drift():
+    """
+    Drop the counted inputs, e.g. after deploying a retrained model
+    """
+    drift_monitor.reset()
+    return {"reset": True}
@@ -0,0 +1,244 @@
+# app/ml/scheduler.py
+"""
+Weighted fair scheduling of inference work across tenants.
+
+Work is queued per tenant within two priority classes. Interactive requests
+(a doctor or patient waiting on a prediction) are served before bulk
+screening work, except that bulk gets every `scheduler_bulk_every`-th slot
+while both are waiting so it can't starve. Within a class, tenants are served
+by stride scheduling: each job advances its tenant's pass by cost / weight
+and the tenant with the lowest pass goes next, so one tenant's large batch
+only delays the others by its fair share.
+
+Jobs are queued under the tenant resolved from the authenticated user; a
+tenant only named in the X-Tenant-ID header shares the default tenant's
+queue, so rotating header values can't buy extra shares. Queues of idle
+tenants are dropped once they owe no time.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+import numpy as np
+from config.settings import settings
+from hospital.context import get_resolved_tenant_id
+from utils.background import BackgroundThreads
+from .threads import limit_native_threads, thread_plan
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+class SchedulerFull(Exception):
+    """The tenant's queue for this priority class is at capacity"""
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "context", "future", "tenant_id", "priority", "cost", "enqueued", "queue")
+
+    def __init__(self, fn, args, kwargs, tenant_id, priority, cost):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # Run in the submitter's context so the tenant (and anything else in
+        # contextvars) is visible to the inference code
+        self.context = contextvars.copy_context()
+        self.future = Future()
+        self.tenant_id = tenant_id
+        self.priority = priority
+        self.cost = cost
+        self.enqueued = time.monotonic()
+        self.queue: Optional["_TenantQueue"] = None
+
+# Counters kept per tenant queue, and folded into the totals when an idle queue is dropped
+COUNTERS = ("submitted", "completed", "failed", "rejected")
+
+class _TenantQueue:
+    def __init__(self, weight: float):
+        self.jobs: deque[_Job] = deque()
+        self.weight = weight
+        self.pass_value = 0.0
+        self.running = 0
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=1024)
+        self.run_seconds = 0.0
+
+    def stats(self) -> dict:
+        waits = np.fromiter(self.waits, dtype=float) * 1000 if self.waits else None
+        finished = self.completed + self.failed
+        return {
+            "depth": len(self.jobs),
+            "weight": self.weight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_ms_p50": round(float(np.percentile(waits, 50)), 2) if waits is not None else None,
+            "wait_ms_p99": round(float(np.percentile(waits, 99)), 2) if waits is not None else None,
+            "wait_ms_max": round(float(waits.max()), 2) if waits is not None else None,
+            "avg_run_ms": round(self.run_seconds / finished * 1000, 2) if finished else None,
+        }
+
+class FairScheduler:
+    def __init__(
+        self,
+        workers: int,
+        max_queue_per_tenant: int,
+        bulk_every: int,
+        tenant_weights: Optional[dict[str, float]] = None,
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        self.workers = workers
+        self.initializer = initializer
+        self.max_queue_per_tenant = max_queue_per_tenant
+        self.bulk_every = max(bulk_every, 1)
+        self.tenant_weights = tenant_weights or {}
+        self._queues: dict[str, dict[str, _TenantQueue]] = {priority: {} for priority in PRIORITY_CLASSES}
+        self._virtual_time = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self._dropped = {priority: dict.fromkeys(COUNTERS, 0) for priority in PRIORITY_CLASSES}
+        self._interactive_streak = 0
+        self._cond = threading.Condition()
+        self._threads = BackgroundThreads(self._worker, "inference", workers)
+        self._busy = 0
+
+    def _queue(self, priority: str, tenant_id: str) -> _TenantQueue:
+        queues = self._queues[priority]
+        queue = queues.get(tenant_id)
+        if queue is None:
+            queue = queues[tenant_id] = _TenantQueue(float(self.tenant_weights.get(tenant_id, 1.0)))
+        return queue
+
+    def submit(
+        self,
+        fn: Callable,
+        *args,
+        tenant_id: Optional[str] = None,
+        priority: str = INTERACTIVE,
+        cost: float = 1.0,
+        **kwargs,
+    ) -> Future:
+        """
+        Queue `fn(*args, **kwargs)` for the tenant (defaults to the authenticated
+        user's tenant). `cost` is the job's share of work, e.g. the number of rows.
+        Raises SchedulerFull when the tenant's queue is at capacity.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        tenant_id = tenant_id or get_resolved_tenant_id() or settings.default_tenant_id
+        job = _Job(fn, args, kwargs, tenant_id, priority, cost)
+        with self._cond:
+            self._threads.ensure_started()
+            queue = self._queue(priority, tenant_id)
+            if len(queue.jobs) >= self.max_queue_per_tenant:
+                queue.rejected += 1
+                raise SchedulerFull(f"Inference queue full for tenant {tenant_id}")
+            if not queue.jobs:
+                # A tenant returning from idle starts at the current virtual time
+                # instead of cashing in credit for the time it was away
+                queue.pass_value = max(queue.pass_value, self._virtual_time[priority])
+            queue.jobs.append(job)
+            queue.submitted += 1
+            self._cond.notify()
+        return job.future
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Submit and await the result from async code"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _pick(self, priority: str) -> Optional[_Job]:
+        queues = self._queues[priority]
+        active = [queue for queue in queues.values() if queue.jobs]
+        for tenant_id, queue in list(queues.items()):
+            # Drop idle tenants that owe no time: on return they would start at the
+            # virtual time anyway. With nobody waiting, nobody is owed anything either.
+            if not queue.jobs and not queue.running \
+                    and (not active or queue.pass_value <= self._virtual_time[priority]):
+                self._drop(priority, tenant_id)
+        if not active:
+            return None
+        queue = min(active, key=lambda q: q.pass_value)
+        job = queue.jobs.popleft()
+        job.queue = queue
+        queue.running += 1
+        self._virtual_time[priority] = queue.pass_value
+        queue.pass_value += job.cost / queue.weight
+        return job
+
+    def _drop(self, priority: str, tenant_id: str) -> None:
+        queue = self._queues[priority].pop(tenant_id)
+        for name in COUNTERS:
+            self._dropped[priority][name] += getattr(queue, name)
+
+    def _next_job(self) -> Optional[_Job]:
+        if self._interactive_streak >= self.bulk_every - 1:
+            job = self._pick(BULK)
+            if job is not None:
+                self._interactive_streak = 0
+                return job
+        job = self._pick(INTERACTIVE)
+        if job is not None:
+            self._interactive_streak += 1
+            return job
+        self._interactive_streak = 0
+        return self._pick(BULK)
+
+    def _worker(self) -> None:
+        if self.initializer is not None:
+            try:
+                self.initializer()
+            except Exception as e:
+                print(f"Inference thread initializer failed: {e}")
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._busy += 1
+            queue = job.queue
+            try:
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                start = time.monotonic()
+                queue.waits.append(start - job.enqueued)
+                try:
+                    result = job.context.run(job.fn, *job.args, **job.kwargs)
+                except BaseException as e:
+                    queue.failed += 1
+                    job.future.set_exception(e)
+                else:
+                    queue.completed += 1
+                    job.future.set_result(result)
+                queue.run_seconds += time.monotonic() - start
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    queue.running -= 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "bulk_every": self.bulk_every,
+                # Counters of tenant queues dropped while idle
+                "dropped": {priority: dict(counters) for priority, counters in self._dropped.items()},
+                "tenants": {
+                    priority: {tenant_id: queue.stats() for tenant_id, queue in queues.items()}
+                    for priority, queues in self._queues.items()
+                },
+            }
+
+inference_scheduler = FairScheduler(
+    workers=thread_plan().inference_threads,
+    max_queue_per_tenant=settings.scheduler_max_queue_per_tenant,
+    bulk_every=settings.scheduler_bulk_every,
+    tenant_weights=settings.scheduler_tenant_weights,
+    initializer=limit_native_threads,
+)
@@ -0,0 +1,189 @@
+# app/ml/templates.py
+"""
+Level-0 explanations rendered locally from SHAP values, mirroring the
+FOR_DOCTOR / FOR_PATIENT formats used for the LLM without a network call.
+"""
+from enum import Enum
+
+# Vietnamese label, clinical note and lifestyle advice per input feature
+FEATURE_INFO = {
+    # Diabetes features
+    "AGE": ("Tuổi", "Nguy cơ rối loạn chuyển hóa glucose tăng theo tuổi.",
+            "Khám sức khỏe và xét nghiệm đường huyết định kỳ."),
+    "Urea": ("Urê máu", "Phản ánh chức năng thận, liên quan đến biến chứng thận do đái tháo đường.",
+             "Uống đủ nước, hạn chế đạm động vật quá mức."),
+    "Cr": ("Creatinine máu", "Chỉ dấu chức năng lọc cầu thận.",
+           "Theo dõi chức năng thận, tránh tự ý dùng thuốc giảm đau kéo dài."),
+    "HbA1c": ("HbA1c", "Phản ánh đường huyết trung bình 2-3 tháng, tiêu chí chẩn đoán đái tháo đường.",
+              "Giảm đường và tinh bột tinh chế, tăng rau xanh và chất xơ."),
+    "Chol": ("Cholesterol toàn phần", "Rối loạn lipid máu thường đi kèm kháng insulin.",
+             "Hạn chế mỡ động vật và đồ chiên rán."),
+    "TG": ("Triglyceride", "Triglyceride cao gợi ý kháng insulin và hội chứng chuyển hóa.",
+           "Giảm đồ ngọt, rượu bia và tinh bột tinh chế."),
+    "HDL": ("HDL-cholesterol", "HDL thấp làm tăng nguy cơ chuyển hóa và tim mạch.",
+            "Tập thể dục đều đặn, bổ sung chất béo tốt từ cá và các loại hạt."),
+    "LDL": ("LDL-cholesterol", "LDL cao làm tăng nguy cơ xơ vữa mạch máu.",
+            "Hạn chế chất béo bão hòa, tăng chất xơ hòa tan."),
+    "VLDL": ("VLDL-cholesterol", "VLDL tăng song hành với triglyceride và kháng insulin.",
+             "Giảm đồ ngọt và rượu bia."),
+    "BMI": ("Chỉ số khối cơ thể (BMI)", "Thừa cân, béo phì là yếu tố nguy cơ chính của kháng insulin.",
+            "Duy trì cân nặng hợp lý bằng chế độ ăn cân bằng và vận động 150 phút mỗi tuần."),
+    # Cardiovascular features
+    "age": ("Tuổi", "Nguy cơ bệnh tim mạch tăng theo tuổi.",
+            "Khám tim mạch định kỳ."),
+    "gender": ("Giới tính", "Nguy cơ tim mạch khác nhau giữa nam và nữ.",
+               "Theo dõi các yếu tố nguy cơ phù hợp với giới tính."),
+    "blood_pressure": ("Huyết áp tâm thu", "Tăng huyết áp là yếu tố nguy cơ hàng đầu của bệnh tim mạch.",
+                       "Giảm muối, theo dõi huyết áp tại nhà."),
+    "cholesterol_level": ("Cholesterol toàn phần", "Cholesterol cao thúc đẩy xơ vữa động mạch.",
+                          "Hạn chế mỡ động vật và đồ chiên rán."),
+    "exercise_habits": ("Mức độ vận động", "Ít vận động làm tăng nguy cơ tim mạch.",
+                        "Vận động ít nhất 30 phút mỗi ngày."),
+    "smoking": ("Hút thuốc", "Hút thuốc gây tổn thương nội mạc và tăng nguy cơ nhồi máu cơ tim.",
+                "Ngừng hút thuốc, tìm hỗ trợ cai thuốc nếu cần."),
+    "family_heart_disease": ("Tiền sử gia đình bệnh tim", "Yếu tố di truyền làm tăng nguy cơ tim mạch.",
+                             "Tầm soát tim mạch sớm và thường xuyên."),
+    "diabetes": ("Đái tháo đường", "Đái tháo đường làm tăng đáng kể nguy cơ bệnh mạch vành.",
+                 "Kiểm soát đường huyết theo chỉ định của bác sĩ."),
+    "bmi": ("Chỉ số khối cơ thể (BMI)", "Béo phì làm tăng gánh nặng cho tim.",
+            "Duy trì cân nặng hợp lý."),
+    "high_blood_pressure": ("Tiền sử tăng huyết áp", "Tăng huyết áp kéo dài gây dày thành tim và tổn thương mạch.",
+                            "Dùng thuốc hạ áp đều đặn nếu đã được kê đơn."),
+    "low_hdl_cholesterol": ("HDL thấp", "HDL thấp làm giảm khả năng bảo vệ mạch máu.",
+                            "Tập thể dục, bổ sung chất béo tốt."),
+    "high_ldl_cholesterol": ("LDL cao", "LDL cao là nguyên nhân chính của mảng xơ vữa.",
+                             "Hạn chế chất béo bão hòa, tái khám mỡ máu."),
+    "alcohol_consumption": ("Uống rượu bia", "Uống nhiều rượu bia làm tăng huyết áp và rối loạn nhịp tim.",
+                            "Hạn chế rượu bia."),
+    "stress_level": ("Mức độ căng thẳng", "Căng thẳng kéo dài làm tăng huyết áp và nhịp tim.",
+                     "Ngủ đủ giấc, thư giãn, thiền hoặc tập thở."),
+    "sleep_hours": ("Số giờ ngủ", "Ngủ quá ít hoặc quá nhiều đều liên quan đến nguy cơ tim mạch.",
+                    "Ngủ 7-8 giờ mỗi đêm."),
+    "sugar_consumption": ("Tiêu thụ đường", "Ăn nhiều đường góp phần gây béo phì và rối loạn chuyển hóa.",
+                          "Giảm đồ uống có đường và bánh kẹo."),
+    "triglyceride_level": ("Triglyceride", "Triglyceride cao làm tăng nguy cơ xơ vữa.",
+                           "Giảm đồ ngọt, rượu bia và tinh bột tinh chế."),
+    "fasting_blood_sugar": ("Đường huyết lúc đói", "Đường huyết cao làm tổn thương mạch máu.",
+                            "Kiểm soát chế độ ăn, hạn chế đường."),
+    "crp_level": ("CRP", "CRP phản ánh tình trạng viêm, liên quan đến nguy cơ biến cố tim mạch.",
+                  "Duy trì lối sống lành mạnh, điều trị các ổ viêm."),
+    "homocysteine_level": ("Homocysteine", "Homocysteine cao liên quan đến tổn thương nội mạc mạch máu.",
+                           "Bổ sung thực phẩm giàu folate và vitamin B12."),
+}
+
+DIABETES_LABELS = {
+    0: "Không mắc đái tháo đường",
+    1: "Tiền đái tháo đường",
+    2: "Đái tháo đường",
+}
+
+CARDIO_LABELS = {
+    0: "Nguy cơ bệnh tim mạch thấp",
+    1: "Nguy cơ bệnh tim mạch cao",
+}
+
+DISEASE_NAMES = {
+    "diabetes": "đái tháo đường",
+    "cardiovascular": "bệnh tim mạch",
+}
+
+DISCLAIMER = (
+    "Lưu ý: Đây là phản hồi do máy tạo ra dựa trên dữ liệu và không thay thế "
+    "cho tư vấn y khoa chuyên nghiệp."
+)
+
+def _feature_info(name: str) -> tuple[str, str, str]:
+    # Transformed names look like "num__age" or "cat__smoking_Yes"
+    base = name.split("__", 1)[-1]
+    while base and base not in FEATURE_INFO and "_" in base:
+        base = base.rsplit("_", 1)[0]
+    return FEATURE_INFO.get(base, (name, "", ""))
+
+def _format_value(value) -> str:
+    if isinstance(value, Enum):
+        return str(value.value)
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value)
+
+def prediction_label(disease: str, prediction: int) -> str:
+    labels = DIABETES_LABELS if disease == "diabetes" else CARDIO_LABELS
+    if prediction not in labels:
+        raise ValueError(f"Invalid prediction value for {disease}: {prediction}")
+    return labels[prediction]
+
+def render_feature_lines(features_with_shap: list[dict], audience: str, top_n: int = 5) -> list[str]:
+    sorted_features = sorted(features_with_shap, key=lambda x: abs(x["shap_value"]), reverse=True)[:top_n]
+    lines = []
+    for item in sorted_features:
+        label, significance, advice = _feature_info(item["feature"])
+        direction = "làm tăng" if item["shap_value"] > 0 else "làm giảm"
+        lines.append(f"- **{label}** (giá trị: {_format_value(item['value'])}): SHAP = {item['shap_value']:.3f}")
+        lines.append(f"  - Giải thích: yếu tố này {direction} khả năng của kết quả dự đoán.")
+        if significance:
+            lines.append(f"  - Ý nghĩa lâm sàng: {significance}")
+        if audience == "patient" and advice:
+            lines.append(f"  - Lời khuyên thực tế: {advice}")
+    return lines
+
+def render_explanation(disease: str, features_with_shap: list[dict], prediction: int, confidence: float, audience: str) -> str:
+    """
+    Render a Vietnamese explanation for a single disease from its SHAP list
+    """
+    if audience not in ("doctor", "patient"):
+        raise ValueError("Audience must be 'doctor' or 'patient'.")
+    label = prediction_label(disease, prediction)
+
+    if audience == "doctor":
+        lines = [f"Dự đoán: {label} (độ tin cậy {confidence:.1%}).", "", "Các yếu tố đóng góp (SHAP):"]
+    else:
+        lines = [
+            f"Dựa trên dữ liệu sức khỏe của bạn, mô hình dự đoán: **{label}** (độ tin cậy {confidence:.1%}).",
+            "",
+            "Các yếu tố ảnh hưởng nhiều nhất đến kết quả:",
+        ]
+    lines.extend(render_feature_lines(features_with_shap, audience))
+    lines.append("")
+    lines.append("Giá trị SHAP thể hiện mức đóng góp của từng yếu tố vào dự đoán của mô hình, "
+                 "không phải quan hệ nhân quả.")
+    if audience == "patient":
+        lines.append(DISCLAIMER)
+    return "\n".join(lines)
+
+def shared_risk_factors(results: dict[str, dict], top_n: int = 5) -> list[str]:
+    """Labels of features among the top contributors of every disease, e.g. age or BMI"""
+    tops = [
+        {_feature_info(item["feature"])[0]
+         for item in sorted(result["shapley"], key=lambda x: abs(x["shap_value"]), reverse=True)[:top_n]}
+        for result in results.values()
+    ]
+    return sorted(set.intersection(*tops)) if tops else []
+
+def render_panel_explanation(results: dict[str, dict], audience: str) -> str:
+    """
+    Render one Vietnamese explanation for several diseases scored on the same
+    patient; `results` maps each disease to its prediction, confidence and SHAP list
+    """
+    if audience not in ("doctor", "patient"):
+        raise ValueError("Audience must be 'doctor' or 'patient'.")
+    if audience == "doctor":
+        lines = ["Bảng nguy cơ kết hợp:"]
+    else:
+        lines = ["Dựa trên dữ liệu sức khỏe của bạn, mô hình dự đoán:"]
+    for disease, result in results.items():
+        label = prediction_label(disease, result["prediction"])
+        lines.append(f"- **{label}** (độ tin cậy {result['confidence']:.1%}).")
+    for disease, result in results.items():
+        lines.append("")
+        lines.append(f"Các yếu tố ảnh hưởng nhiều nhất đến nguy cơ {DISEASE_NAMES.get(disease, disease)}:")
+        lines.extend(render_feature_lines(result["shapley"], audience, top_n=3))
+    shared = shared_risk_factors(results)
+    if shared:
+        lines.append("")
+        lines.append(f"Yếu tố ảnh hưởng đến cả hai nguy cơ: {', '.join(shared)}.")
+    lines.append("")
+    lines.append("Giá trị SHAP thể hiện mức đóng góp của từng yếu tố vào dự đoán của mô hình, "
+                 "không phải quan hệ nhân quả.")
+    if audience == "patient":
+        lines.append(DISCLAIMER)
+    return "\n".join(lines)
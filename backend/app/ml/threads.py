@@ -0,0 +1,102 @@
+# app/ml/threads.py
+"""
+CPU thread budget for inference.
+
+Every layer brings its own threads: server worker processes, the inference
+scheduler's threads in each of them, and inside every prediction the OpenMP
+pool of XGBoost (also used for SHAP contributions) and the BLAS pool of
+NumPy. Left at their defaults, each native pool sizes itself to the whole
+machine, so N workers x M scheduler threads x all cores threads compete for
+the cores the container may actually use and tail latency suffers.
+
+The plan divides the available CPUs (affinity and cgroup quota) between the
+workers, then between each worker's scheduler threads, and gives every
+inference job what is left as its native thread limit. serve.py configures it
+for the planned worker count before loading models, and ml/bulk.py for its
+scoring processes; single-process runs use `server_workers` (or one worker).
+Explicit settings always win.
+"""
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional
+from threadpoolctl import threadpool_info, threadpool_limits
+from config.settings import settings
+from utils.system import available_cpus, cgroup_cpu_quota
+
+# Read by OpenMP and BLAS libraries when they load (here or in child processes)
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS")
+
+@dataclass(frozen=True)
+class ThreadPlan:
+    cpus: int
+    cgroup_quota: Optional[float]
+    workers: int
+    cpus_per_worker: int
+    # Scheduler threads running inference in each worker
+    inference_threads: int
+    # XGBoost nthread and OpenMP/BLAS limit of each inference job
+    native_threads: int
+
+    @property
+    def busy_threads(self) -> int:
+        """Threads that can be running native code at once across all workers"""
+        return self.workers * self.inference_threads * self.native_threads
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "busy_threads": self.busy_threads,
+                "oversubscription": round(self.busy_threads / self.cpus, 2)}
+
+def plan_threads(
+    workers: int,
+    cpus: Optional[int] = None,
+    inference_threads: Optional[int] = None,
+    native_threads: Optional[int] = None,
+) -> ThreadPlan:
+    """
+    Split `cpus` (default: what this process may use) between `workers`
+    processes; unset thread counts come from settings, then from the budget
+    """
+    cpus = cpus or available_cpus()
+    workers = max(workers, 1)
+    per_worker = max(cpus // workers, 1)
+    inference = inference_threads or settings.inference_workers or min(per_worker, 4)
+    native = native_threads or settings.native_threads or max(per_worker // inference, 1)
+    return ThreadPlan(
+        cpus=cpus,
+        cgroup_quota=cgroup_cpu_quota(),
+        workers=workers,
+        cpus_per_worker=per_worker,
+        inference_threads=inference,
+        native_threads=native,
+    )
+
+_plan = plan_threads(settings.server_workers or 1)
+
+def thread_plan() -> ThreadPlan:
+    return _plan
+
+def configure_threads(workers: int, inference_threads: Optional[int] = None) -> ThreadPlan:
+    """
+    Plan for `workers` processes. Call before loading models and importing the
+    app, so the scheduler and the predictors are sized from this plan.
+    """
+    global _plan
+    _plan = plan_threads(workers, inference_threads=inference_threads)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(_plan.native_threads)
+    return _plan
+
+def limit_native_threads() -> None:
+    """
+    Apply the native thread limit to the OpenMP and BLAS libraries loaded so
+    far. OpenMP limits only hold for the calling thread, so every thread
+    running inference calls this too (see ml/scheduler.py).
+    """
+    threadpool_limits(limits=_plan.native_threads)
+
+def native_pools() -> list[dict]:
+    """Loaded OpenMP and BLAS thread pools with their current sizes"""
+    return [
+        {key: pool.get(key) for key in ("user_api", "internal_api", "num_threads", "prefix", "version")}
+        for pool in threadpool_info()
+    ]
@@ -0,0 +1,225 @@
+# app/ml/usage.py
+"""
+LLM usage accounting per tenant, disease and audience.
+
+Every explanation records its outcome here: LLM calls with their token
+counts (from the response's usage metadata), latency and estimated cost,
+cache hits, failures and budget downgrades. Counts are aggregated in memory
+and a background task adds them to one `llm_usage` document per day, tenant,
+disease and audience with $inc upserts, so workers never overwrite each
+other's counts.
+
+Each tenant has a daily budget in USD (llm_tenant_daily_budget, overridable
+per tenant). Its spend is the total of all workers as of the last flush plus
+this worker's unflushed calls; once it reaches the budget, explanations are
+served from cache or the local template until the next UTC day.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from config.settings import settings
+
+COLLECTION = "llm_usage"
+
+COUNTERS = ("calls", "cache_hits", "failures", "downgraded", "prompt_tokens", "output_tokens",
+            "latency_ms", "cost_usd")
+
+class Completion(NamedTuple):
+    """Text of an LLM answer with the token counts it was billed for"""
+    text: str
+    prompt_tokens: int
+    output_tokens: int
+
+def today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+def call_cost(prompt_tokens: int, output_tokens: int) -> float:
+    return (prompt_tokens * settings.llm_input_cost_per_million
+            + output_tokens * settings.llm_output_cost_per_million) / 1_000_000
+
+def tenant_budget(tenant_id: str) -> float:
+    return settings.llm_tenant_budgets.get(tenant_id, settings.llm_tenant_daily_budget)
+
+def _new_entry() -> dict:
+    return {**dict.fromkeys(COUNTERS, 0), "latency_max_ms": 0.0}
+
+class LLMUsage:
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # (day, tenant, disease, audience) -> counters not yet written to Mongo
+        self._pending: dict[tuple, dict] = defaultdict(_new_entry)
+        # (day, tenant) -> spend of all workers as of the last flush, and this worker's since
+        self._flushed_spend: dict[tuple, float] = {}
+        self._pending_spend: dict[tuple, float] = defaultdict(float)
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self.flushes = 0
+        self.last_error: Optional[str] = None
+
+    def _add(self, tenant_id: Optional[str], disease: str, audience: str, **counts) -> None:
+        key = (today(), tenant_id or settings.default_tenant_id, disease, audience)
+        with self._lock:
+            entry = self._pending[key]
+            for name, value in counts.items():
+                entry[name] += value
+            if "latency_ms" in counts:
+                entry["latency_max_ms"] = max(entry["latency_max_ms"], counts["latency_ms"])
+            if "cost_usd" in counts:
+                self._pending_spend[key[:2]] += counts["cost_usd"]
+
+    def record_call(self, tenant_id: Optional[str], disease: str, audience: str,
+                    completion: Completion, latency: float) -> None:
+        """An answered LLM call; recorded even if the guard already gave up waiting for it"""
+        self._add(
+            tenant_id, disease, audience,
+            calls=1,
+            prompt_tokens=completion.prompt_tokens,
+            output_tokens=completion.output_tokens,
+            latency_ms=latency * 1000,
+            cost_usd=call_cost(completion.prompt_tokens, completion.output_tokens),
+        )
+
+    def record_cache_hit(self, tenant_id: Optional[str], disease: str, audience: str) -> None:
+        self._add(tenant_id, disease, audience, cache_hits=1)
+
+    def record_failure(self, tenant_id: Optional[str], disease: str, audience: str) -> None:
+        """The guard declined the call, or it failed or timed out; the template was served"""
+        self._add(tenant_id, disease, audience, failures=1)
+
+    def record_downgrade(self, tenant_id: Optional[str], disease: str, audience: str) -> None:
+        self._add(tenant_id, disease, audience, downgraded=1)
+
+    def spend(self, tenant_id: Optional[str]) -> float:
+        """Today's estimated spend of a tenant in USD"""
+        key = (today(), tenant_id or settings.default_tenant_id)
+        with self._lock:
+            return self._flushed_spend.get(key, 0.0) + self._pending_spend.get(key, 0.0)
+
+    def over_budget(self, tenant_id: Optional[str]) -> bool:
+        budget = tenant_budget(tenant_id or settings.default_tenant_id)
+        return budget > 0 and self.spend(tenant_id) >= budget
+
+    def _take_pending(self) -> dict[tuple, dict]:
+        with self._lock:
+            pending = dict(self._pending)
+            self._pending.clear()
+        return pending
+
+    async def flush(self) -> None:
+        """Add this worker's counts to the collection and refresh today's spend of all workers"""
+        if self._db is None:
+            return
+        pending = self._take_pending()
+        if pending:
+            self.flushes += 1
+            operations = [
+                UpdateOne(
+                    {"day": day, "tenant": tenant, "disease": disease, "audience": audience},
+                    {
+                        "$inc": {name: entry[name] for name in COUNTERS},
+                        "$max": {"latency_max_ms": entry["latency_max_ms"]},
+                    },
+                    upsert=True,
+                )
+                for (day, tenant, disease, audience), entry in pending.items()
+            ]
+            try:
+                await self._db[COLLECTION].bulk_write(operations, ordered=False)
+            except PyMongoError:
+                # Keep the counts for the next flush
+                with self._lock:
+                    for key, entry in pending.items():
+                        merged = self._pending[key]
+                        for name in COUNTERS:
+                            merged[name] += entry[name]
+                        merged["latency_max_ms"] = max(merged["latency_max_ms"], entry["latency_max_ms"])
+                raise
+
+        day = today()
+        spend: dict[tuple, float] = defaultdict(float)
+        async for doc in self._db[COLLECTION].find({"day": day}, {"tenant": 1, "cost_usd": 1}):
+            spend[(day, doc["tenant"])] += doc.get("cost_usd", 0.0)
+        written: dict[tuple, float] = defaultdict(float)
+        for (d, tenant, _, _), entry in pending.items():
+            written[(d, tenant)] += entry["cost_usd"]
+        with self._lock:
+            self._flushed_spend = dict(spend)
+            # What was just written is part of the flushed spend now
+            for key, cost in written.items():
+                self._pending_spend[key] -= cost
+                if self._pending_spend[key] <= 1e-12:
+                    del self._pending_spend[key]
+
+    async def run(self, db: AsyncIOMotorDatabase) -> None:
+        """Background flusher, started from the app lifespan"""
+        self._db = db
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"LLM usage flush failed: {e}")
+
+    async def report(self, db: AsyncIOMotorDatabase, day: Optional[str] = None,
+                     tenant_id: Optional[str] = None) -> dict:
+        """
+        Usage of a day per tenant, with a breakdown by disease and audience;
+        includes this worker's unflushed counts
+        """
+        day = day or today()
+        query = {"day": day}
+        if tenant_id:
+            query["tenant"] = tenant_id
+        rows: dict[tuple, dict] = defaultdict(_new_entry)
+        async for doc in db[COLLECTION].find(query, {"_id": 0}):
+            entry = rows[(doc["tenant"], doc["disease"], doc["audience"])]
+            for name in COUNTERS:
+                entry[name] += doc.get(name, 0)
+            entry["latency_max_ms"] = max(entry["latency_max_ms"], doc.get("latency_max_ms", 0.0))
+        with self._lock:
+            for (d, tenant, disease, audience), pending in self._pending.items():
+                if d != day or (tenant_id and tenant != tenant_id):
+                    continue
+                entry = rows[(tenant, disease, audience)]
+                for name in COUNTERS:
+                    entry[name] += pending[name]
+                entry["latency_max_ms"] = max(entry["latency_max_ms"], pending["latency_max_ms"])
+
+        tenants: dict[str, dict] = {}
+        for (tenant, disease, audience), entry in sorted(rows.items()):
+            summary = tenants.setdefault(tenant, {"tenant": tenant, **_new_entry(), "by_route": []})
+            for name in COUNTERS:
+                summary[name] += entry[name]
+            summary["latency_max_ms"] = max(summary["latency_max_ms"], entry["latency_max_ms"])
+            summary["by_route"].append({"disease": disease, "audience": audience, **_summarize(entry)})
+        for tenant, summary in tenants.items():
+            budget = tenant_budget(tenant)
+            summary.update(_summarize(summary))
+            del summary["latency_ms"]
+            summary["budget_usd"] = budget or None
+            summary["over_budget"] = bool(budget) and summary["cost_usd"] >= budget
+        return {"day": day, "tenants": list(tenants.values())}
+
+    def stats(self) -> dict:
+        return {
+            "pending_rows": len(self._pending),
+            "flushes": self.flushes,
+            "last_error": self.last_error,
+        }
+
+def _summarize(entry: dict) -> dict:
+    calls = entry["calls"]
+    return {
+        **{name: entry[name] for name in COUNTERS if name != "latency_ms"},
+        "cost_usd": round(entry["cost_usd"], 6),
+        "latency_avg_ms": round(entry["latency_ms"] / calls, 1) if calls else None,
+        "latency_max_ms": round(entry["latency_max_ms"], 1),
+    }
+
+llm_usage = LLMUsage(flush_interval=settings.llm_usage_flush_interval)
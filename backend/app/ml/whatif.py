@@ -0,0 +1,54 @@
+# app/ml/whatif.py
+"""
+What-if sweeps: score a base input with one or two features varied over value
+grids. The whole grid is built as a single frame and scored in one
+predict_batch call, so a risk curve or surface costs one model invocation
+instead of one request per point.
+"""
+import numpy as np
+import pandas as pd
+
+def build_grid(base: dict, axes: list[tuple[str, list]]) -> pd.DataFrame:
+    """One row per grid point, the first axis varying slowest"""
+    mesh = np.meshgrid(*[np.asarray(values) for _, values in axes], indexing="ij")
+    points = mesh[0].size
+    columns = {name: [value] * points for name, value in base.items()}
+    for (name, _), values in zip(axes, mesh):
+        columns[name] = values.ravel()
+    return pd.DataFrame(columns)
+
+def _shap_columns(names: list[str], feature: str) -> list[int]:
+    # Transformed columns are named "num__bmi" or one-hot "cat__smoking_Yes"
+    return [
+        i for i, name in enumerate(names)
+        if name == feature or name.split("__", 1)[-1] == feature or name.split("__", 1)[-1].startswith(feature + "_")
+    ]
+
+def sweep(predictor, base: dict, axes: list[tuple[str, list]], with_shap: bool = False) -> dict:
+    """
+    Score the grid spanned by `axes` (feature name, values) around `base`.
+    Arrays in the result have one dimension per axis; risk is the probability
+    of any class other than negative (class 0).
+    """
+    grid = build_grid(base, axes)
+    probs, shap_values = predictor.predict_batch(grid, with_shap=with_shap)
+    shape = [len(values) for _, values in axes]
+    predictions = probs.argmax(axis=1)
+
+    result = {
+        "model_version": predictor.version,
+        "features": [name for name, _ in axes],
+        "values": [list(values) for _, values in axes],
+        "risk": (1.0 - probs[:, 0]).reshape(shape).tolist(),
+        "prediction": predictions.reshape(shape).tolist(),
+        "probabilities": probs.reshape(*shape, probs.shape[1]).tolist(),
+    }
+    if with_shap:
+        # Contribution of each swept feature towards the predicted class
+        contributions = predictor.select_shap(shap_values, predictions)
+        names = predictor.shap_feature_names
+        result["shap"] = {
+            name: contributions[:, _shap_columns(names, name)].sum(axis=1).reshape(shape).tolist()
+            for name, _ in axes
+        }
+    return result
@@ -0,0 +1,57 @@
+# patient/backfill.py
+"""
+Backfill blind-index name tokens for patients created before name search existed
+(or after changing blind_index_key).
+
+Usage (from the app directory):
+    python -m patient.backfill [--batch-size 500] [--all]
+"""
+import argparse
+import asyncio
+from pymongo import UpdateOne
+from config.settings import settings
+from db.mongo import client, tenant_router
+from utils.encryption import decrypt_data
+from utils.blind_index import name_index_fields
+from .services import ensure_patient_indexes
+
+async def backfill(batch_size: int = 500, rebuild_all: bool = False) -> int:
+    db = client[settings.MONGO_DB_NAME]
+    await tenant_router.refresh(db)
+    await ensure_patient_indexes(db)
+
+    query = {"name": {"$exists": True}}
+    if not rebuild_all:
+        query["name_bidx"] = {"$exists": False}
+
+    updated = 0
+    # The shared collection plus the collections of tenants routed elsewhere
+    for patients in tenant_router.collections(db, "patients"):
+        operations = []
+        async for patient in patients.find(query, {"name": 1}, batch_size=batch_size):
+            try:
+                name = decrypt_data(patient["name"])
+            except Exception as e:
+                print(f"Skipping patient {patient['_id']}: cannot decrypt name ({e})")
+                continue
+            operations.append(UpdateOne({"_id": patient["_id"]}, {"$set": name_index_fields(name)}))
+            if len(operations) >= batch_size:
+                result = await patients.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+                operations = []
+                print(f"Backfilled {updated} patients")
+        if operations:
+            result = await patients.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+    print(f"Done, backfilled {updated} patients")
+    return updated
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill blind-index tokens for patient names")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="Recompute tokens for every patient")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.batch_size, args.all))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# patient/export.py
+"""
+Streaming export of a tenant's patients or diagnosis history as NDJSON or CSV,
+optionally gzip-compressed.
+
+Documents are read from a server-side cursor one batch at a time and the next
+batch is only fetched once the consumer has taken the previous output, so
+memory stays flat regardless of tenant size and slow clients apply backpressure
+all the way to MongoDB.
+
+Usage (from the app directory):
+    python -m patient.export hospital_a patients.ndjson.gz --gzip
+    python -m patient.export hospital_a diagnoses.csv --dataset diagnoses --format csv
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from enum import Enum
+from typing import AsyncIterator, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from config.settings import settings
+from db.mongo import client, tenant_collection
+from utils.encryption import decrypt_dict_fields
+from utils.responses import dumps, projection_for
+from diag.models import DiagnosisOut
+from .models import PatientProfile
+from .services import ENCRYPTED_FIELDS
+
+DATASETS = ("patients", "diagnoses")
+FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+PATIENT_COLUMNS = [field.alias or name for name, field in PatientProfile.model_fields.items()]
+DIAGNOSIS_COLUMNS = [field.alias or name for name, field in DiagnosisOut.model_fields.items()]
+
+_decrypt_workers = settings.export_decrypt_workers or os.cpu_count() or 1
+_decrypt_pool = ThreadPoolExecutor(max_workers=_decrypt_workers, thread_name_prefix="export-decrypt")
+
+def _decrypt_chunk(patients: list[dict]) -> list[dict]:
+    return [decrypt_dict_fields(patient, ENCRYPTED_FIELDS) for patient in patients]
+
+async def _decrypt_batch(patients: list[dict]) -> list[dict]:
+    """Decrypt a batch in parallel chunks off the event loop"""
+    size = max(1, -(-len(patients) // _decrypt_workers))
+    loop = asyncio.get_running_loop()
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(_decrypt_pool, _decrypt_chunk, patients[i:i + size])
+        for i in range(0, len(patients), size)
+    ))
+    return [patient for chunk in chunks for patient in chunk]
+
+async def _batches(cursor, batch_size: int) -> AsyncIterator[list[dict]]:
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def iter_patient_batches(db: AsyncIOMotorDatabase, tenant_id: Optional[str], batch_size: int) -> AsyncIterator[list[dict]]:
+    query = {"tenant_id": tenant_id} if tenant_id else {}
+    cursor = tenant_collection(db, "patients", tenant_id).find(query, projection_for(PatientProfile), batch_size=batch_size).sort("_id", 1)
+    async for batch in _batches(cursor, batch_size):
+        yield await _decrypt_batch(batch)
+
+async def iter_diagnosis_batches(db: AsyncIOMotorDatabase, tenant_id: Optional[str], batch_size: int) -> AsyncIterator[list[dict]]:
+    # Diagnoses reference patients rather than tenants, so walk the tenant's
+    # patient ids in batches and fetch their diagnoses per batch
+    query = {"tenant_id": tenant_id} if tenant_id else {}
+    cursor = tenant_collection(db, "patients", tenant_id).find(query, {"_id": 1}, batch_size=batch_size).sort("_id", 1)
+    async for patients in _batches(cursor, batch_size):
+        patient_ids = [str(patient["_id"]) for patient in patients]
+        diagnoses = tenant_collection(db, "diagnoses", tenant_id).find({"patient_id": {"$in": patient_ids}}, batch_size=batch_size)
+        async for batch in _batches(diagnoses, batch_size):
+            yield batch
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode("utf-8")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return str(value.value)
+    return str(value)
+
+def render_ndjson(batch: list[dict], columns: list[str]) -> bytes:
+    return b"".join(dumps({column: document.get(column) for column in columns}) + b"\n" for document in batch)
+
+def render_csv(batch: list[dict], columns: list[str], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_csv_value(document.get(column)) for column in columns] for document in batch)
+    return buffer.getvalue().encode("utf-8")
+
+async def export_stream(
+    db: AsyncIOMotorDatabase,
+    tenant_id: Optional[str],
+    dataset: str = "patients",
+    output_format: str = "ndjson",
+    compress: bool = False,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yield the export as byte chunks, one (compressed) chunk per batch
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unsupported dataset: {dataset}")
+    if output_format not in FORMATS:
+        raise ValueError(f"Unsupported format: {output_format}")
+    batch_size = batch_size or settings.export_batch_size
+    if dataset == "patients":
+        batches, columns = iter_patient_batches(db, tenant_id, batch_size), PATIENT_COLUMNS
+    else:
+        batches, columns = iter_diagnosis_batches(db, tenant_id, batch_size), DIAGNOSIS_COLUMNS
+
+    # wbits=31 writes a gzip container
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def encode(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor is not None else data
+
+    if output_format == "csv":
+        yield encode(render_csv([], columns, header=True))
+    async for batch in batches:
+        if output_format == "ndjson":
+            data = encode(render_ndjson(batch, columns))
+        else:
+            data = encode(render_csv(batch, columns, header=False))
+        # The compressor may buffer small batches; don't send empty chunks
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+def export_filename(tenant_id: Optional[str], dataset: str, output_format: str, compress: bool) -> str:
+    name = f"{tenant_id or 'all'}_{dataset}_{datetime.utcnow():%Y%m%d}.{output_format}"
+    return name + ".gz" if compress else name
+
+async def export_to_file(tenant_id: Optional[str], path: str, dataset: str, output_format: str, compress: bool, batch_size: int) -> int:
+    db = client[settings.MONGO_DB_NAME]
+    written = 0
+    with open(path, "wb") as f:
+        async for chunk in export_stream(db, tenant_id, dataset, output_format, compress, batch_size):
+            f.write(chunk)
+            written += len(chunk)
+    print(f"Exported {dataset} for {tenant_id or 'all tenants'} to {path} ({written} bytes)")
+    return written
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a tenant's patients or diagnoses")
+    parser.add_argument("tenant_id", help="Tenant to export, or 'all'")
+    parser.add_argument("output", help="Output file")
+    parser.add_argument("--dataset", choices=DATASETS, default="patients")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="Gzip-compress the output")
+    parser.add_argument("--batch-size", type=int, default=settings.export_batch_size)
+    args = parser.parse_args()
+    tenant_id = None if args.tenant_id == "all" else args.tenant_id
+    asyncio.run(export_to_file(tenant_id, args.output, args.dataset, args.format, args.gzip, args.batch_size))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# patient/importer.py
+"""
+Bulk patient import from NDJSON: one PatientCreate object per line.
+
+Rows are processed in batches: validated with PatientCreate, passwords
+hashed concurrently on a thread pool (bcrypt releases the GIL), sensitive
+fields encrypted in bulk, then accounts and patients written with
+insert_many(ordered=False). A result is reported for every input line.
+
+Every patient is created in the importing user's tenant; rows naming
+another tenant are rejected.
+"""
+import asyncio
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from auth.models import RoleEnum
+from auth.services import hash_password
+from config.settings import settings
+from db.mongo import SHARED, tenant_router
+from utils.encryption import encrypt_dict_fields
+from utils.blind_index import name_index_fields
+from .models import PatientCreate
+from .services import ENCRYPTED_FIELDS
+
+_hash_pool = ThreadPoolExecutor(
+    max_workers=settings.import_hash_workers or os.cpu_count() or 1,
+    thread_name_prefix="import-hash",
+)
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without buffering the whole body"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+def _failed_indexes(error: BulkWriteError) -> dict[int, str]:
+    return {e["index"]: e.get("errmsg", "write failed") for e in error.details.get("writeErrors", [])}
+
+async def _import_batch(db: AsyncIOMotorDatabase, rows: list[tuple[int, bytes]], tenant_id: Optional[str]) -> list[dict]:
+    results: dict[int, dict] = {}
+    valid: list[tuple[int, PatientCreate]] = []
+    seen_emails = set()
+
+    # Validate
+    for line_number, raw in rows:
+        try:
+            patient = PatientCreate(**json.loads(raw))
+        except (ValueError, ValidationError) as e:
+            results[line_number] = {"line": line_number, "status": "error", "error": str(e)}
+            continue
+        if patient.tenant_id and patient.tenant_id != tenant_id:
+            results[line_number] = {"line": line_number, "status": "error", "error": "Tenant does not match the importing user"}
+        elif not PatientCreate.is_strong_password(patient.password):
+            results[line_number] = {"line": line_number, "status": "error", "error": "Weak password"}
+        elif patient.email in seen_emails:
+            results[line_number] = {"line": line_number, "status": "error", "error": "Duplicate email in import"}
+        else:
+            seen_emails.add(patient.email)
+            valid.append((line_number, patient))
+
+    # One round trip to reject emails that are already registered
+    if valid:
+        existing = await db["accounts"].find(
+            {"email": {"$in": [patient.email for _, patient in valid]}}, {"email": 1}
+        ).to_list(length=None)
+        existing_emails = {account["email"] for account in existing}
+        for line_number, patient in valid:
+            if patient.email in existing_emails:
+                results[line_number] = {"line": line_number, "status": "error", "error": "Email already registered"}
+        valid = [(n, p) for n, p in valid if p.email not in existing_emails]
+
+    if valid:
+        loop = asyncio.get_running_loop()
+        hashes = await asyncio.gather(*(
+            loop.run_in_executor(_hash_pool, hash_password, patient.password) for _, patient in valid
+        ))
+
+        accounts, patients = [], []
+        for (line_number, patient), hashed in zip(valid, hashes):
+            account_id = str(uuid.uuid4())
+            accounts.append({
+                "_id": account_id,
+                "email": patient.email,
+                "hashed_password": hashed,
+                "role": RoleEnum.PATIENT.value,
+                "tenant_id": tenant_id,
+            })
+            patient_dict = patient.model_dump(exclude={"password", "email"})
+            patient_dict["account_id"] = account_id
+            patient_dict["tenant_id"] = tenant_id
+            encrypted = encrypt_dict_fields(patient_dict, ENCRYPTED_FIELDS)
+            encrypted.update(name_index_fields(patient_dict["name"]))
+            patients.append(encrypted)
+
+        # Accounts first; only patients whose account was written are inserted
+        account_errors: dict[int, str] = {}
+        try:
+            await db["accounts"].insert_many(accounts, ordered=False)
+        except BulkWriteError as e:
+            account_errors = _failed_indexes(e)
+
+        indexes = [i for i in range(len(valid)) if i not in account_errors]
+        patient_errors: dict[int, str] = {}
+        if indexes:
+            try:
+                # Without a tenant, the shared collection rather than whatever the request context names
+                patients_collection = tenant_router.collection(db, "patients", tenant_id, mode=None if tenant_id else SHARED)
+                await patients_collection.insert_many(
+                    [patients[i] for i in indexes], ordered=False
+                )
+            except BulkWriteError as e:
+                patient_errors = {indexes[i]: msg for i, msg in _failed_indexes(e).items()}
+        if patient_errors:
+            # Don't leave accounts behind without a patient profile
+            await db["accounts"].delete_many({"_id": {"$in": [accounts[i]["_id"] for i in patient_errors]}})
+
+        for i, (line_number, _) in enumerate(valid):
+            error = account_errors.get(i) or patient_errors.get(i)
+            if error:
+                results[line_number] = {"line": line_number, "status": "error", "error": error}
+            else:
+                results[line_number] = {
+                    "line": line_number,
+                    "status": "created",
+                    "id": str(patients[i]["_id"]),
+                    "account_id": accounts[i]["_id"],
+                }
+
+    return [results[line_number] for line_number, _ in rows]
+
+async def import_patients(
+    db: AsyncIOMotorDatabase,
+    lines: AsyncIterator[bytes],
+    tenant_id: Optional[str] = None,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[dict]:
+    """
+    Import patients from NDJSON lines, yielding one result per non-empty line
+    as each batch completes
+    """
+    batch_size = batch_size or settings.import_batch_size
+    batch: list[tuple[int, bytes]] = []
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        batch.append((line_number, line))
+        if len(batch) >= batch_size:
+            for result in await _import_batch(db, batch, tenant_id):
+                yield result
+            batch = []
+    if batch:
+        for result in await _import_batch(db, batch, tenant_id):
+            yield result
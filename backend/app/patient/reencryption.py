@@ -0,0 +1,93 @@
+# patient/reencryption.py
+"""
+Lazy re-encryption of patients read with an outdated encryption key.
+
+Reads only check the key id prefix of the raw ciphertexts and queue the
+patient; a background task decrypts, re-encrypts and writes queued patients
+in batches with bulk_write, so reads never wait on a write. Patients the
+queue can't hold are left to the bulk job (patient/rotation.py).
+"""
+import asyncio
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from config.settings import settings
+from utils.encryption import needs_reencryption, reencrypt_dict_fields
+
+def stale_fields(patient: dict, fields: list) -> dict:
+    """Ciphertexts of `fields` not encrypted with the active key"""
+    return {field: patient[field] for field in fields if needs_reencryption(patient.get(field))}
+
+def _conditional_update(patient_id, stale: dict) -> UpdateOne:
+    return UpdateOne({"_id": patient_id, **stale}, {"$set": reencrypt_dict_fields(stale, list(stale))})
+
+async def write_reencrypted(patients: AsyncIOMotorCollection, stale_by_id: dict) -> int:
+    """
+    Move the stale ciphertexts of each patient id to the active key. Updates
+    apply only if the document still holds the old ciphertext, so concurrent
+    updates win. Returns the number of patients modified.
+    """
+    if not stale_by_id:
+        return 0
+    # Decrypting and encrypting is CPU work, keep it off the event loop
+    operations = await asyncio.to_thread(
+        lambda: [_conditional_update(_id, stale) for _id, stale in stale_by_id.items()]
+    )
+    return (await patients.bulk_write(operations, ordered=False)).modified_count
+
+class LazyReencryption:
+    """Queues patients read with an outdated key; a background task re-encrypts them"""
+
+    def __init__(self, max_pending: int, flush_interval: float):
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        # collection name -> (handle, {_id: stale ciphertexts})
+        self._pending: dict[str, tuple[AsyncIOMotorCollection, dict]] = {}
+        self.queued = 0
+        self.upgraded = 0
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+
+    def touch(self, patients: AsyncIOMotorCollection, patient: dict, fields: list) -> None:
+        """Called with the raw document of every patient read"""
+        stale = stale_fields(patient, fields)
+        if not stale:
+            return
+        _, queued = self._pending.setdefault(patients.full_name, (patients, {}))
+        if patient["_id"] in queued:
+            return
+        if sum(len(ids) for _, ids in self._pending.values()) >= self.max_pending:
+            # The bulk job gets to it
+            self.dropped += 1
+            return
+        queued[patient["_id"]] = stale
+        self.queued += 1
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        for patients, queued in pending.values():
+            self.upgraded += await write_reencrypted(patients, queued)
+
+    async def run(self) -> None:
+        """Background writer, started from the app lifespan"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Lazy re-encryption failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(ids) for _, ids in self._pending.values()),
+            "queued": self.queued,
+            "upgraded": self.upgraded,
+            "dropped": self.dropped,
+            "last_error": self.last_error,
+        }
+
+lazy_reencryption = LazyReencryption(
+    max_pending=settings.key_rotation_lazy_max_pending,
+    flush_interval=settings.key_rotation_lazy_flush_interval,
+)
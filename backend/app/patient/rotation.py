@@ -0,0 +1,145 @@
+# patient/rotation.py
+"""
+Re-encryption of patient fields after an encryption key rotation.
+
+Set a new `encryption_active_key` (keeping the old keys in `encryption_keys`)
+and patients are moved to it in two ways:
+  - lazily: reads of a patient encrypted with an older key queue it for
+    re-encryption in batches (patient/reencryption.py);
+  - in bulk: a throttled background job walks each patients collection in
+    _id order with bulk_write, checkpointing its position in `key_rotation`
+    so it resumes where it stopped. A lease keeps other workers from walking
+    the same collection at the same time.
+
+Updates only apply if the document still holds the ciphertext that was
+re-encrypted, so neither path can overwrite a concurrent update. Once no
+document uses an old key (see GET /api/admin/encryption), it can be removed.
+
+Usage (from the app directory), to run the job in the foreground:
+    python -m patient.rotation [--batch-size 500] [--pause 0.5]
+"""
+import argparse
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from config.settings import settings
+from db.mongo import client, tenant_router
+from .reencryption import lazy_reencryption, stale_fields, write_reencrypted
+from .services import ENCRYPTED_FIELDS
+
+CHECKPOINTS = "key_rotation"
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+async def _claim(db: AsyncIOMotorDatabase, name: str) -> Optional[dict]:
+    """Take or renew the lease on a collection's checkpoint; None if another worker holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        return await db[CHECKPOINTS].find_one_and_update(
+            {"_id": name, "$or": [{"owner": OWNER}, {"lease_until": {"$lt": now}}, {"lease_until": None}]},
+            {"$set": {"owner": OWNER, "lease_until": now + timedelta(seconds=settings.key_rotation_lease_seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        return None
+
+async def rotate_collection(
+    db: AsyncIOMotorDatabase,
+    patients: AsyncIOMotorCollection,
+    batch_size: int,
+    pause: float,
+) -> Optional[int]:
+    """
+    Re-encrypt one patients collection from its checkpoint on. Returns the
+    number of updated patients, or None if another worker holds the lease.
+    """
+    checkpoint = await _claim(db, patients.full_name)
+    if checkpoint is None:
+        return None
+    key_id = settings.encryption_active_key
+    if checkpoint.get("key_id") != key_id:
+        # Rotated again since the last walk: start over
+        checkpoint = {"key_id": key_id, "last_id": None, "done": False, "updated": 0}
+        await db[CHECKPOINTS].update_one({"_id": patients.full_name}, {"$set": checkpoint})
+    if checkpoint.get("done"):
+        await db[CHECKPOINTS].update_one({"_id": patients.full_name}, {"$set": {"lease_until": None}})
+        return 0
+
+    last_id = checkpoint.get("last_id")
+    updated = 0
+    projection = {field: 1 for field in ENCRYPTED_FIELDS}
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await patients.find(query, projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        stale_by_id = {patient["_id"]: stale_fields(patient, ENCRYPTED_FIELDS) for patient in batch}
+        modified = await write_reencrypted(patients, {_id: stale for _id, stale in stale_by_id.items() if stale})
+        updated += modified
+        last_id = batch[-1]["_id"]
+        await db[CHECKPOINTS].update_one(
+            {"_id": patients.full_name, "owner": OWNER},
+            {"$set": {"last_id": last_id}, "$inc": {"updated": modified}},
+        )
+        if await _claim(db, patients.full_name) is None:
+            # Our lease expired and another worker took over
+            return updated
+        # Throttle, so the walk never competes with request traffic
+        await asyncio.sleep(pause)
+
+    await db[CHECKPOINTS].update_one(
+        {"_id": patients.full_name, "owner": OWNER},
+        {"$set": {"done": True, "finished_at": datetime.now(timezone.utc), "lease_until": None}},
+    )
+    return updated
+
+async def rotate(db: AsyncIOMotorDatabase, batch_size: int, pause: float) -> int:
+    """Re-encrypt every patients collection (shared and per-tenant) to the active key"""
+    await tenant_router.refresh(db)
+    updated = 0
+    for patients in tenant_router.collections(db, "patients"):
+        result = await rotate_collection(db, patients, batch_size, pause)
+        if result is None:
+            print(f"Skipping {patients.full_name}: re-encrypted by another worker")
+            continue
+        updated += result
+        if result:
+            print(f"Re-encrypted {result} patients in {patients.full_name}")
+    return updated
+
+async def run_key_rotation(db: AsyncIOMotorDatabase) -> None:
+    """Background job, started from the app lifespan; rechecks after every interval"""
+    while True:
+        try:
+            await rotate(db, settings.key_rotation_batch_size, settings.key_rotation_batch_pause)
+        except PyMongoError as e:
+            print(f"Key rotation failed, retrying later: {e}")
+        await asyncio.sleep(settings.key_rotation_interval)
+
+async def rotation_status(db: AsyncIOMotorDatabase) -> dict:
+    checkpoints = await db[CHECKPOINTS].find({}).to_list(length=None)
+    for checkpoint in checkpoints:
+        checkpoint["collection"] = checkpoint.pop("_id")
+        checkpoint["last_id"] = str(checkpoint["last_id"]) if checkpoint.get("last_id") else None
+    return {
+        "active_key": settings.encryption_active_key,
+        "collections": checkpoints,
+        "lazy": lazy_reencryption.stats(),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-encrypt patient fields with the active encryption key")
+    parser.add_argument("--batch-size", type=int, default=settings.key_rotation_batch_size)
+    parser.add_argument("--pause", type=float, default=settings.key_rotation_batch_pause,
+                        help="Seconds to wait between batches")
+    args = parser.parse_args()
+    updated = asyncio.run(rotate(client[settings.MONGO_DB_NAME], args.batch_size, args.pause))
+    print(f"Done, re-encrypted {updated} patients")
+
+if __name__ == "__main__":
+    main()
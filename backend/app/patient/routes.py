@@ -1,20 +1,38 @@
 # patient/routes.py
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Path, Query
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from db.mongo import get_database
-from auth.services import hash_password, get_current_user, require_role
+from db.mongo import get_database, tenant_collection
+from utils.responses import DuplexStreamingResponse, projection_for, trusted_response
+from auth.services import hash_password, get_current_user, require_role, require_admin
 from auth.models import RoleEnum, TokenData
 from .models import PatientCreate, PatientProfile, PatientBaseModel
+from .importer import import_patients, iter_lines
+from .export import MEDIA_TYPES, export_filename, export_stream
+from .rotation import rotation_status
+from hospital.context import get_resolved_tenant_id
+from audit.log import audit_log
 from .services import (
     get_patients_by_tenant, 
     get_patient_by_id,
+    decrypt_documents,
+    search_patients_by_name,
     create_patient,
     update_patient,
     delete_patient
 )
 
 router = APIRouter(prefix="/patients", tags=["Patients"])
+encryption_router = APIRouter(prefix="/admin/encryption", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+def _resolved_tenant() -> str:
+    """The authenticated user's tenant; 403 when it couldn't be resolved"""
+    tenant_id = get_resolved_tenant_id()
+    if not tenant_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tenant resolved for this user")
+    return tenant_id
 
 @router.get("/", response_model=list[PatientBaseModel])
 async def list_patients(
@@ -24,10 +42,74 @@ async def list_patients(
     """
     List all patients - Only available to users with DOCTOR role
     """
-    patients = await db["patients"].find().to_list(length=100)
+    collection = tenant_collection(db, "patients")
+    patients = await collection.find({}, projection_for(PatientBaseModel)).to_list(length=100)
     if not patients:
         raise HTTPException(status_code=404, detail="No patients found")
-    return patients 
+    audit_log.record("read", "patient", [str(p["_id"]) for p in patients], current_user.email, current_user.role)
+    # Documents come from our own collection, so skip re-validating them once decrypted
+    return trusted_response(decrypt_documents(collection, patients), PatientBaseModel)
+
+@router.get("/search", response_model=list[PatientBaseModel])
+async def search_patients(
+    q: str = Query(..., min_length=2, description="Name or name prefixes, case and diacritics insensitive"),
+    exact: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: TokenData = Depends(require_role(RoleEnum.DOCTOR))
+):
+    """
+    Search the doctor's tenant's patients by name using blind-index tokens - Only available to users with DOCTOR role
+    """
+    patients = await search_patients_by_name(db, q, tenant_id=_resolved_tenant(), exact=exact, limit=limit)
+    audit_log.record("read", "patient", [str(p.id) for p in patients], current_user.email, current_user.role, search=True)
+    return patients
+
+@router.get("/export")
+async def export_patients(
+    dataset: str = Query("patients", pattern="^(patients|diagnoses)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = True,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: TokenData = Depends(require_role(RoleEnum.DOCTOR))
+):
+    """
+    Stream the doctor's tenant's patients or diagnosis history as NDJSON or CSV - Only available to users with DOCTOR role.
+    Exports across all tenants are only possible from the command line (python -m patient.export).
+    """
+    tenant_id = _resolved_tenant()
+    audit_log.record("export", dataset, None, current_user.email, current_user.role, format=format)
+    headers = {"Content-Disposition": f'attachment; filename="{export_filename(tenant_id, dataset, format, compress=False)}"'}
+    # Transport compression: clients decode it transparently
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_stream(db, tenant_id, dataset, format, compress=gzip),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+@router.post("/import")
+async def import_patients_endpoint(
+    request: Request,
+    batch_size: int = Query(None, ge=1, le=5000),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user: TokenData = Depends(require_role(RoleEnum.DOCTOR))
+):
+    """
+    Bulk-create patients from an NDJSON body (one PatientCreate per line) - Only available to users with DOCTOR role.
+    Streams back one NDJSON result per input line as batches are written.
+    Patients are created in the doctor's own tenant.
+    """
+    tenant_id = get_resolved_tenant_id()
+
+    async def report():
+        async for result in import_patients(db, iter_lines(request.stream()), tenant_id=tenant_id, batch_size=batch_size):
+            if result["status"] == "created":
+                audit_log.record("create", "patient", result["id"], current_user.email, current_user.role, bulk_import=True)
+            yield json.dumps(result) + "\n"
+
+    return DuplexStreamingResponse(report(), media_type="application/x-ndjson")
 
 @router.get("/{patient_id}", response_model=PatientBaseModel)
 async def get_patient(
@@ -41,6 +123,7 @@ async def get_patient(
     patient = await get_patient_by_id(db, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
+    audit_log.record("read", "patient", patient_id, current_user.email, current_user.role)
     return patient
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -60,6 +143,7 @@ async def create_patient_endpoint(
         "email": patient_create.email,
         "hashed_password": hash_password(patient_create.password),
         "role": RoleEnum.PATIENT.value,  # Use .value to get the string value
+        "tenant_id": patient_create.tenant_id,
     }
     
     # Create the patient using the service function which handles encryption
@@ -71,6 +155,8 @@ async def create_patient_endpoint(
         
         # Create the patient with the account link
         patient = await create_patient(db, patient_create, str(account_result.inserted_id))
+        # Self-registration, so the patient is the actor
+        audit_log.record("create", "patient", str(patient.id), patient_create.email, RoleEnum.PATIENT)
         return {"id": str(patient.id), "message": "Patient created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating patient: {str(e)}")
@@ -88,6 +174,7 @@ async def update_patient_endpoint(
     success = await update_patient(db, patient_id, updated_data)
     if not success:
         raise HTTPException(status_code=404, detail="Patient not found or update failed")
+    audit_log.record("update", "patient", patient_id, current_user.email, current_user.role, fields=sorted(updated_data))
     return {"message": "Patient updated successfully"}
 
 @router.delete("/{patient_id}")
@@ -102,4 +189,12 @@ async def delete_patient_endpoint(
     success = await delete_patient(db, patient_id)
     if not success:
         raise HTTPException(status_code=404, detail="Patient not found or delete failed")
+    audit_log.record("delete", "patient", patient_id, current_user.email, current_user.role)
     return {"message": "Patient deleted successfully"}
+
+@encryption_router.get("/")
+async def get_encryption_status(db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Active encryption key, re-encryption progress per patients collection and lazy upgrade counts
+    """
+    return await rotation_status(db)
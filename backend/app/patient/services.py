@@ -1,36 +1,76 @@
 # patient/services.py
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
 from .models import PatientProfile, PatientCreate
 from typing import List, Optional
 from bson import ObjectId
+from datetime import datetime
 from utils.encryption import encrypt_dict_fields, decrypt_dict_fields
+from utils.blind_index import name_index_fields, name_exact_token, name_query_tokens
+from db.mongo import tenant_collection, tenant_router
+from db.cache import patient_cache
+from .reencryption import lazy_reencryption
 
 # Fields that should be encrypted in the patient profile
 ENCRYPTED_FIELDS = ["name", "dob"]
 
+async def ensure_patient_indexes(db: AsyncIOMotorDatabase) -> None:
+    """
+    Create the indexes backing blind-index name search
+    """
+    for patients in tenant_router.collections(db, "patients"):
+        await patients.create_index([("tenant_id", 1), ("name_bidx", 1)])
+        await patients.create_index([("tenant_id", 1), ("name_tokens", 1)])
+
+def _decrypt(patients: AsyncIOMotorCollection, patient_data: dict) -> dict:
+    """Decrypt a patient's fields, queueing it for re-encryption if it uses an older key"""
+    lazy_reencryption.touch(patients, patient_data, ENCRYPTED_FIELDS)
+    return decrypt_dict_fields(patient_data, ENCRYPTED_FIELDS)
+
+def decrypt_documents(patients: AsyncIOMotorCollection, documents: list[dict]) -> list[dict]:
+    """
+    Decrypted patient documents for responses built without model validation
+    (utils.responses.trusted_response); dob is parsed back to a datetime
+    """
+    decrypted = []
+    for document in documents:
+        document = _decrypt(patients, document)
+        if isinstance(document.get("dob"), str):
+            document["dob"] = datetime.fromisoformat(document["dob"])
+        decrypted.append(document)
+    return decrypted
+
 async def get_patient_by_id(db: AsyncIOMotorDatabase, patient_id: str, tenant_id: Optional[str] = None) -> Optional[PatientProfile]:
     """
     Retrieve a patient by ID, optionally filtering by tenant
     """
+    patients = tenant_collection(db, "patients", tenant_id)
+    cached = patient_cache.get(patient_id, patients.full_name)
+    if cached is not None:
+        return cached if not tenant_id or cached.tenant_id == tenant_id else None
+
     query = {"_id": ObjectId(patient_id) if isinstance(patient_id, str) else patient_id}
     if tenant_id:
         query["tenant_id"] = tenant_id
         
-    patient_data = await db["patients"].find_one(query)
+    generation = patient_cache.generation()
+    patient_data = await patients.find_one(query)
     if patient_data:
         # Decrypt sensitive fields before returning
-        decrypted_data = decrypt_dict_fields(patient_data, ENCRYPTED_FIELDS)
-        return PatientProfile(**decrypted_data)
+        decrypted_data = _decrypt(patients, patient_data)
+        patient = PatientProfile(**decrypted_data)
+        patient_cache.set(patient_data["_id"], patients.full_name, patient.model_copy(), generation)
+        return patient
     return None
 
 async def get_patient_by_account_id(db: AsyncIOMotorDatabase, account_id: str) -> Optional[PatientProfile]:
     """
     Retrieve a patient by their account ID
     """
-    patient_data = await db["patients"].find_one({"account_id": account_id})
+    patients = tenant_collection(db, "patients")
+    patient_data = await patients.find_one({"account_id": account_id})
     if patient_data:
         # Decrypt sensitive fields before returning
-        decrypted_data = decrypt_dict_fields(patient_data, ENCRYPTED_FIELDS)
+        decrypted_data = _decrypt(patients, patient_data)
         return PatientProfile(**decrypted_data)
     return None
 
@@ -38,9 +78,31 @@ async def get_patients_by_tenant(db: AsyncIOMotorDatabase, tenant_id: str) -> Li
     """
     Retrieve all patients for a specific tenant/hospital
     """
-    patients = await db["patients"].find({"tenant_id": tenant_id}).to_list(length=100)
+    collection = tenant_collection(db, "patients", tenant_id)
+    patients = await collection.find({"tenant_id": tenant_id}).to_list(length=100)
     # Decrypt each patient's sensitive data
-    decrypted_patients = [decrypt_dict_fields(patient, ENCRYPTED_FIELDS) for patient in patients]
+    decrypted_patients = [_decrypt(collection, patient) for patient in patients]
+    return [PatientProfile(**patient) for patient in decrypted_patients]
+
+async def search_patients_by_name(db: AsyncIOMotorDatabase, query: str, tenant_id: Optional[str] = None, exact: bool = False, limit: int = 50) -> List[PatientProfile]:
+    """
+    Find patients by name through the blind index, decrypting only the matches.
+    Exact mode matches the whole normalized name; otherwise every query word
+    must prefix a word of the name. Matching ignores case and diacritics.
+    """
+    if exact:
+        filter_query = {"name_bidx": name_exact_token(query)}
+    else:
+        tokens = name_query_tokens(query)
+        if not tokens:
+            return []
+        filter_query = {"name_tokens": {"$all": tokens}}
+    if tenant_id:
+        filter_query["tenant_id"] = tenant_id
+
+    collection = tenant_collection(db, "patients", tenant_id)
+    patients = await collection.find(filter_query, {"name_bidx": 0, "name_tokens": 0}).to_list(length=limit)
+    decrypted_patients = [_decrypt(collection, patient) for patient in patients]
     return [PatientProfile(**patient) for patient in decrypted_patients]
 
 async def create_patient(db: AsyncIOMotorDatabase, patient_data: PatientCreate, account_id: str) -> PatientProfile:
@@ -52,11 +114,12 @@ async def create_patient(db: AsyncIOMotorDatabase, patient_data: PatientCreate,
     patient_dict = patient_data.model_dump(exclude={"password", "email"})
     patient_dict["account_id"] = account_id
     
-    # Encrypt sensitive fields before storing
+    # Encrypt sensitive fields before storing, keeping blind-index tokens for search
     encrypted_dict = encrypt_dict_fields(patient_dict, ENCRYPTED_FIELDS)
+    encrypted_dict.update(name_index_fields(patient_dict["name"]))
     
     # Insert into the database
-    result = await db["patients"].insert_one(encrypted_dict)
+    result = await tenant_collection(db, "patients", patient_dict.get("tenant_id")).insert_one(encrypted_dict)
     patient_dict["_id"] = result.inserted_id
     
     return PatientProfile(**patient_dict)
@@ -71,6 +134,8 @@ async def update_patient(db: AsyncIOMotorDatabase, patient_id: str, updated_data
     
     # Encrypt any sensitive fields in the update
     encrypted_update = encrypt_dict_fields(updated_data, ENCRYPTED_FIELDS)
+    if updated_data.get("name"):
+        encrypted_update.update(name_index_fields(updated_data["name"]))
     
     # Build query
     query = {"_id": ObjectId(patient_id) if isinstance(patient_id, str) else patient_id}
@@ -78,10 +143,11 @@ async def update_patient(db: AsyncIOMotorDatabase, patient_id: str, updated_data
         # Only update if the patient belongs to the specified tenant
         query["tenant_id"] = tenant_id
         
-    result = await db["patients"].update_one(
+    result = await tenant_collection(db, "patients", tenant_id).update_one(
         query,
         {"$set": encrypted_update}
     )
+    patient_cache.invalidate(patient_id)
     return result.modified_count > 0
 
 async def delete_patient(db: AsyncIOMotorDatabase, patient_id: str, tenant_id: Optional[str] = None) -> bool:
@@ -94,15 +160,35 @@ async def delete_patient(db: AsyncIOMotorDatabase, patient_id: str, tenant_id: O
         # Only delete if the patient belongs to the specified tenant
         query["tenant_id"] = tenant_id
     
-    result = await db["patients"].delete_one(query)
+    result = await tenant_collection(db, "patients", tenant_id).delete_one(query)
+    patient_cache.invalidate(patient_id)
     return result.deleted_count > 0
 
 async def assign_patient_to_tenant(db: AsyncIOMotorDatabase, patient_id: str, tenant_id: str) -> bool:
     """
     Assign a patient to a specific tenant/hospital
     """
-    result = await db["patients"].update_one(
-        {"_id": ObjectId(patient_id) if isinstance(patient_id, str) else patient_id},
-        {"$set": {"tenant_id": tenant_id}}
-    )
-    return result.modified_count > 0
\ No newline at end of file
+    query = {"_id": ObjectId(patient_id) if isinstance(patient_id, str) else patient_id}
+    source = tenant_collection(db, "patients")
+    target = tenant_collection(db, "patients", tenant_id)
+    if source.full_name == target.full_name:
+        result = await source.update_one(query, {"$set": {"tenant_id": tenant_id}})
+        patient_cache.invalidate(patient_id)
+        return result.modified_count > 0
+
+    # The new tenant is routed elsewhere: move the patient and its diagnoses
+    patient = await source.find_one(query)
+    if not patient:
+        return False
+    patient["tenant_id"] = tenant_id
+    await target.insert_one(patient)
+    await source.delete_one({"_id": patient["_id"]})
+    patient_cache.invalidate(patient_id)
+    diagnoses_source = tenant_collection(db, "diagnoses")
+    diagnoses_target = tenant_collection(db, "diagnoses", tenant_id)
+    if diagnoses_source.full_name != diagnoses_target.full_name:
+        diagnoses = await diagnoses_source.find({"patient_id": str(patient["_id"])}).to_list(length=None)
+        if diagnoses:
+            await diagnoses_target.insert_many(diagnoses)
+            await diagnoses_source.delete_many({"_id": {"$in": [d["_id"] for d in diagnoses]}})
+    return True
@@ -0,0 +1 @@
+# profiling/__init__.py
@@ -0,0 +1,63 @@
+# profiling/middleware.py
+import asyncio
+import random
+import threading
+import time
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth.services import is_admin_token
+from config.settings import settings
+from .sampler import SamplingProfiler
+from .services import profile_name, save_profile
+
+# The sampler sees every thread of the process, so only one request is profiled at a time.
+# Profiles include anything else the process runs while the request is in flight.
+_profiling_lock = threading.Lock()
+
+class ProfilingMiddleware:
+    """
+    Samples the whole process from the start of a request until the last
+    chunk of its response body is sent, so streamed responses and work
+    handed to other threads are part of the profile.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._should_profile(Headers(scope=scope)) \
+                or not _profiling_lock.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        method, path = scope["method"], scope["path"]
+        name = profile_name(method, path)
+        status_code = 500
+
+        async def send_with_profile(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", name.encode())]
+            await send(message)
+
+        profiler = SamplingProfiler(settings.profiling_interval_ms / 1000)
+        start = time.perf_counter()
+        try:
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_with_profile)
+            finally:
+                profiler.stop()
+            duration_ms = (time.perf_counter() - start) * 1000
+            # The response is complete; build and write the profile off the event loop
+            await asyncio.to_thread(save_profile, profiler, name, method, path, status_code, duration_ms)
+        finally:
+            _profiling_lock.release()
+
+    @staticmethod
+    def _should_profile(headers: Headers) -> bool:
+        # Explicit opt-in from an admin always wins over sampling
+        if headers.get("X-Profile") and is_admin_token(headers.get("X-Admin-Token")):
+            return True
+        rate = settings.profiling_sample_rate
+        return rate > 0 and random.random() < rate
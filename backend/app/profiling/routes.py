@@ -0,0 +1,29 @@
+# profiling/routes.py
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from auth.services import require_admin
+from .services import list_profiles, get_profile_path, render_profile
+
+router = APIRouter(prefix="/admin/profiles", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/")
+async def list_profiles_endpoint():
+    """
+    List captured request profiles, newest first
+    """
+    return list_profiles()
+
+@router.get("/{name}")
+async def download_profile(name: str, format: str = "prof", sort_by: str = "cumulative"):
+    """
+    Download a profile as a pstats file (format=prof) or a text report (format=text)
+    """
+    path = get_profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        try:
+            return PlainTextResponse(render_profile(path, sort_by=sort_by))
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Invalid sort key: {sort_by}")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
@@ -0,0 +1,110 @@
+# profiling/sampler.py
+"""
+Statistical profiler covering every thread of the process.
+
+cProfile only hooks the thread that enables it, so it misses model inference,
+SHAP, pandas and LLM calls, which run on the scheduler, asyncio.to_thread and
+LLM guard threads. The sampler instead records the Python stack of all other
+threads every `interval` seconds and turns the samples into pstats data, so
+stored profiles read like cProfile ones: tottime is time a function was on
+top of the stack, cumtime time it was anywhere on it, and call counts are
+sample counts. Each thread's stacks sit under a "<thread name>" entry.
+
+Work of other requests running at the same time is included, and native code
+is attributed to the Python function that called it. Threads parked waiting
+for work are left out.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Innermost frames of threads that are waiting for work: (file name, function)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+}
+
+Frame = tuple[str, int, str]
+
+class SamplingProfiler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        # Stack (outermost frame first) -> seconds it was sampled for
+        self.samples: Counter[tuple[Frame, ...]] = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            # Weigh each sample by the time since the last one, the GIL can delay us
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._stack(frame)
+                if stack is None:
+                    continue
+                self.samples[(("~", 0, f"<thread {names.get(ident, ident)}>"),) + stack] += elapsed
+
+    @staticmethod
+    def _stack(frame) -> Optional[tuple[Frame, ...]]:
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def create_stats(self) -> None:
+        """Convert the samples to pstats' format; called by pstats.Stats(profiler)"""
+        # func -> [primitive calls, calls, tottime, cumtime, {caller: [same four]}]
+        stats: dict[Frame, list] = {}
+        for stack, seconds in self.samples.items():
+            count = max(round(seconds / self.interval), 1)
+            seen = set()
+            for depth, func in enumerate(stack):
+                entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                leaf = depth == len(stack) - 1
+                # Recursive functions count once per sample for their cumulative time
+                if func not in seen:
+                    seen.add(func)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if leaf:
+                    entry[2] += seconds
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[2] += seconds if leaf else 0.0
+                    caller[3] += seconds
+        self.stats = {
+            func: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+            for func, (cc, nc, tt, ct, callers) in stats.items()
+        }
+        if not self.stats:
+            # Nothing sampled, e.g. a request shorter than the interval; pstats refuses empty profiles
+            self.stats = {("~", 0, "<no samples>"): (0, 0, 0.0, 0.0, {})}
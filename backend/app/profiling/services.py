@@ -0,0 +1,91 @@
+# profiling/services.py
+import io
+import json
+import os
+import pstats
+import re
+import time
+from typing import List, Optional
+from config.settings import settings
+
+# Profile names are generated by us; anything else is rejected to avoid path traversal
+PROFILE_NAME_PATTERN = re.compile(r"^[0-9]{13}_[A-Za-z0-9_-]+\.prof$")
+
+def _profile_dir() -> str:
+    os.makedirs(settings.profiling_dir, exist_ok=True)
+    return settings.profiling_dir
+
+def _slugify(path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-")
+    return slug[:60] or "root"
+
+def profile_name(method: str, path: str) -> str:
+    return f"{int(time.time() * 1000)}_{method}_{_slugify(path)}.prof"
+
+def save_profile(profiler, name: str, method: str, path: str, status_code: int, duration_ms: float) -> None:
+    """
+    Write a captured profile (anything pstats can load) and its metadata to
+    the on-disk ring
+    """
+    directory = _profile_dir()
+    pstats.Stats(profiler).dump_stats(os.path.join(directory, name))
+
+    metadata = {
+        "name": name,
+        "method": method,
+        "path": path,
+        "status_code": status_code,
+        "duration_ms": round(duration_ms, 3),
+        "created_at": time.time(),
+    }
+    with open(os.path.join(directory, name + ".json"), "w") as f:
+        json.dump(metadata, f)
+
+    _trim_ring(directory)
+
+def _trim_ring(directory: str) -> None:
+    """Remove the oldest profiles once the ring exceeds its capacity"""
+    names = sorted(n for n in os.listdir(directory) if PROFILE_NAME_PATTERN.match(n))
+    for name in names[:max(len(names) - settings.profiling_max_profiles, 0)]:
+        for file_name in (name, name + ".json"):
+            try:
+                os.remove(os.path.join(directory, file_name))
+            except FileNotFoundError:
+                pass
+
+def list_profiles() -> List[dict]:
+    """
+    List stored profiles, newest first
+    """
+    directory = _profile_dir()
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not PROFILE_NAME_PATTERN.match(name):
+            continue
+        metadata = {"name": name}
+        try:
+            with open(os.path.join(directory, name + ".json")) as f:
+                metadata.update(json.load(f))
+        except (FileNotFoundError, ValueError):
+            pass
+        metadata["size"] = os.path.getsize(os.path.join(directory, name))
+        profiles.append(metadata)
+    return profiles
+
+def get_profile_path(name: str) -> Optional[str]:
+    """
+    Resolve a profile name to its file, or None if it does not exist
+    """
+    if not PROFILE_NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(_profile_dir(), name)
+    return path if os.path.exists(path) else None
+
+def render_profile(path: str, sort_by: str = "cumulative", limit: int = 50) -> str:
+    """
+    Render a stored profile as a pstats text report
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.strip_dirs().sort_stats(sort_by).print_stats(limit)
+    return stream.getvalue()
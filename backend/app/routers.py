@@ -1,11 +1,28 @@
 from fastapi import APIRouter
-from patient.routes import router as patient_router
+from patient.routes import router as patient_router, encryption_router
 from auth.routes import router as auth_router
 from diag.routes import router as diag_router
 from doctor.routes import router as doctor_router
+from profiling.routes import router as profiling_router
+from ml.routes import router as models_router, llm_router, scheduler_router, drift_router, threads_router
+from db.routes import router as cache_router
+from tracing.routes import router as tracing_router
+from audit.routes import router as audit_router
+from concurrency.routes import router as concurrency_router
 
 api_router = APIRouter(prefix="/api")
 api_router.include_router(patient_router)
 api_router.include_router(auth_router)
 api_router.include_router(diag_router)
-api_router.include_router(doctor_router)
\ No newline at end of file
+api_router.include_router(doctor_router)
+api_router.include_router(profiling_router)
+api_router.include_router(models_router)
+api_router.include_router(llm_router)
+api_router.include_router(scheduler_router)
+api_router.include_router(threads_router)
+api_router.include_router(drift_router)
+api_router.include_router(cache_router)
+api_router.include_router(tracing_router)
+api_router.include_router(audit_router)
+api_router.include_router(concurrency_router)
+api_router.include_router(encryption_router)
\ No newline at end of file
@@ -0,0 +1,152 @@
+# serve.py
+"""
+Production entry point: plan the CPU budget, preload models in the parent,
+then fork workers that share them copy-on-write.
+
+Usage: python serve.py --host 0.0.0.0 --port 8000 [--workers N]
+"""
+import argparse
+import gc
+import importlib.util
+import os
+import signal
+import socket
+import time
+import uvicorn
+from config.settings import settings
+from utils.system import available_cpus, available_memory_bytes, process_memory
+
+def plan_workers(requested: int) -> int:
+    """Use the requested worker count, or size the pool from cores and free memory"""
+    if requested > 0:
+        return requested
+    workers = available_cpus()
+    memory = available_memory_bytes()
+    if memory:
+        workers = min(workers, memory // (settings.server_worker_memory_mb * 1024 * 1024))
+    return max(int(workers), 1)
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(app, sock: socket.socket, args) -> None:
+    # The parent handles signals for the pool; workers only need uvicorn's defaults
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    gc.enable()
+    config = uvicorn.Config(
+        app,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        log_level=args.log_level,
+        proxy_headers=True,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+def _fork_worker(app, sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _run_worker(app, sock, args)
+        finally:
+            os._exit(0)
+    return pid
+
+def _report_memory(workers: dict[int, int]) -> None:
+    parent = process_memory(os.getpid())
+    print(f"[serve] parent pid={os.getpid()} rss={parent.get('rss', 0) // 2**20}MiB", flush=True)
+    for pid, slot in sorted(workers.items(), key=lambda item: item[1]):
+        memory = process_memory(pid)
+        print(
+            f"[serve] worker {slot} pid={pid} rss={memory.get('rss', 0) // 2**20}MiB "
+            f"pss={memory.get('pss', 0) // 2**20}MiB "
+            f"private={(memory.get('private_clean', 0) + memory.get('private_dirty', 0)) // 2**20}MiB",
+            flush=True,
+        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the XDoc API with preforked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.server_workers, help="0 sizes the pool automatically")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Keep the collector from touching (and dirtying) preloaded objects while we build them
+    gc.disable()
+
+    # Before any model or the scheduler exists, so both are sized from the plan
+    from ml.threads import configure_threads, limit_native_threads
+    worker_count = plan_workers(args.workers)
+    plan = configure_threads(worker_count)
+    print(
+        f"[serve] {plan.cpus} CPUs: {plan.workers} workers x {plan.inference_threads} inference threads "
+        f"x {plan.native_threads} native threads",
+        flush=True,
+    )
+
+    from ml import registry
+    for disease, status in registry.preload().items():
+        print(f"[serve] model {disease}: {status}", flush=True)
+    from main import app
+    # Libraries loaded by the app's imports get the limit too; forked workers inherit it
+    limit_native_threads()
+
+    # Move everything loaded so far into the permanent generation so GC in the
+    # workers never writes to those pages and they stay shared with the parent
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(args.host, args.port)
+    print(f"[serve] listening on {args.host}:{args.port} with {worker_count} workers", flush=True)
+
+    workers: dict[int, int] = {}
+    for slot in range(worker_count):
+        workers[_fork_worker(app, sock, args)] = slot
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: _report_memory(workers))
+
+    last_report = time.monotonic()
+    while workers:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            slot = workers.pop(pid, None)
+            if slot is not None and not stopping:
+                print(f"[serve] worker {slot} pid={pid} exited, restarting", flush=True)
+                # Avoid a tight restart loop if workers crash on startup
+                time.sleep(1)
+                workers[_fork_worker(app, sock, args)] = slot
+            continue
+
+        interval = settings.server_memory_report_interval
+        if interval and time.monotonic() - last_report >= interval:
+            _report_memory(workers)
+            last_report = time.monotonic()
+        time.sleep(0.5)
+
+    sock.close()
+
+if __name__ == "__main__":
+    main()
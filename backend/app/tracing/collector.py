@@ -0,0 +1,81 @@
+# tracing/collector.py
+"""
+Stand-in for an OTLP/HTTP collector, for local debugging without running a
+real one. Accepts JSON trace exports on /v1/traces, appends them to a file
+and prints a waterfall of each trace it receives.
+
+Usage (from the app directory):
+    python -m tracing.collector --port 4318 --output traces/collected.ndjson
+    TRACING_EXPORTER=otlp TRACING_SAMPLE_RATE=1 python serve.py
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def render_waterfall(spans: list[dict], width: int = 40) -> str:
+    """Text waterfall of one trace's OTLP spans"""
+    spans = sorted(spans, key=lambda s: int(s["startTimeUnixNano"]))
+    start = min(int(s["startTimeUnixNano"]) for s in spans)
+    end = max(int(s["endTimeUnixNano"]) for s in spans)
+    total = max(end - start, 1)
+    depth = {}
+    lines = []
+    for span in spans:
+        depth[span["spanId"]] = depth.get(span.get("parentSpanId"), -1) + 1
+        offset = int(span["startTimeUnixNano"]) - start
+        duration = int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])
+        bar_start = offset * width // total
+        bar = " " * bar_start + "#" * max(duration * width // total, 1)
+        marker = " !" if span.get("status", {}).get("code") == 2 else ""
+        name = "  " * depth[span["spanId"]] + span["name"]
+        lines.append(f"{name[:48]:<48} {duration / 1e6:>9.2f}ms |{bar:<{width}}|{marker}")
+    return "\n".join(lines)
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    output: str = "traces/collected.ndjson"
+
+    def do_POST(self):
+        if self.path != "/v1/traces":
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            request = json.loads(body)
+        except ValueError:
+            self.send_error(400, "Expected OTLP/JSON")
+            return
+
+        with open(self.output, "a") as f:
+            f.write(json.dumps(request, separators=(",", ":")) + "\n")
+        traces = defaultdict(list)
+        for resource in request.get("resourceSpans", []):
+            for scope in resource.get("scopeSpans", []):
+                for span in scope.get("spans", []):
+                    traces[span["traceId"]].append(span)
+        for trace_id, spans in traces.items():
+            print(f"\ntrace {trace_id}\n{render_waterfall(spans)}", flush=True)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local OTLP/HTTP JSON trace collector")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--output", default="traces/collected.ndjson")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    CollectorHandler.output = args.output
+    print(f"Collecting traces on http://{args.host}:{args.port}/v1/traces into {args.output}")
+    ThreadingHTTPServer((args.host, args.port), CollectorHandler).serve_forever()
+
+if __name__ == "__main__":
+    main()
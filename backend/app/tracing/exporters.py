@@ -0,0 +1,140 @@
+# tracing/exporters.py
+"""
+Trace exporters. Finished traces are converted to OTLP/JSON and handed to a
+background thread, so requests never wait on disk or network. When the queue
+is full, traces are dropped and counted.
+"""
+import abc
+import json
+import os
+import queue
+import urllib.request
+from typing import Optional
+from config.settings import settings
+from utils.background import BackgroundThreads
+from .spans import Trace, Span
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def _otlp_span(span: Span) -> dict:
+    data = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        # Server for the request itself, internal for everything below it
+        "kind": 2 if span is span.trace.root else 1,
+        "startTimeUnixNano": str(span.start),
+        "endTimeUnixNano": str(span.end or span.start),
+        "attributes": [_attribute(k, v) for k, v in {**span.attributes, "thread.name": span.thread}.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+def to_otlp(traces: list[Trace]) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for a batch of traces"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            _attribute("service.name", settings.tracing_service_name),
+            _attribute("process.pid", os.getpid()),
+        ]},
+        "scopeSpans": [{
+            "scope": {"name": "xdoc.tracing"},
+            "spans": [_otlp_span(span) for trace in traces for span in list(trace.spans)],
+        }],
+    }]}
+
+class _BackgroundExporter(abc.ABC):
+    def __init__(self, max_queue: int = 1000, batch_size: int = 50):
+        self._queue: queue.Queue[Trace] = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = BackgroundThreads(self._run, "trace-exporter")
+
+    def export(self, trace: Trace) -> None:
+        self._thread.ensure_started()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Trace export failed: {e}")
+
+    @abc.abstractmethod
+    def write(self, traces: list[Trace]) -> None:
+        """Deliver a batch of traces; exceptions count the batch as failed"""
+
+    def stats(self) -> dict:
+        return {"exporter": type(self).__name__, "queued": self._queue.qsize(), "exported": self.exported,
+                "dropped": self.dropped, "failed": self.failed}
+
+class FileExporter(_BackgroundExporter):
+    """One OTLP/JSON document per trace per line, rotated like a log file"""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def _rotate(self) -> None:
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def write(self, traces: list[Trace]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        with open(self.path, "a") as f:
+            for trace in traces:
+                f.write(json.dumps(to_otlp([trace]), separators=(",", ":")) + "\n")
+
+class OTLPExporter(_BackgroundExporter):
+    """POSTs batches to an OTLP/HTTP collector (JSON encoding)"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        super().__init__()
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def write(self, traces: list[Trace]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(to_otlp(traces)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+def create_exporter() -> Optional[_BackgroundExporter]:
+    if settings.tracing_exporter == "file":
+        return FileExporter(settings.tracing_file, settings.tracing_file_max_bytes, settings.tracing_file_backups)
+    if settings.tracing_exporter == "otlp":
+        return OTLPExporter(settings.tracing_otlp_endpoint)
+    return None
@@ -0,0 +1,88 @@
+# tracing/middleware.py
+import random
+import re
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth.services import is_admin_token
+from config.settings import settings
+from .exporters import create_exporter
+from .spans import start_trace, set_exporter
+
+# W3C trace context: version-traceid-parentid-flags
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str, bool]]:
+    match = TRACEPARENT_PATTERN.match(value or "")
+    if not match:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+def route_template(scope: Scope) -> Optional[str]:
+    """
+    Full template of the matched route, e.g. /api/diagnosis/explain/{diag_id}.
+    The route in the scope may belong to an included router and only know its
+    own part of the path, so the prefix is taken from the request path.
+    """
+    route = scope.get("route")
+    regex = getattr(route, "path_regex", None)
+    if regex is None:
+        return None
+    path = scope["path"]
+    for i, char in enumerate(path):
+        if char == "/" and regex.match(path[i:]):
+            return path[:i] + route.path
+    return None
+
+class TracingMiddleware:
+    """
+    Opens the root span of sampled requests. Must be the outermost middleware
+    so tenant resolution and everything below it is inside the trace.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        set_exporter(create_exporter())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        parent = parse_traceparent(headers.get("traceparent"))
+        if not self._should_trace(headers, parent):
+            return await self.app(scope, receive, send)
+
+        trace_id, parent_id = (parent[0], parent[1]) if parent else (None, None)
+        method = scope["method"]
+        with start_trace(f"{method} {scope['path']}", trace_id, parent_id,
+                         **{"http.method": method, "http.target": scope["path"]}) as root:
+            async def send_with_trace(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    root.set(**{"http.status_code": message["status"]})
+                    message.setdefault("headers", [])
+                    message["headers"] = [
+                        *message["headers"],
+                        (b"x-trace-id", root.trace.trace_id.encode()),
+                        (b"traceparent", f"00-{root.trace.trace_id}-{root.span_id}-01".encode()),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                # Name the trace after the matched route template rather than the raw path
+                template = route_template(scope)
+                if template:
+                    root.name = f"{method} {template}"
+                    root.set(**{"http.route": template})
+
+    @staticmethod
+    def _should_trace(headers: Headers, parent: Optional[tuple[str, str, bool]]) -> bool:
+        # A caller that sampled its side of the trace wants ours too
+        if parent and parent[2]:
+            return True
+        if headers.get("X-Trace") and is_admin_token(headers.get("X-Admin-Token")):
+            return True
+        rate = settings.tracing_sample_rate
+        return rate > 0 and random.random() < rate
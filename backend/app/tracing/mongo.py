@@ -0,0 +1,36 @@
+# tracing/mongo.py
+"""
+Spans for MongoDB commands, from pymongo's command monitoring. Motor runs
+pymongo in a thread pool with the caller's context copied, so the started
+event sees the request's current span.
+"""
+from pymongo import monitoring
+from .spans import start_span
+
+class CommandTracer(monitoring.CommandListener):
+    def __init__(self):
+        # (connection, request id) -> open span; started and finished events
+        # for one command arrive on the same thread
+        self._spans = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        span = start_span(
+            f"mongo.{event.command_name}",
+            **{"db.name": event.database_name, "db.collection": str(event.command.get(event.command_name, ""))},
+        )
+        if span is not None:
+            self._spans[(event.connection_id, event.request_id)] = span
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.finish()
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.set(**{"db.error_code": str(event.failure.get("code", ""))})
+            span.error = str(event.failure.get("errmsg", "command failed"))
+            span.finish()
+
+command_tracer = CommandTracer()
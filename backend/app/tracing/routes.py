@@ -0,0 +1,47 @@
+# tracing/routes.py
+from fastapi import APIRouter, Depends, HTTPException
+from auth.services import require_admin
+from .spans import recent_traces, exporter_stats
+
+router = APIRouter(prefix="/admin/traces", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/")
+async def list_traces(limit: int = 20, min_duration_ms: float = 0.0):
+    """
+    Recently finished traces held by this worker, slowest first
+    """
+    traces = [t for t in list(recent_traces) if t.root and (t.root.duration_ms or 0) >= min_duration_ms]
+    traces.sort(key=lambda t: t.root.duration_ms or 0, reverse=True)
+    return {
+        "exporter": exporter_stats(),
+        "traces": [
+            {"trace_id": t.trace_id, "name": t.root.name, "duration_ms": round(t.root.duration_ms or 0, 3),
+             "spans": len(t.spans), "errors": sum(1 for s in t.spans if s.error)}
+            for t in traces[:limit]
+        ],
+    }
+
+@router.get("/{trace_id}")
+async def get_trace(trace_id: str):
+    """
+    Waterfall of one trace: spans in start order with their offset from the request start and nesting depth
+    """
+    trace = next((t for t in list(recent_traces) if t.trace_id == trace_id), None)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found or no longer held")
+    start = trace.root.start
+    depths = {trace.root.span_id: 0}
+    waterfall = []
+    for span in sorted(trace.spans, key=lambda s: s.start):
+        depth = depths.get(span.parent_id, -1) + 1 if span is not trace.root else 0
+        depths[span.span_id] = depth
+        waterfall.append({
+            "name": span.name,
+            "depth": depth,
+            "offset_ms": round((span.start - start) / 1e6, 3),
+            "duration_ms": round(span.duration_ms, 3) if span.end else None,
+            "thread": span.thread,
+            "attributes": span.attributes,
+            "error": span.error,
+        })
+    return {"trace_id": trace_id, "name": trace.root.name, "duration_ms": trace.root.duration_ms, "spans": waterfall}
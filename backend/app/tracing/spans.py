@@ -0,0 +1,164 @@
+# tracing/spans.py
+"""
+Request-scoped tracing spans.
+
+The current span is kept in a context variable, like the tenant in
+hospital/context.py, so it follows the request into awaited calls, worker
+threads started with asyncio.to_thread and the inference scheduler (which
+runs jobs in the submitter's context). When the request isn't sampled no
+span is current and span() does nothing.
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+from config.settings import settings
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "root")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: list["Span"] = []
+        self.root: Optional["Span"] = None
+
+    def to_dict(self) -> dict:
+        root = self.root
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name if root else None,
+            "start": root.start if root else None,
+            "duration_ms": root.duration_ms if root else None,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attributes", "error", "thread")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time_ns()
+        self.end: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.thread = threading.current_thread().name
+        # list.append is atomic, spans may finish on other threads
+        trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return (self.end - self.start) / 1e6 if self.end else None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self is self.trace.root:
+            _finish_trace(self.trace)
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "attributes": self.attributes,
+            "error": self.error,
+            "thread": self.thread,
+        }
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+# Finished traces kept for the admin endpoints, and the exporter they go to
+recent_traces: deque[Trace] = deque(maxlen=settings.tracing_recent_traces)
+_exporter = None
+
+def set_exporter(exporter) -> None:
+    global _exporter
+    _exporter = exporter
+
+def exporter_stats() -> dict:
+    return _exporter.stats() if _exporter is not None else {"exporter": None}
+
+def _finish_trace(trace: Trace) -> None:
+    recent_traces.append(trace)
+    if _exporter is not None:
+        _exporter.export(trace)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """
+    Start a child of the current span without making it current, for work that
+    is started and finished in different places. Returns None when not tracing.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+@contextmanager
+def start_trace(name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes):
+    """Open the root span of a sampled request"""
+    trace = Trace(trace_id or os.urandom(16).hex())
+    root = Span(trace, name, parent_id, attributes)
+    trace.root = root
+    token = _current_span.set(root)
+    error = None
+    try:
+        yield root
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        root.finish(error)
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child span of the current span for the duration of the block"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current_span.set(child)
+    error = None
+    try:
+        yield child
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish(error)
+
+def traced(name: str) -> Callable:
+    """Decorator form of span() for sync and async functions"""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,36 @@
+# utils/background.py
+import threading
+from typing import Callable
+
+class BackgroundThreads:
+    """
+    Daemon threads running `target`, started on first use instead of at import.
+
+    Server workers are forked after the app is imported and threads don't
+    survive a fork, so starting lazily gives every worker its own threads.
+    ensure_started() also replaces threads that died, e.g. in a forked child
+    of a process that had already started them.
+    """
+
+    def __init__(self, target: Callable[[], None], name: str, count: int = 1):
+        self.target = target
+        self.name = name
+        self.count = count
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def _alive(self) -> bool:
+        return len(self._threads) == self.count and all(thread.is_alive() for thread in self._threads)
+
+    def ensure_started(self) -> None:
+        if self._alive():
+            return
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            names = {thread.name for thread in self._threads}
+            for i in range(self.count):
+                name = self.name if self.count == 1 else f"{self.name}-{i}"
+                if name not in names:
+                    thread = threading.Thread(target=self.target, name=name, daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
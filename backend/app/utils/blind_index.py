@@ -0,0 +1,66 @@
+# utils/blind_index.py
+"""
+Keyed-HMAC blind indexes for encrypted fields.
+
+The ciphertext of a Fernet-encrypted field is randomized, so it cannot be
+queried. Alongside it we store HMAC tokens of the normalized plaintext: the
+same input always yields the same token, which Mongo can index, while the
+tokens reveal nothing without the key.
+"""
+import hashlib
+import hmac
+import re
+import unicodedata
+from functools import lru_cache
+from config.settings import settings
+
+# Shortest word prefix that gets its own token
+MIN_PREFIX_LENGTH = 2
+
+@lru_cache(maxsize=1)
+def _index_key() -> bytes:
+    if settings.blind_index_key:
+        return settings.blind_index_key.encode()
+    # Derived from, but distinct from, the JWT secret
+    return hmac.new(settings.jwt_secret_key.encode(), b"xdoc-blind-index", hashlib.sha256).digest()
+
+def normalize_name(name: str) -> str:
+    """
+    Lowercase, strip Vietnamese diacritics (including đ) and collapse whitespace,
+    so "Nguyễn  Văn Đức" and "nguyen van duc" normalize identically
+    """
+    name = name.replace("đ", "d").replace("Đ", "D")
+    name = unicodedata.normalize("NFD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r"[^a-z0-9 ]+", " ", name.lower())
+    return " ".join(name.split())
+
+def blind_token(kind: str, value: str) -> str:
+    digest = hmac.new(_index_key(), f"{kind}:{value}".encode(), hashlib.sha256).hexdigest()
+    return digest[:32]
+
+def name_exact_token(name: str) -> str:
+    return blind_token("exact", normalize_name(name))
+
+def name_search_tokens(name: str) -> list[str]:
+    """Tokens for every prefix (at least MIN_PREFIX_LENGTH long) of every word"""
+    tokens = set()
+    for word in normalize_name(name).split():
+        for length in range(MIN_PREFIX_LENGTH, len(word) + 1):
+            tokens.add(blind_token("prefix", word[:length]))
+        if len(word) < MIN_PREFIX_LENGTH:
+            tokens.add(blind_token("prefix", word))
+    return sorted(tokens)
+
+def name_query_tokens(query: str) -> list[str]:
+    """
+    Tokens to match with $all: each query word must prefix some word of the
+    name, in any order ("van ngu" finds "Nguyễn Văn An"). Words shorter than
+    MIN_PREFIX_LENGTH have no prefix tokens to match, so they are ignored.
+    """
+    words = [word for word in normalize_name(query).split() if len(word) >= MIN_PREFIX_LENGTH]
+    return sorted({blind_token("prefix", word) for word in words})
+
+def name_index_fields(name: str) -> dict:
+    """Blind-index fields stored next to the encrypted name"""
+    return {"name_bidx": name_exact_token(name), "name_tokens": name_search_tokens(name)}
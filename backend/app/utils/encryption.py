@@ -1,41 +1,95 @@
 # utils/encryption.py
-from cryptography.fernet import Fernet
+"""
+Versioned Fernet encryption of sensitive fields.
+
+Ciphertexts are stored as "<key id>:<fernet token>", so each value names the
+key that decrypts it and keys can be rotated without a flag day: new values
+are encrypted with `encryption_active_key`, older keys stay in
+`encryption_keys` for decryption until patient.rotation has re-encrypted
+every document. Values written before key ids existed have no prefix and
+belong to key "0", the key derived from jwt_secret_key.
+"""
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
 import os
+from functools import lru_cache
 from config.settings import settings
 
-# Generate a key from the secret key in settings
-def get_encryption_key():
+LEGACY_KEY_ID = "0"
+SEPARATOR = ":"
+
+def key_secret(key_id: str) -> str:
+    secret = settings.encryption_keys.get(key_id)
+    if secret is None and key_id == LEGACY_KEY_ID:
+        return settings.jwt_secret_key
+    if secret is None:
+        raise KeyError(f"Unknown encryption key id: {key_id}")
+    return secret
+
+# Generate a key from the secret key in settings.
+# PBKDF2 is deliberately slow, so derive once per process and key instead of per field.
+@lru_cache(maxsize=None)
+def get_encryption_key(key_id: str = LEGACY_KEY_ID):
     salt = b'xdoc_salt_for_encryption'  # In production, this should be stored securely
+    if key_id != LEGACY_KEY_ID:
+        salt += f":{key_id}".encode()
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
         iterations=100000,
     )
-    key = base64.urlsafe_b64encode(kdf.derive(settings.jwt_secret_key.encode()))
+    key = base64.urlsafe_b64encode(kdf.derive(key_secret(key_id).encode()))
     return key
 
-# Create a Fernet cipher using the key
-def get_cipher():
-    key = get_encryption_key()
-    return Fernet(key)
+# Create a Fernet cipher per key version
+@lru_cache(maxsize=None)
+def get_cipher(key_id: str = LEGACY_KEY_ID):
+    return Fernet(get_encryption_key(key_id))
+
+def key_ids() -> list[str]:
+    """Configured key ids, the active one first"""
+    ids = [settings.encryption_active_key, LEGACY_KEY_ID, *settings.encryption_keys]
+    return list(dict.fromkeys(ids))
+
+@lru_cache(maxsize=1)
+def _fallback_cipher() -> MultiFernet:
+    # Only for values whose key id is unknown or missing
+    return MultiFernet([get_cipher(key_id) for key_id in key_ids()])
+
+def key_id_of(encrypted_data: str) -> str:
+    key_id, separator, _ = encrypted_data.partition(SEPARATOR)
+    # Fernet tokens are urlsafe base64, so they never contain the separator
+    return key_id if separator else LEGACY_KEY_ID
+
+def needs_reencryption(encrypted_data) -> bool:
+    return bool(encrypted_data) and isinstance(encrypted_data, str) \
+        and key_id_of(encrypted_data) != settings.encryption_active_key
 
 def encrypt_data(data: str) -> str:
-    """Encrypt a string using Fernet symmetric encryption"""
+    """Encrypt a string with the active key"""
     if not data:
         return data
-    cipher = get_cipher()
-    return cipher.encrypt(data.encode()).decode()
+    key_id = settings.encryption_active_key
+    return f"{key_id}{SEPARATOR}{get_cipher(key_id).encrypt(data.encode()).decode()}"
 
 def decrypt_data(encrypted_data: str) -> str:
-    """Decrypt a string that was encrypted with Fernet"""
+    """Decrypt a string with the key its prefix names"""
     if not encrypted_data:
         return encrypted_data
-    cipher = get_cipher()
-    return cipher.decrypt(encrypted_data.encode()).decode()
+    key_id, separator, token = encrypted_data.partition(SEPARATOR)
+    if not separator:
+        key_id, token = LEGACY_KEY_ID, encrypted_data
+    try:
+        return get_cipher(key_id).decrypt(token.encode()).decode()
+    except (KeyError, InvalidToken):
+        return _fallback_cipher().decrypt(token.encode()).decode()
+
+def reencrypt_data(encrypted_data: str) -> str:
+    """Re-encrypt a value with the active key"""
+    return encrypt_data(decrypt_data(encrypted_data))
 
 def encrypt_dict_fields(data: dict, fields_to_encrypt: list) -> dict:
     """Encrypt specified fields in a dictionary"""
@@ -51,4 +105,8 @@ def decrypt_dict_fields(data: dict, fields_to_decrypt: list) -> dict:
     for field in fields_to_decrypt:
         if field in result and result[field]:
             result[field] = decrypt_data(result[field])
-    return result
\ No newline at end of file
+    return result
+
+def reencrypt_dict_fields(data: dict, fields: list) -> dict:
+    """New ciphertexts for the fields of `data` not encrypted with the active key"""
+    return {field: reencrypt_data(data[field]) for field in fields if needs_reencryption(data.get(field))}
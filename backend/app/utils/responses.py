@@ -0,0 +1,72 @@
+# utils/responses.py
+"""
+Fast JSON responses. Uses orjson when installed (falls back to the standard
+json module) and serializes ObjectId, datetime and Enum values natively, so
+trusted data can skip Pydantic validation and jsonable_encoder entirely.
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterable, Type
+from bson import ObjectId
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """Default response class for the app"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streaming response whose body is generated while the request body is still
+    being read (e.g. per-line results of an NDJSON upload). StreamingResponse
+    listens for a disconnect on `receive` concurrently, which would consume the
+    request body, so this variant only streams.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def projection_for(model: Type[BaseModel]) -> dict:
+    """Mongo projection that fetches only the fields a response model exposes"""
+    projection = {field.alias or name: 1 for name, field in model.model_fields.items()}
+    projection.setdefault("_id", 0)
+    return projection
+
+def trusted_response(documents: Iterable[dict], model: Type[BaseModel], status_code: int = 200) -> FastJSONResponse:
+    """
+    Build a response from documents read from our own database without
+    re-validating them: keep the model's fields (by alias), fill in defaults
+    for missing optional fields and serialize directly.
+    """
+    fields = [
+        (field.alias or name, None if field.is_required() else field.get_default(call_default_factory=True))
+        for name, field in model.model_fields.items()
+    ]
+    content = [{key: document.get(key, default) for key, default in fields} for document in documents]
+    return FastJSONResponse(content=content, status_code=status_code)
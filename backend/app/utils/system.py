@@ -0,0 +1,76 @@
+# utils/system.py
+import os
+from typing import Optional
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """
+    CPUs granted by the cgroup's CFS quota (e.g. docker --cpus or a Kubernetes
+    CPU limit), or None when the cgroup is unlimited or can't be read
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means unlimited
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+def available_cpus() -> int:
+    """
+    Number of CPUs this process can keep busy: its CPU affinity, capped by the
+    cgroup quota. A fractional quota is rounded down, since running more
+    threads than the quota gets the whole cgroup throttled.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, int(quota))
+    return max(cpus, 1)
+
+def available_memory_bytes() -> Optional[int]:
+    """MemAvailable from /proc/meminfo, or None where it cannot be read"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def process_memory(pid: int) -> dict:
+    """
+    Resident memory of a process in bytes. Pss and the shared/private split
+    show how much of the RSS is actually shared with the parent after fork.
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared_clean",
+              "Shared_Dirty": "shared_dirty", "Private_Clean": "private_clean",
+              "Private_Dirty": "private_dirty"}
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    memory[fields[key]] = int(rest.split()[0]) * 1024
+    except OSError:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        memory["rss"] = int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return memory
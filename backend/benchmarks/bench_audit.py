@@ -0,0 +1,124 @@
+# benchmarks/bench_audit.py
+"""
+Audit logging overhead under load: request latency and throughput with no
+audit, with a synchronous insert_one per access, and with the batched
+audit log (audit.log.AuditLog).
+
+By default MongoDB is simulated by a collection whose operations take
+--latency-ms each, so the numbers depend only on round trips. Pass
+--mongo-uri to run against a real server instead.
+
+Usage (from the backend directory):
+    GEMINI_API_KEY=x python benchmarks/bench_audit.py
+    GEMINI_API_KEY=x python benchmarks/bench_audit.py --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from audit.log import AuditLog, COLLECTION
+
+class SimulatedCollection:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.documents = 0
+
+    async def find_one(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return {"_id": "p1", "name": "encrypted"}
+
+    async def insert_one(self, document):
+        self.calls += 1
+        self.documents += 1
+        await asyncio.sleep(self.latency)
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls += 1
+        self.documents += len(documents)
+        await asyncio.sleep(self.latency)
+
+class SimulatedDatabase(dict):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def __getitem__(self, name):
+        if name not in self:
+            self[name] = SimulatedCollection(self.latency)
+        return super().__getitem__(name)
+
+async def run_load(db, mode: str, audit: AuditLog, requests: int, concurrency: int) -> tuple[list[float], float]:
+    patients = db["patients"]
+    audit_collection = db[COLLECTION]
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def request(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await patients.find_one({"_id": "p1"})
+            if mode == "sync":
+                await audit_collection.insert_one({"action": "read", "resource": "patient", "id": f"p{i}", "actor": "d@x.com"})
+            elif mode == "batched":
+                audit.record("read", "patient", f"p{i}", "d@x.com", "DOCTOR")
+            timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(requests)))
+    return timings, time.perf_counter() - start
+
+async def main_async(args) -> None:
+    if args.mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_uri)
+        db = client["xdoc_audit_bench"]
+        await db["patients"].replace_one({"_id": "p1"}, {"_id": "p1", "name": "encrypted"}, upsert=True)
+    else:
+        db = SimulatedDatabase(args.latency_ms / 1000)
+
+    spill_path = os.path.join(tempfile.mkdtemp(), "audit_spill.ndjson")
+    print(f"{'mode':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'audit writes':>13}")
+    for mode in ("none", "sync", "batched"):
+        audit = AuditLog(buffer_size=100_000, batch_size=args.batch_size, flush_interval=0.5, spill_path=spill_path)
+        flusher = asyncio.create_task(audit.run(db)) if mode == "batched" else None
+        writes_before = getattr(db[COLLECTION], "calls", 0)
+        timings, elapsed = await run_load(db, mode, audit, args.requests, args.concurrency)
+        if flusher:
+            await audit.close(timeout=10)
+            flusher.cancel()
+        timings.sort()
+        writes = getattr(db[COLLECTION], "calls", 0) - writes_before
+        print(
+            f"{mode:>8} {len(timings) / elapsed:>9.0f} {statistics.median(timings):>8.2f} "
+            f"{timings[int(len(timings) * 0.99) - 1]:>8.2f} {writes if not args.mongo_uri else '-':>13}"
+        )
+
+    # Cost of the enqueue itself
+    audit = AuditLog(buffer_size=10_000_000, batch_size=10_000_000, flush_interval=1, spill_path=spill_path)
+    count = 100_000
+    start = time.perf_counter()
+    for i in range(count):
+        audit.record("read", "patient", f"p{i}", "d@x.com", "DOCTOR")
+    print(f"record(): {(time.perf_counter() - start) / count * 1e6:.2f} us per event")
+
+    if args.mongo_uri:
+        await client.drop_database("xdoc_audit_bench")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure audit logging overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Simulated MongoDB round trip")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--mongo-uri", help="Benchmark against a real MongoDB instead")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/bench_concurrency.py
+"""
+Adaptive concurrency limiting under overload: an open-loop stream of
+requests arrives faster than a simulated backend (a fixed pool of workers
+with a fixed service time) can serve them, with and without
+ConcurrencyLimitMiddleware in front.
+
+Without the limiter every request queues, so latency grows for as long as the
+overload lasts. With it, excess requests get an immediate 503 and admitted
+requests stay close to the service time. A share of the traffic is sent with
+a doctor token to show the reserved headroom.
+
+Usage (from the backend directory):
+    GEMINI_API_KEY=x python benchmarks/bench_concurrency.py
+    GEMINI_API_KEY=x python benchmarks/bench_concurrency.py --workers 16 --service-ms 20 --overload 3
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from auth.services import create_access_token
+from concurrency.limiter import ConcurrencyLimits
+from concurrency import middleware
+
+def simulated_app(workers: int, service: float):
+    pool = asyncio.Semaphore(workers)
+
+    async def app(scope, receive, send):
+        async with pool:
+            await asyncio.sleep(service)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+    return app
+
+async def run_load(app, rate: float, duration: float, doctor_share: float, tokens: dict) -> dict:
+    results = {"doctor": [], "patient": []}
+    shed = {"doctor": 0, "patient": 0}
+
+    async def request(kind: str) -> None:
+        scope = {
+            "type": "http", "method": "POST", "path": "/api/diagnosis/predict/diabetes/", "query_string": b"",
+            "headers": [(b"authorization", f"Bearer {tokens[kind]}".encode())],
+        }
+        status = {}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        if status["code"] == 503:
+            shed[kind] += 1
+        else:
+            results[kind].append((time.perf_counter() - start) * 1000)
+
+    # Poisson arrivals; everything due since the last tick is started at once,
+    # since sleeping per arrival can't keep up with high rates
+    tasks = []
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival < start + duration:
+        while next_arrival <= time.perf_counter():
+            kind = "doctor" if random.random() < doctor_share else "patient"
+            tasks.append(asyncio.create_task(request(kind)))
+            next_arrival += random.expovariate(rate)
+        await asyncio.sleep(0.001)
+    await asyncio.gather(*tasks)
+    return {"latencies": results, "shed": shed}
+
+def report(label: str, outcome: dict, duration: float) -> None:
+    print(label)
+    for kind, latencies in outcome["latencies"].items():
+        sent = len(latencies) + outcome["shed"][kind]
+        if not sent:
+            continue
+        latencies = sorted(latencies)
+        p50 = statistics.median(latencies) if latencies else float("nan")
+        p99 = latencies[int(len(latencies) * 0.99)] if latencies else float("nan")
+        print(f"  {kind:8s} sent {sent:6d}  served {len(latencies) / duration:7.0f}/s  "
+              f"shed {outcome['shed'][kind] / sent:6.1%}  p50 {p50:8.1f} ms  p99 {p99:8.1f} ms")
+
+async def main_async(args) -> None:
+    service = args.service_ms / 1000
+    capacity = args.workers / service
+    rate = capacity * args.overload
+    tokens = {
+        "doctor": create_access_token({"sub": "d@x.com", "role": "DOCTOR"}),
+        "patient": create_access_token({"sub": "p@x.com", "role": "PATIENT"}),
+    }
+    print(f"capacity {capacity:.0f} req/s, offered {rate:.0f} req/s for {args.duration:.0f}s, "
+          f"{args.doctor_share:.0%} doctor traffic")
+
+    outcome = await run_load(simulated_app(args.workers, service), rate, args.duration, args.doctor_share, tokens)
+    report("no limiter", outcome, args.duration)
+
+    # Fresh limiters, so the run starts from the configured initial limits
+    middleware.concurrency_limits = limits = ConcurrencyLimits()
+    app = middleware.ConcurrencyLimitMiddleware(simulated_app(args.workers, service))
+    outcome = await run_load(app, rate, args.duration, args.doctor_share, tokens)
+    report("adaptive limiter", outcome, args.duration)
+    print(f"  final limit {limits.limiters['prediction'].stats()}")
+
+    # Cost of admitting a request through the middleware
+    async def noop(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+    app = middleware.ConcurrencyLimitMiddleware(noop)
+    scope = {"type": "http", "method": "GET", "path": "/api/patients/", "query_string": b"",
+             "headers": [(b"authorization", f"Bearer {tokens['doctor']}".encode())]}
+
+    async def send(message):
+        pass
+    start = time.perf_counter()
+    for _ in range(10000):
+        await app(scope, None, send)
+    print(f"middleware overhead {(time.perf_counter() - start) / 10000 * 1e6:.1f} us/request")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8, help="Requests the simulated backend serves at once")
+    parser.add_argument("--service-ms", type=float, default=20.0, help="Service time per request")
+    parser.add_argument("--overload", type=float, default=2.0, help="Offered load as a multiple of capacity")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--doctor-share", type=float, default=0.3)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
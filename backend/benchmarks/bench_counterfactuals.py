@@ -0,0 +1,70 @@
+# benchmarks/bench_counterfactuals.py
+"""
+Counterfactual search latency on representative inputs: patients from the
+training sets that the models place above the lowest risk class. Also times
+scoring the first search level row by row, to show what batching saves.
+
+Usage (from the backend directory):
+    GEMINI_API_KEY=x python benchmarks/bench_counterfactuals.py
+"""
+import os
+import statistics
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(__file__), "..", "app")
+sys.path.insert(0, APP)
+os.environ.setdefault("MODEL_DIR", os.path.join(APP, "pretrained"))
+
+import pandas as pd
+from ml import get_predictor
+from ml.counterfactual import CounterfactualSearch, MOVES, candidate_moves
+
+TRAINING = os.path.join(os.path.dirname(__file__), "..", "training")
+SAMPLES = 50
+LOOP_SAMPLES = 5
+
+def load_inputs(disease: str, predictor) -> list[dict]:
+    if disease == "diabetes":
+        frame = pd.read_csv(os.path.join(TRAINING, "diabetes.csv"))
+        features = predictor.features
+    else:
+        frame = pd.read_csv(os.path.join(TRAINING, "imputed_heart_disease.csv"))
+        features = predictor.FEATURES
+    frame = frame[features]
+    probs, _ = predictor.predict_batch(frame, with_shap=False)
+    # Only inputs there is something to improve on
+    return frame[probs.argmax(axis=1) > 0].head(SAMPLES).to_dict("records")
+
+def row_by_row_ms(predictor, disease: str, base: dict) -> float:
+    features, move_feature, move_value, _ = candidate_moves(base, MOVES[disease])
+    start = time.perf_counter()
+    for feature_index, value in zip(move_feature, move_value):
+        predictor.predict_batch(pd.DataFrame([{**base, features[feature_index]: value}]), with_shap=False)
+    return (time.perf_counter() - start) * 1000
+
+def main() -> None:
+    print(f"{'model':>15} {'inputs':>7} {'found':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'candidates':>11} {'level 1 loop ms':>16}")
+    for disease in ("diabetes", "cardiovascular"):
+        predictor = get_predictor(disease)
+        inputs = load_inputs(disease, predictor)
+        search = CounterfactualSearch(predictor, disease)
+        search.search(inputs[0])  # warm up
+
+        timings, found, candidates = [], 0, []
+        for base in inputs:
+            start = time.perf_counter()
+            result = search.search(base)
+            timings.append((time.perf_counter() - start) * 1000)
+            found += bool(result["counterfactuals"])
+            candidates.append(result["evaluated"])
+        timings.sort()
+        loop = statistics.median(row_by_row_ms(predictor, disease, base) for base in inputs[:LOOP_SAMPLES])
+        print(
+            f"{disease:>15} {len(inputs):>7} {found:>6} {statistics.median(timings):>8.1f} "
+            f"{timings[int(len(timings) * 0.95) - 1]:>8.1f} {timings[-1]:>8.1f} "
+            f"{statistics.median(candidates):>11.0f} {loop:>16.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_list_responses.py
+"""
+List-response latency: FastAPI response_model validation + standard JSON
+versus the trusted fast path (utils.responses.trusted_response).
+
+Usage (from the backend directory):
+    GEMINI_API_KEY=x python benchmarks/bench_list_responses.py
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from patient.models import PatientBaseModel
+from utils.responses import FastJSONResponse, trusted_response, orjson
+
+SIZES = (100, 1_000, 10_000)
+REPEAT = 20
+
+def make_documents(n: int) -> list[dict]:
+    return [
+        {"_id": ObjectId(), "name": f"Nguyễn Văn {i}", "dob": datetime(1980, 1, 1 + i % 28),
+         "gender": "MALE" if i % 2 else "FEMALE", "age": 20 + i % 60}
+        for i in range(n)
+    ]
+
+def build_app(documents: list[dict]) -> FastAPI:
+    validated = FastAPI(default_response_class=JSONResponse)
+    fast = FastAPI(default_response_class=FastJSONResponse)
+
+    @validated.get("/patients", response_model=list[PatientBaseModel])
+    async def validated_list():
+        return documents
+
+    @fast.get("/patients", response_model=list[PatientBaseModel])
+    async def fast_list():
+        return trusted_response(documents, PatientBaseModel)
+
+    return validated, fast
+
+def measure(client: TestClient) -> list[float]:
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        response = client.get("/patients")
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+    return timings
+
+def main() -> None:
+    print(f"orjson: {'yes' if orjson else 'no (stdlib json fallback)'}")
+    print(f"{'docs':>7} {'path':>10} {'p50 ms':>9} {'p95 ms':>9}")
+    for size in SIZES:
+        validated, fast = build_app(make_documents(size))
+        for label, app in (("validated", validated), ("trusted", fast)):
+            timings = sorted(measure(TestClient(app)))
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{size:>7} {label:>10} {statistics.median(timings):>9.2f} {p95:>9.2f}")
+
+if __name__ == "__main__":
+    main()
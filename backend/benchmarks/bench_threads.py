@@ -0,0 +1,120 @@
+# benchmarks/bench_threads.py
+"""
+Prediction latency under different CPU thread budgets: W worker processes,
+each running I inference threads that score single-row predictions with
+SHAP (what an interactive request does) back to back, with XGBoost and the
+OpenMP/BLAS pools limited to N threads per job.
+
+"planned" rows use ml.threads.plan_threads for W workers; "library defaults"
+rows are what a worker got before the planner: min(CPUs, 4) inference
+threads and native pools sized to every core, so W x I x CPUs threads
+compete for the CPUs.
+
+Usage (from the backend directory):
+    GEMINI_API_KEY=x python benchmarks/bench_threads.py
+    GEMINI_API_KEY=x python benchmarks/bench_threads.py --workers 1 2 4 --native 1 2 4 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+
+APP = os.path.join(os.path.dirname(__file__), "..", "app")
+sys.path.insert(0, APP)
+os.environ.setdefault("MODEL_DIR", os.path.join(APP, "pretrained"))
+os.environ.setdefault("GEMINI_API_KEY", "x")
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS")
+
+def worker(disease: str, inference_threads: int, native_threads: int, duration: float, start, results) -> None:
+    # Spawned, so limits set here apply before NumPy and XGBoost load their pools
+    for name in THREAD_ENV_VARS:
+        if native_threads:
+            os.environ[name] = str(native_threads)
+        else:
+            os.environ.pop(name, None)
+    from threadpoolctl import threadpool_limits
+    from ml.registry import load_predictor, read_manifest
+
+    predictor = load_predictor(disease, read_manifest()[disease])
+    # 0 keeps the library defaults: XGBoost and OpenMP use every core
+    predictor.set_threads(native_threads or os.cpu_count())
+    threadpool_limits(limits=native_threads or os.cpu_count())
+    predictor.warm_up()
+    sample = predictor.WARMUP_SAMPLE
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def loop(deadline: float) -> None:
+        local = []
+        while time.perf_counter() < deadline:
+            begin = time.perf_counter()
+            predictor.predict(sample)
+            local.append((time.perf_counter() - begin) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    start.wait()
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=loop, args=(deadline,)) for _ in range(inference_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(latencies)
+
+def run(disease: str, workers: int, inference_threads: int, native_threads: int, duration: float) -> dict:
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(disease, inference_threads, native_threads, duration, start, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    # Model loading takes a while; start the clock once every worker could be ready
+    time.sleep(5 + workers)
+    start.set()
+    latencies = []
+    for _ in processes:
+        latencies.extend(results.get())
+    for process in processes:
+        process.join()
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / duration,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99)],
+    }
+
+def main() -> None:
+    from ml.threads import plan_threads
+    from utils.system import available_cpus
+
+    cpus = available_cpus()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--disease", choices=["diabetes", "cardiovascular"], default="diabetes")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, max(cpus // 2, 1), cpus}))
+    parser.add_argument("--native", type=int, nargs="*", default=[],
+                        help="Extra native thread limits to try with the planned inference threads")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{cpus} CPUs, {args.disease}, single-row predictions with SHAP")
+    print(f"{'setting':>18} {'workers':>8} {'infer':>6} {'native':>7} {'busy':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in args.workers:
+        plan = plan_threads(workers, cpus=cpus, inference_threads=0, native_threads=0)
+        settings_to_try = [("library defaults", min(cpus, 4), 0), ("planned", plan.inference_threads, plan.native_threads)]
+        settings_to_try += [("native override", plan.inference_threads, n) for n in args.native if n != plan.native_threads]
+        for label, inference, native in settings_to_try:
+            outcome = run(args.disease, workers, inference, native, args.duration)
+            busy = workers * inference * (native or cpus)
+            print(f"{label:>18} {workers:>8} {inference:>6} {native or cpus:>7} {busy:>5} "
+                  f"{outcome['throughput']:>8.0f} {outcome['p50']:>8.2f} {outcome['p99']:>8.2f}", flush=True)
+
+if __name__ == "__main__":
+    main()
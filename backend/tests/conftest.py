@@ -0,0 +1,8 @@
+# tests/conftest.py
+import os
+import sys
+
+APP = os.path.join(os.path.dirname(__file__), "..", "app")
+sys.path.insert(0, APP)
+os.environ.setdefault("MODEL_DIR", os.path.join(APP, "pretrained"))
+os.environ.setdefault("GEMINI_API_KEY", "test")
@@ -0,0 +1,23 @@
+# tests/test_audit_log.py
+from config.settings import settings
+from audit.log import AuditLog
+from hospital.context import clear_tenant_context, set_tenant_context
+
+def record(tenant_id, resolved: bool) -> dict:
+    log = AuditLog(buffer_size=10, batch_size=10, flush_interval=1.0, spill_path="unused.ndjson")
+    set_tenant_context(tenant_id, resolved=resolved)
+    try:
+        log.record("read", "patient", "p1", "doctor@example.com")
+    finally:
+        clear_tenant_context()
+    return log._buffer[0]
+
+def test_events_are_filed_under_the_resolved_tenant():
+    event = record("hospital_a", resolved=True)
+    assert event["tenant"] == "hospital_a"
+    assert "details" not in event
+
+def test_header_tenant_is_only_recorded_as_claimed():
+    event = record("hospital_b", resolved=False)
+    assert event["tenant"] == settings.default_tenant_id
+    assert event["details"] == {"claimed_tenant": "hospital_b"}
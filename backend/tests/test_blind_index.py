@@ -0,0 +1,14 @@
+# tests/test_blind_index.py
+from utils.blind_index import name_query_tokens, name_search_tokens
+
+def test_query_words_prefix_name_words_in_any_order():
+    indexed = set(name_search_tokens("Nguyễn Văn An"))
+    assert set(name_query_tokens("van ngu")) <= indexed
+    assert set(name_query_tokens("NGUYEN an")) <= indexed
+    assert not set(name_query_tokens("van bao")) <= indexed
+
+def test_single_letter_query_words_are_ignored():
+    indexed = set(name_search_tokens("Nguyễn Văn Bảo"))
+    assert name_query_tokens("van b") == name_query_tokens("van")
+    assert set(name_query_tokens("van b")) <= indexed
+    assert name_query_tokens("a b") == []
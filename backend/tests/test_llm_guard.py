@@ -0,0 +1,248 @@
+# tests/test_llm_guard.py
+import threading
+import time
+import pytest
+from config.settings import settings
+from hospital.context import clear_tenant_context, set_tenant_context
+from ml import explanations
+from ml.fake_llm import FakeLLM
+from ml.guard import CircuitBreaker, LLMGuard, TokenBucket
+from ml.templates import render_explanation
+from tracing.spans import start_trace
+
+PROMPT = "Explain the prediction"
+
+@pytest.fixture
+def configure(monkeypatch):
+    """Set LLM settings for the guard created afterwards; generous limits by default"""
+    defaults = {
+        "llm_timeout_seconds": 1.0,
+        "llm_max_concurrency": 4,
+        "llm_global_rate_per_minute": 60000,
+        "llm_global_burst": 1000,
+        "llm_tenant_rate_per_minute": 60000,
+        "llm_tenant_burst": 1000,
+        "llm_breaker_failure_threshold": 3,
+        "llm_breaker_latency_slo_seconds": 1.0,
+        "llm_breaker_open_seconds": 0.1,
+        "llm_breaker_half_open_probes": 1,
+        "llm_max_retries": 0,
+        "llm_retry_budget_ratio": 0.1,
+        "llm_retry_budget_capacity": 10,
+    }
+
+    def configure(**overrides) -> LLMGuard:
+        for name, value in {**defaults, **overrides}.items():
+            monkeypatch.setattr(settings, name, value)
+        return LLMGuard()
+    return configure
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=50, capacity=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    time.sleep(0.05)
+    assert bucket.try_acquire()
+
+def test_answer_is_returned(configure):
+    guard = configure()
+    llm = FakeLLM(latency_ms=1, failure_rate=0)
+    completion = guard.call(llm.generate, PROMPT, "doctor")
+    assert completion.text.startswith("[fake-llm:doctor]")
+    assert guard.counters["calls"] == 1
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+def test_slow_call_times_out(configure):
+    guard = configure(llm_timeout_seconds=0.05)
+    llm = FakeLLM(latency_ms=300, failure_rate=0, jitter=0)
+    start = time.monotonic()
+    assert guard.call(llm.generate, PROMPT, "doctor") is None
+    assert time.monotonic() - start < 0.25
+    assert guard.counters["timeouts"] == 1
+    assert guard.breaker.consecutive_failures == 1
+
+def test_timeout_is_not_retried(configure):
+    guard = configure(llm_timeout_seconds=0.05, llm_max_retries=2)
+    llm = FakeLLM(latency_ms=300, failure_rate=0, jitter=0)
+    assert guard.call(llm.generate, PROMPT, "doctor") is None
+    assert llm.calls == 1
+    assert guard.counters["retries"] == 0
+
+def test_failed_call_is_retried(configure):
+    guard = configure(llm_max_retries=1)
+    llm = FakeLLM(latency_ms=1, failure_rate=0, fail_first=1)
+    assert guard.call(llm.generate, PROMPT, "doctor") is not None
+    assert llm.calls == 2
+    assert guard.counters["retries"] == 1
+    assert guard.counters["errors"] == 1
+
+def test_retries_stop_when_budget_is_spent(configure):
+    guard = configure(llm_max_retries=3, llm_retry_budget_ratio=0, llm_retry_budget_capacity=2,
+                      llm_breaker_failure_threshold=100)
+    llm = FakeLLM(latency_ms=1, failure_rate=1)
+    assert guard.call(llm.generate, PROMPT, "doctor") is None
+    # One call and the two retries the budget held
+    assert llm.calls == 3
+    assert guard.counters["retry_budget_exhausted"] == 1
+    assert guard.call(llm.generate, PROMPT, "doctor") is None
+    assert llm.calls == 4
+    assert guard.counters["retries"] == 2
+
+def test_retry_budget_refills_from_calls(configure):
+    guard = configure(llm_max_retries=1, llm_retry_budget_ratio=0.5, llm_retry_budget_capacity=1,
+                      llm_breaker_failure_threshold=100)
+    guard.retry_budget.tokens = 0
+    healthy = FakeLLM(latency_ms=1, failure_rate=0)
+    guard.call(healthy.generate, PROMPT, "doctor")
+    guard.call(healthy.generate, PROMPT, "doctor")
+    flaky = FakeLLM(latency_ms=1, failure_rate=0, fail_first=1)
+    assert guard.call(flaky.generate, PROMPT, "doctor") is not None
+    assert guard.counters["retries"] == 1
+
+def test_breaker_opens_after_consecutive_failures(configure):
+    guard = configure(llm_breaker_failure_threshold=2, llm_breaker_open_seconds=60)
+    llm = FakeLLM(latency_ms=1, failure_rate=1)
+    for _ in range(2):
+        assert guard.call(llm.generate, PROMPT, "doctor") is None
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    assert guard.call(llm.generate, PROMPT, "doctor") is None
+    assert llm.calls == 2
+    assert guard.counters["circuit_open"] == 1
+
+def test_slo_breaches_open_the_breaker(configure):
+    guard = configure(llm_breaker_failure_threshold=2, llm_breaker_latency_slo_seconds=0.01,
+                      llm_breaker_open_seconds=60)
+    llm = FakeLLM(latency_ms=30, failure_rate=0, jitter=0)
+    # Slow answers are still served, but count against the backend
+    assert guard.call(llm.generate, PROMPT, "doctor") is not None
+    assert guard.call(llm.generate, PROMPT, "doctor") is not None
+    assert guard.counters["slow"] == 2
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+def test_half_open_probe_closes_on_success(configure):
+    guard = configure(llm_breaker_failure_threshold=1, llm_breaker_open_seconds=0.05)
+    assert guard.call(FakeLLM(latency_ms=1, failure_rate=1).generate, PROMPT, "doctor") is None
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert guard.call(FakeLLM(latency_ms=1, failure_rate=0).generate, PROMPT, "doctor") is not None
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_probe_failure_reopens(configure):
+    guard = configure(llm_breaker_failure_threshold=1, llm_breaker_open_seconds=0.05)
+    llm = FakeLLM(latency_ms=1, failure_rate=1)
+    guard.call(llm.generate, PROMPT, "doctor")
+    time.sleep(0.06)
+    assert guard.call(llm.generate, PROMPT, "doctor") is None
+    assert llm.calls == 2
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    # Open again for a full period
+    assert guard.call(llm.generate, PROMPT, "doctor") is None
+    assert llm.calls == 2
+
+def test_half_open_admits_one_probe_at_a_time(configure):
+    guard = configure(llm_breaker_failure_threshold=1, llm_breaker_open_seconds=0.05)
+    guard.call(FakeLLM(latency_ms=1, failure_rate=1).generate, PROMPT, "doctor")
+    time.sleep(0.06)
+    slow = FakeLLM(latency_ms=200, failure_rate=0, jitter=0)
+    probe = threading.Thread(target=guard.call, args=(slow.generate, PROMPT, "doctor"))
+    probe.start()
+    time.sleep(0.05)
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+    other = FakeLLM(latency_ms=1, failure_rate=0)
+    assert guard.call(other.generate, PROMPT, "doctor") is None
+    assert other.calls == 0
+    probe.join()
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+def test_tenant_bucket_rejects_over_burst(configure):
+    guard = configure(llm_tenant_rate_per_minute=0, llm_tenant_burst=2)
+    llm = FakeLLM(latency_ms=1, failure_rate=0)
+    assert guard.call(llm.generate, PROMPT, "doctor", tenant_id="a") is not None
+    assert guard.call(llm.generate, PROMPT, "doctor", tenant_id="a") is not None
+    assert guard.call(llm.generate, PROMPT, "doctor", tenant_id="a") is None
+    assert llm.calls == 2
+    assert guard.counters["rate_limited"] == 1
+    # Other tenants keep their own bucket
+    assert guard.call(llm.generate, PROMPT, "doctor", tenant_id="b") is not None
+
+def test_global_bucket_rejects_across_tenants(configure):
+    guard = configure(llm_global_rate_per_minute=0, llm_global_burst=1)
+    llm = FakeLLM(latency_ms=1, failure_rate=0)
+    assert guard.call(llm.generate, PROMPT, "doctor", tenant_id="a") is not None
+    assert guard.call(llm.generate, PROMPT, "doctor", tenant_id="b") is None
+    assert guard.counters["rate_limited"] == 1
+    # The rejected call doesn't cost tenant "b" its own allowance
+    assert guard._tenant_bucket("b").tokens == settings.llm_tenant_burst
+
+def test_tenant_buckets_are_bounded(configure, monkeypatch):
+    monkeypatch.setattr(settings, "llm_tenant_buckets", 2)
+    guard = configure()
+    llm = FakeLLM(latency_ms=1, failure_rate=0)
+    for tenant_id in ("a", "b", "c", "d"):
+        guard.call(llm.generate, PROMPT, "doctor", tenant_id=tenant_id)
+    assert len(guard.tenant_buckets) == 2
+
+def test_idle_tenant_buckets_expire_once_full(configure):
+    guard = configure(llm_tenant_rate_per_minute=600, llm_tenant_burst=1)
+    guard._tenant_bucket("a").try_acquire()
+    time.sleep(0.15)
+    assert guard.tenant_buckets.get("a") is None
+
+SHAP = [
+    {"feature": "HbA1c", "value": 8.1, "shap_value": 1.2},
+    {"feature": "BMI", "value": 31.0, "shap_value": 0.4},
+    {"feature": "AGE", "value": 55, "shap_value": -0.1},
+]
+
+@pytest.fixture
+def fake_backend(configure, monkeypatch):
+    monkeypatch.setattr(settings, "llm_backend", "fake")
+    monkeypatch.setattr(settings, "fake_llm_latency_ms", 1)
+    monkeypatch.setattr(explanations.explanation_cache, "get", lambda key: None)
+
+    def use(failure_rate: float, **overrides) -> LLMGuard:
+        monkeypatch.setattr(settings, "fake_llm_failure_rate", failure_rate)
+        guard = configure(**overrides)
+        monkeypatch.setattr(explanations, "llm_guard", guard)
+        return guard
+    return use
+
+def test_explanation_falls_back_to_template_when_llm_fails(fake_backend):
+    guard = fake_backend(failure_rate=1)
+    explanation = explanations.explain("diabetes", SHAP, prediction=2, confidence=0.9, level=2)
+    assert explanation == render_explanation("diabetes", SHAP, 2, 0.9, "doctor")
+    assert guard.counters["errors"] == 1
+
+def test_explanation_falls_back_to_template_when_circuit_is_open(fake_backend):
+    guard = fake_backend(failure_rate=0, llm_breaker_open_seconds=60)
+    guard.breaker.record(False)
+    guard.breaker.record(False)
+    guard.breaker.record(False)
+    explanation = explanations.explain("diabetes", SHAP, prediction=2, confidence=0.9, level=2)
+    assert explanation == render_explanation("diabetes", SHAP, 2, 0.9, "doctor")
+    assert guard.counters["calls"] == 0
+
+def test_explanation_uses_llm_when_healthy(fake_backend):
+    fake_backend(failure_rate=0)
+    explanation = explanations.explain("diabetes", SHAP, prediction=2, confidence=0.9, level=2)
+    assert explanation.startswith("[fake-llm:doctor]")
+
+def test_llm_span_joins_the_request_trace(fake_backend):
+    fake_backend(failure_rate=0)
+    with start_trace("GET /api/diagnosis/explain") as root:
+        explanations.explain("diabetes", SHAP, prediction=2, confidence=0.9, level=2)
+    llm_span = next(span for span in root.trace.spans if span.name == "llm.generate")
+    assert llm_span.trace is root.trace
+    assert llm_span.thread != threading.current_thread().name
+
+def test_llm_usage_is_billed_to_the_resolved_tenant(fake_backend, monkeypatch):
+    fake_backend(failure_rate=0)
+    billed = []
+    monkeypatch.setattr(explanations.llm_usage, "record_call", lambda tenant_id, *args: billed.append(tenant_id))
+    for tenant_id, resolved in (("hospital_b", False), ("hospital_a", True)):
+        set_tenant_context(tenant_id, resolved=resolved)
+        try:
+            explanations.explain("diabetes", SHAP, prediction=2, confidence=0.9, level=2)
+        finally:
+            clear_tenant_context()
+    assert billed == [settings.default_tenant_id, "hospital_a"]
@@ -0,0 +1,85 @@
+# tests/test_patient_routes.py
+import asyncio
+import json
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from auth.models import RoleEnum, TokenData
+from hospital.context import clear_tenant_context, set_tenant_context
+from patient.routes import export_patients, list_patients, search_patients
+from patient.services import ENCRYPTED_FIELDS
+from utils.encryption import encrypt_dict_fields
+
+class FakeCursor:
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+class FakeCollection:
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+        self.full_name = "test.patients"
+
+    def find(self, query=None, projection=None):
+        keep = [key for key, value in (projection or {}).items() if value]
+        return FakeCursor([
+            {key: value for key, value in document.items() if not keep or key in keep}
+            for document in self.documents
+        ])
+
+class FakeDatabase:
+    name = "test"
+
+    def __init__(self, **collections):
+        self.collections = collections
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+DOCTOR = TokenData(email="doctor@example.com", role=RoleEnum.DOCTOR)
+
+def test_list_patients_returns_decrypted_fields():
+    patient = {
+        "_id": ObjectId(), "name": "Nguyen Van A", "dob": datetime(1990, 1, 2), "gender": "MALE", "age": 35,
+        "tenant_id": "default", "account_id": "a",
+    }
+    stored = encrypt_dict_fields(patient, ENCRYPTED_FIELDS)
+    assert stored["name"] != patient["name"]
+    db = FakeDatabase(patients=FakeCollection([stored]))
+    response = asyncio.run(list_patients(db=db, current_user=DOCTOR))
+    assert json.loads(response.body) == [{
+        "_id": str(patient["_id"]), "name": "Nguyen Van A", "dob": "1990-01-02T00:00:00", "gender": "MALE", "age": 35,
+    }]
+
+def test_export_needs_the_users_own_tenant():
+    async def export(tenant_id, resolved):
+        set_tenant_context(tenant_id, resolved=resolved)
+        try:
+            return await export_patients(
+                dataset="patients", format="ndjson", gzip=False, db=FakeDatabase(), current_user=DOCTOR
+            )
+        finally:
+            clear_tenant_context()
+
+    # Neither a tenant named only in the header nor no tenant at all may export
+    for tenant_id in ("hospital_b", None):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(export(tenant_id, resolved=False))
+        assert error.value.status_code == 403
+    response = asyncio.run(export("hospital_a", resolved=True))
+    assert "hospital_a_patients" in response.headers["Content-Disposition"]
+
+def test_search_needs_the_users_own_tenant():
+    async def search():
+        set_tenant_context("hospital_b", resolved=False)
+        try:
+            return await search_patients(q="nguyen", exact=False, limit=50, db=FakeDatabase(), current_user=DOCTOR)
+        finally:
+            clear_tenant_context()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(search())
+    assert error.value.status_code == 403